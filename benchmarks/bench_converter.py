@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+Converter ベンチマーク
+----------------------------------
+ffmpeg の lavfi ソース（testsrc2 / sine）から決定的な合成メディアを生成し、
+Converter.convert_to_format の各分岐（音声のみ / mp4 libx264 / webm VP9 /
+ストリームコピー）を計測する。ネットワークは使わない。
+
+計測値（1 ケースごと）:
+  wall_s         経過時間（--repeat 回の中央値）
+  cpu_s          ffmpeg / ffprobe の user + sys 時間
+  realtime_x     入力の長さ / 経過時間（1.0 で実時間と同じ速さ）
+  peak_rss_mb    子プロセスの最大常駐メモリ
+
+使い方:
+  python benchmarks/bench_converter.py                     # 計測して JSON を出力
+  python benchmarks/bench_converter.py --save-baseline     # 結果を基準値として保存
+  python benchmarks/bench_converter.py --only audio-mp3    # 一部のケースのみ
+
+基準値（既定: benchmarks/baseline.json）があれば比較し、経過時間が
+--tolerance を超えて悪化したケースがあると終了コード 1 を返す。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# 合成入力: 名前 → (長さ[秒], 拡張子, ffmpeg の入力・エンコード引数)
+INPUTS: dict[str, tuple[float, str, list[str]]] = {
+    "sine-30s": (30, "wav", [
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000:duration=30",
+        "-c:a", "pcm_s16le",
+    ]),
+    "sine-300s": (300, "wav", [
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000:duration=300",
+        "-c:a", "pcm_s16le",
+    ]),
+    # 再エンコードが必要な映像（mpeg4 + PCM）
+    "mpeg4-360p-10s": (10, "mkv", [
+        "-f", "lavfi", "-i", "testsrc2=size=640x360:rate=30:duration=10",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=10",
+        "-c:v", "mpeg4", "-q:v", "4", "-c:a", "pcm_s16le", "-shortest",
+    ]),
+    "mpeg4-720p-10s": (10, "mkv", [
+        "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30:duration=10",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=10",
+        "-c:v", "mpeg4", "-q:v", "4", "-c:a", "pcm_s16le", "-shortest",
+    ]),
+    # mp4 にそのままコピーできる映像（h264 + aac）
+    "h264-720p-10s": (10, "mkv", [
+        "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30:duration=10",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=10",
+        "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest",
+    ]),
+}
+
+# 計測ケース: 名前 → (入力名, 出力形式)
+CASES: dict[str, tuple[str, str]] = {
+    "audio-mp3": ("sine-30s", "mp3"),
+    "audio-mp3-300s": ("sine-300s", "mp3"),
+    "audio-flac": ("sine-30s", "flac"),
+    "audio-ogg": ("sine-30s", "ogg"),
+    "mp4-x264-360p": ("mpeg4-360p-10s", "mp4"),
+    "mp4-x264-720p": ("mpeg4-720p-10s", "mp4"),
+    "webm-vp9-360p": ("mpeg4-360p-10s", "webm"),
+    "copy-mkv-720p": ("h264-720p-10s", "mkv"),
+    "remux-mp4-720p": ("h264-720p-10s", "mp4"),
+}
+
+
+# ──────────────────────────────────────────────────────────
+# 合成入力の生成
+# ──────────────────────────────────────────────────────────
+def ensure_input(name: str, workdir: Path) -> Path:
+    """合成入力を生成する（生成済みなら再利用）"""
+    _, ext, args = INPUTS[name]
+    path = workdir / f"{name}.{ext}"
+    if not path.exists():
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args,
+             "-fflags", "+bitexact", "-flags", "+bitexact", str(path)],
+            check=True,
+        )
+    return path
+
+
+# ──────────────────────────────────────────────────────────
+# 1 ケースの計測（子プロセス内で実行）
+# ──────────────────────────────────────────────────────────
+def run_case(input_path: str, fmt: str, outdir: str, profile: str) -> dict:
+    """1 回変換して計測値を返す。ru_maxrss を分離するため専用プロセスで呼ぶ。"""
+    from media_tool.config import Config
+    from media_tool.converter import Converter
+
+    config = Config()
+    config.CONFIG_PATH = os.path.join(outdir, "no-config.json")  # ユーザー設定を読まない
+    config.OUTPUT_DIR = outdir
+    config.CONVERT_CACHE = False
+    converter = Converter(config, profile=profile)
+
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    output = converter.convert_to_format(input_path, fmt, force=True)
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    rss_kb = after.ru_maxrss if sys.platform != "darwin" else after.ru_maxrss / 1024
+    return {
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "peak_rss_mb": rss_kb / 1024,
+        "output_bytes": os.path.getsize(output),
+    }
+
+
+def measure(name: str, workdir: Path, repeat: int, profile: str) -> dict:
+    input_name, fmt = CASES[name]
+    duration = INPUTS[input_name][0]
+    input_path = ensure_input(input_name, workdir)
+    outdir = workdir / "out"
+    outdir.mkdir(exist_ok=True)
+
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, __file__, "--_case", str(input_path), fmt, str(outdir), profile],
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        )
+        runs.append(json.loads(result.stdout.splitlines()[-1]))
+
+    wall = statistics.median(r["wall_s"] for r in runs)
+    return {
+        "input": input_name,
+        "format": fmt,
+        "duration_s": duration,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(statistics.median(r["cpu_s"] for r in runs), 4),
+        "realtime_x": round(duration / wall, 2) if wall else None,
+        "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+        "output_bytes": runs[-1]["output_bytes"],
+        "runs": repeat,
+    }
+
+
+# ──────────────────────────────────────────────────────────
+# 基準値との比較
+# ──────────────────────────────────────────────────────────
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """経過時間が基準値より tolerance 以上悪化したケースを返す"""
+    regressions = []
+    out = sys.stderr
+    print(f"\n{'case':<18}{'wall_s':>10}{'baseline':>10}{'change':>9}", file=out)
+    for name, res in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            print(f"{name:<18}{res['wall_s']:>10.3f}{'-':>10}{'new':>9}", file=out)
+            continue
+        change = res["wall_s"] / base["wall_s"] - 1.0 if base["wall_s"] else 0.0
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(
+            f"{name:<18}{res['wall_s']:>10.3f}{base['wall_s']:>10.3f}{change:>+9.1%}{flag}",
+            file=out,
+        )
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def ffmpeg_version() -> str:
+    out = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, text=True).stdout
+    return (out.splitlines() or [""])[0]
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "--_case":
+        print(json.dumps(run_case(*sys.argv[2:6])))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Converter benchmark")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="計測するケース")
+    parser.add_argument("--repeat", type=int, default=3, help="1 ケースあたりの実行回数（既定: 3）")
+    parser.add_argument("--encode-profile", default="balanced", help="エンコード設定（既定: balanced）")
+    parser.add_argument("--workdir", type=Path, help="合成入力の置き場（既定: 一時ディレクトリ）")
+    parser.add_argument("--output", type=Path, help="結果 JSON の保存先（既定: 標準出力のみ）")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="基準値 JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="結果を基準値として保存")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.15,
+        help="経過時間の悪化をどこまで許すか（既定: 0.15 = 15%%）",
+    )
+    args = parser.parse_args()
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="media-tool-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ffmpeg": ffmpeg_version(),
+            "encode_profile": args.encode_profile,
+        },
+        "cases": {},
+    }
+    for name in args.only or CASES:
+        print(f"[INFO] {name} ...", file=sys.stderr)
+        results["cases"][name] = measure(name, workdir, args.repeat, args.encode_profile)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+
+    if args.save_baseline:
+        args.baseline.write_text(text + "\n", encoding="utf-8")
+        print(f"[INFO] Saved baseline: {args.baseline}", file=sys.stderr)
+        return 0
+
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"[ERROR] Regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+CLI 起動時間ベンチマーク
+----------------------------------
+`python -X importtime cli.py <サブコマンド> --help` を別プロセスで実行し、
+引数解析までに掛かる import 時間と起動全体の経過時間を計測する。
+ffmpeg・ネットワークは使わない。
+
+計測値（1 ケースごと、--repeat 回の中央値）:
+  import_ms      -X importtime のトップレベル import の累計時間
+  wall_ms        プロセスの起動から終了までの経過時間
+  slowest        時間の掛かったトップレベル import（上位 --top 件）
+
+使い方:
+  python benchmarks/bench_startup.py                 # 計測して JSON を出力
+  python benchmarks/bench_startup.py --budget-ms 80   # 予算を指定
+  python benchmarks/bench_startup.py --only convert   # 一部のケースのみ
+
+import_ms が --budget-ms を超えたケース、または起動時に読み込んではいけない
+重いモジュール（HEAVY_MODULES）を読み込んだケースがあると終了コード 1 を返す。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 計測ケース: 名前 → cli.py の引数
+CASES: dict[str, list[str]] = {
+    "help": ["--help"],
+    "convert": ["convert", "--help"],
+    "download": ["download", "--help"],
+    "info": ["info", "--help"],
+    "watch": ["watch", "--help"],
+    "serve": ["serve", "--help"],
+}
+
+# 引数解析までに読み込んではいけないモジュール（サブコマンドの実行時に読み込む）
+HEAVY_MODULES = (
+    "yt_dlp", "tkinter", "sqlite3", "http.server", "http.client",
+    "media_tool.converter", "media_tool.downloaders", "media_tool.scheduler",
+    "media_tool.service", "media_tool.settings_gui", "media_tool.watch",
+)
+
+
+# ──────────────────────────────────────────────────────────
+# 1 回分の計測
+# ──────────────────────────────────────────────────────────
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """-X importtime の出力を [(モジュール名, 階層, 累計 µs)] にする"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        imports.append((name.strip(), depth, int(cumulative)))
+    return imports
+
+
+def run_once(args: list[str]) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(ROOT / "cli.py"), *args],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        errors = [l for l in result.stderr.splitlines() if not l.startswith("import time:")]
+        raise RuntimeError(f"cli.py {' '.join(args)} failed: {' '.join(errors)[-300:]}")
+
+    imports = parse_importtime(result.stderr)
+    top = [(name, us) for name, depth, us in imports if depth == 0]
+    return {
+        "wall_ms": wall * 1000,
+        "import_ms": sum(us for _, us in top) / 1000,
+        "top": top,
+        "modules": {name for name, _, _ in imports},
+    }
+
+
+def measure(name: str, repeat: int, top: int) -> dict:
+    runs = [run_once(CASES[name]) for _ in range(repeat)]
+    loaded = set().union(*(r["modules"] for r in runs))
+    heavy = [
+        h for h in HEAVY_MODULES
+        if any(m == h or m.startswith(h + ".") for m in loaded)
+    ]
+    slowest = sorted(runs[-1]["top"], key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "args": CASES[name],
+        "import_ms": round(statistics.median(r["import_ms"] for r in runs), 2),
+        "wall_ms": round(statistics.median(r["wall_ms"] for r in runs), 2),
+        "slowest": {module: round(us / 1000, 2) for module, us in slowest},
+        "heavy_modules": heavy,
+        "runs": repeat,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CLI startup benchmark")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="計測するケース")
+    parser.add_argument("--repeat", type=int, default=5, help="1 ケースあたりの実行回数（既定: 5）")
+    parser.add_argument(
+        "--budget-ms", type=float, default=100.0,
+        help="import 時間の上限（ミリ秒、既定: 100）",
+    )
+    parser.add_argument("--top", type=int, default=5, help="表示する遅い import の件数（既定: 5）")
+    parser.add_argument("--output", type=Path, help="結果 JSON の保存先（既定: 標準出力のみ）")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "budget_ms": args.budget_ms,
+        },
+        "cases": {},
+    }
+    for name in args.only or CASES:
+        print(f"[INFO] {name} ...", file=sys.stderr)
+        results["cases"][name] = measure(name, args.repeat, args.top)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+
+    failures = []
+    out = sys.stderr
+    print(f"\n{'case':<10}{'import_ms':>11}{'wall_ms':>10}{'budget':>9}", file=out)
+    for name, res in results["cases"].items():
+        flags = []
+        if res["import_ms"] > args.budget_ms:
+            flags.append("OVER BUDGET")
+        if res["heavy_modules"]:
+            flags.append("HEAVY: " + ", ".join(res["heavy_modules"]))
+        print(
+            f"{name:<10}{res['import_ms']:>11.1f}{res['wall_ms']:>10.1f}{args.budget_ms:>9.0f}"
+            + (f"  {'; '.join(flags)}" if flags else ""),
+            file=out,
+        )
+        if flags:
+            failures.append(name)
+    if failures:
+        print(f"[ERROR] Startup regressions: {', '.join(failures)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,16 +5,123 @@ Media-Tool Launcher
 """
 
 from __future__ import annotations
+import logging
 import os
 import sys
-from pathlib import Path
+import threading
+from typing import TYPE_CHECKING
 
 import argparse
-from media_tool.config import Config
-from media_tool.converter import Converter, SUPPORTED_FORMATS as CONVERT_FORMATS
-from media_tool.downloaders.youtube import YouTubeDownloader
-from media_tool.downloaders.niconico import NicoNicoDownloader
-from media_tool.settings_gui import SettingsGUI
+from media_tool.config import ENCODE_PROFILES, Config
+
+# 起動を速くするため、サブコマンドが使うモジュール（yt-dlp・ffmpeg 関連・tkinter・
+# HTTP サーバーなど）は、そのサブコマンドを実行するときに初めて import する。
+# 起動時間の予算は benchmarks/bench_startup.py で確認する。
+if TYPE_CHECKING:
+    from media_tool.progress import ConvertProgress
+
+logger = logging.getLogger("media_tool.cli")
+
+class ProgressLine:
+    """stderr の 1 行に最新の変換進捗を上書き表示する"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._width = 0
+
+    def update(self, p: ConvertProgress) -> None:
+        from media_tool.progress import format_progress
+
+        line = format_progress(p, os.path.basename(p.input_path))
+        with self._lock:
+            sys.stderr.write("\r" + line.ljust(self._width))
+            sys.stderr.flush()
+            self._width = len(line)
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._width:
+                sys.stderr.write("\r" + " " * self._width + "\r")
+                sys.stderr.flush()
+                self._width = 0
+
+
+def run_remote(config: Config, kind: str, payloads: list[dict], show_progress: bool) -> None:
+    """ジョブサービスにジョブを投入し、終わるまで進捗を表示する"""
+    from media_tool.progress import ConvertProgress
+    from media_tool.service import ServiceClient, load_service_token
+
+    client = ServiceClient(config.SERVICE_URL, load_service_token(config))
+    progress_line = ProgressLine() if show_progress else None
+    try:
+        jobs = [client.submit(kind, **payload) for payload in payloads]
+    except ConnectionError as e:
+        logger.error("%s", e)
+        sys.exit(1)
+    for job in jobs:
+        logger.info("Queued job %s", job["id"])
+
+    def on_progress(job: dict) -> None:
+        if progress_line is not None:
+            progress_line.update(ConvertProgress(**job["progress"]))
+
+    def on_finish(job: dict) -> None:
+        if progress_line is not None:
+            progress_line.clear()
+        target = job["payload"].get("input") or job["payload"].get("url")
+        for path in (job["result"] or {}).get("paths", []):
+            logger.info("Saved to %s", path)
+        if job["state"] == "failed":
+            logger.error("Job %s failed (%s): %s", job["id"], target, job["error"])
+
+    client.tail([job["id"] for job in jobs], on_progress=on_progress, on_finish=on_finish)
+
+
+def format_list(value: str) -> list[str]:
+    """--format の値（"mp3" や "mp3,flac,ogg"）を検証して形式の一覧にする"""
+    from media_tool.utils import get_ffmpeg_supported_formats
+
+    supported = get_ffmpeg_supported_formats()
+    formats = [f.strip().lower() for f in value.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in supported]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(f"unsupported format: {', '.join(unknown) or value!r}")
+    return formats
+
+
+def format_name(value: str) -> str:
+    """--format の値（1 形式のみ）を検証する"""
+    formats = format_list(value)
+    if len(formats) != 1:
+        raise argparse.ArgumentTypeError(f"specify a single format: {value!r}")
+    return formats[0]
+
+
+def print_info(info: dict) -> None:
+    """抽出結果の要約（プレイリストはエントリ一覧）を表示する"""
+    from media_tool.progress import format_duration
+
+    title = info.get("title") or info.get("id") or "?"
+    if info.get("_type") in ("playlist", "multi_video") or "entries" in info:
+        entries = [e for e in info.get("entries") or [] if e is not None]
+        print(f"{title}  ({len(entries)} entries)")
+        width = len(str(len(entries)))
+        for n, entry in enumerate(entries, 1):
+            duration = format_duration(entry.get("duration")) if entry.get("duration") else ""
+            name = entry.get("title") or entry.get("url") or entry.get("id")
+            print(f"  {n:>{width}}. {name}  [{entry.get('id')}]  {duration}".rstrip())
+        return
+    print(title)
+    for label, value in (
+        ("ID", info.get("id")),
+        ("Uploader", info.get("uploader") or info.get("channel")),
+        ("Duration", format_duration(info["duration"]) if info.get("duration") else None),
+        ("URL", info.get("webpage_url")),
+        ("Formats", len(info["formats"]) if info.get("formats") else None),
+    ):
+        if value is not None:
+            print(f"  {label}: {value}")
+
 
 def main() -> None:
     config = Config()
@@ -28,22 +135,86 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Media Tool CLI")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
+    # 各サブコマンド共通: ログ・トレース・プロファイル
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default=config.LOG_LEVEL,
+        help=f"ログの詳しさ（既定: {config.LOG_LEVEL}）",
+    )
+    common.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        default="text",
+        help="ログの形式（json は 1 行 1 レコード、既定: text）",
+    )
+    common.add_argument(
+        "--trace",
+        action="append",
+        metavar="PATH",
+        help="フェーズごとの処理時間を書き出す（.jsonl なら JSONL、それ以外は Chrome の"
+             "トレース形式。複数指定可）",
+    )
+    common.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="cProfile の統計・ffmpeg の -benchmark 出力・トレースを DIR に書き出す",
+    )
+
     # ■ convert: 複数ファイル対応
-    convert_parser = subparsers.add_parser("convert", help="Convert media files")
+    convert_parser = subparsers.add_parser("convert", help="Convert media files", parents=[common])
     convert_parser.add_argument(
         "inputs",
         nargs="+",
-        help="Input file paths（複数指定可）"
+        help="Input file paths / directories（複数指定可。ディレクトリは再帰的に変換し、"
+             "OUTPUT_DIR に同じ階層で出力）"
     )
     convert_parser.add_argument(
         "--format",
         default=config.DEFAULT_FORMAT,
-        choices=CONVERT_FORMATS,
-        help=f"出力拡張子（ffmpeg 対応）を指定（既定: {config.DEFAULT_FORMAT}）",
+        type=format_list,
+        help="出力拡張子（ffmpeg 対応）を指定。カンマ区切りで複数指定すると 1 回のデコードで"
+             f"すべて出力（例: mp3,flac,ogg、既定: {config.DEFAULT_FORMAT}）",
+    )
+    convert_parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=config.CONVERT_JOBS,
+        help=f"同時に変換するファイル数（0 = CPU コア数、既定: {config.CONVERT_JOBS}）",
+    )
+    convert_parser.add_argument(
+        "--segments",
+        type=int,
+        default=config.CONVERT_SEGMENTS,
+        help="長い動画（mp4 / webm）を分割して並列エンコードする区間数"
+             f"（1 = 分割しない、0 = CPU コア数、既定: {config.CONVERT_SEGMENTS}）",
+    )
+    convert_parser.add_argument(
+        "--encode-profile",
+        choices=sorted(ENCODE_PROFILES),
+        default=config.ENCODE_PROFILE,
+        help=f"エンコード設定（速度と画質のトレードオフ、既定: {config.ENCODE_PROFILE}）",
+    )
+    convert_parser.add_argument(
+        "--progress",
+        action=argparse.BooleanOptionalAction,
+        default=sys.stderr.isatty(),
+        help="変換の進捗（速度・残り時間）を表示（既定: 端末なら表示）",
+    )
+    convert_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="変換済みの出力があっても再変換する",
+    )
+    convert_parser.add_argument(
+        "--submit",
+        action="store_true",
+        help=f"ジョブサービス（{config.SERVICE_URL}）に投入して進捗を追跡",
     )
 
     # ■ download: 複数URL & プレイリスト対応
-    download_parser = subparsers.add_parser("download", help="Download video(s) from URL(s)")
+    download_parser = subparsers.add_parser("download", help="Download video(s) from URL(s)", parents=[common])
     download_parser.add_argument(
         "urls",
         nargs="+",
@@ -51,48 +222,272 @@ def main() -> None:
     )
     download_parser.add_argument(
         "--format",
-        choices=CONVERT_FORMATS,
+        type=format_name,
         help="ダウンロード後にこの拡張子へ変換（省略時は変換なし）",
     )
+    download_parser.add_argument(
+        "--encode-profile",
+        choices=sorted(ENCODE_PROFILES),
+        default=config.ENCODE_PROFILE,
+        help=f"変換時のエンコード設定（既定: {config.ENCODE_PROFILE}）",
+    )
+    download_parser.add_argument(
+        "-p", "--parallel",
+        type=int,
+        help=f"サイトごとの同時ダウンロード数（既定: {config.DOWNLOAD_PARALLEL}）",
+    )
+    download_parser.add_argument(
+        "--stream",
+        action=argparse.BooleanOptionalAction,
+        default=config.STREAM_DOWNLOADS,
+        help="中間ファイルを作らずダウンロードしながら変換（パイプ非対応のソースは通常処理）",
+    )
+    download_parser.add_argument(
+        "--archive",
+        action=argparse.BooleanOptionalAction,
+        default=config.DOWNLOAD_ARCHIVE,
+        help="ダウンロード済みの動画を記録し、再実行時は新しいものだけ取得",
+    )
+    download_parser.add_argument(
+        "--items",
+        help="プレイリストのうち取得するエントリ（例: 1-3,7 ／ info で番号を確認）",
+    )
+    download_parser.add_argument(
+        "--submit",
+        action="store_true",
+        help=f"ジョブサービス（{config.SERVICE_URL}）に投入して完了を待つ",
+    )
+
+    # ■ info: ダウンロードせずにメタデータだけ取得
+    info_parser = subparsers.add_parser(
+        "info", aliases=["list"], help="Show metadata / playlist entries without downloading",
+        parents=[common],
+    )
+    info_parser.add_argument("urls", nargs="+", help="Video or playlist URLs")
+    info_parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help=f"キャッシュ（{config.INFO_CACHE_TTL} 秒有効）を使わずに取得し直す",
+    )
+    info_parser.add_argument("--json", action="store_true", help="抽出結果を JSON で出力")
+
+    # ■ watch: ホットフォルダ
+    watch_parser = subparsers.add_parser("watch", help="Convert new files dropped into folders", parents=[common])
+    watch_parser.add_argument("dirs", nargs="+", help="監視するディレクトリ（複数指定可）")
+    watch_parser.add_argument(
+        "--format",
+        default=config.DEFAULT_FORMAT,
+        type=format_list,
+        help=f"出力拡張子（カンマ区切りで複数指定可、既定: {config.DEFAULT_FORMAT}）",
+    )
+    watch_parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=config.CONVERT_JOBS,
+        help=f"同時に変換するファイル数（0 = CPU コア数、既定: {config.CONVERT_JOBS}）",
+    )
+    watch_parser.add_argument(
+        "--encode-profile",
+        choices=sorted(ENCODE_PROFILES),
+        default=config.ENCODE_PROFILE,
+        help=f"エンコード設定（既定: {config.ENCODE_PROFILE}）",
+    )
+    watch_parser.add_argument(
+        "-r", "--recursive", action="store_true", help="サブディレクトリも監視する"
+    )
+    watch_parser.add_argument(
+        "--settle",
+        type=float,
+        help="書き込み完了とみなすまでの無変化の秒数（既定: 2）",
+    )
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        help="ポーリング時の走査間隔（秒、既定: 2）",
+    )
+    watch_parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="inotify を使わずポーリングで検知する（ネットワークドライブ向け）",
+    )
+    watch_parser.add_argument(
+        "--scan-existing",
+        action="store_true",
+        help="起動時に既にあるファイルも変換する（変換済みはキャッシュで飛ばす）",
+    )
+
+    # ■ serve: ジョブサービス
+    serve_parser = subparsers.add_parser("serve", help="Run the local job service", parents=[common])
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.CONVERT_JOBS,
+        help=f"同時に処理するジョブ数（0 = CPU コア数、既定: {config.CONVERT_JOBS}）",
+    )
 
     # ■ settings
     subparsers.add_parser("settings", help="Open settings GUI")
 
     args = parser.parse_args()
+    if args.command == "download" and args.submit and args.parallel is not None:
+        # サービスでは 1 URL が 1 ジョブになり、同時実行数は serve --workers で決まる
+        download_parser.error("--parallel は --submit と併用できません（サービスの --workers で指定）")
+
+    # この実行に限ったエンコード設定の上書き（保存はしない）
+    if getattr(args, "encode_profile", None):
+        config.ENCODE_PROFILE = args.encode_profile
+
+    from media_tool.log import setup_logging
+
+    setup_logging(
+        getattr(args, "log_level", config.LOG_LEVEL), fmt=getattr(args, "log_format", "text")
+    )
+    trace_paths = list(getattr(args, "trace", None) or [])
+    profile_dir = getattr(args, "profile", None)
+    if not (trace_paths or profile_dir):
+        run_command(args, config)
+        return
+
+    from media_tool.trace import start_profiling, start_tracing
+
+    tracer = start_tracing()
+    profiler = start_profiling(profile_dir) if profile_dir else None
+    if profile_dir:
+        trace_paths.append(os.path.join(profile_dir, "trace.json"))
+    try:
+        run_command(args, config)
+    finally:
+        written = profiler.stop() if profiler is not None else []
+        for path in trace_paths:
+            tracer.write(path)
+            written.append(path)
+        for path in written:
+            logger.info("Wrote %s", path)
+
+
+def run_command(args: argparse.Namespace, config: Config) -> None:
+    """サブコマンドを実行する"""
+    if args.command == "convert" and args.submit:
+        from media_tool.converter import expand_inputs
+
+        payloads = [
+            {"input": os.path.abspath(inp), "subdir": subdir, "format": ",".join(args.format),
+             "profile": args.encode_profile, "force": args.force, "segments": args.segments}
+            for inp, subdir in expand_inputs(args.inputs, exclude=[config.OUTPUT_DIR])
+        ]
+        run_remote(config, "convert", payloads, args.progress)
+
+    elif args.command == "convert":
+        from media_tool.converter import Converter
 
-    if args.command == "convert":
         converter = Converter(config)
-        for inp in args.inputs:
-            try:
-                result = converter.convert_to_format(inp, args.format)
-                print(f"[INFO] Converted: {result}")
-            except Exception as e:
-                print(f"[ERROR] Failed to convert {inp}: {e}")
+        progress_line = ProgressLine() if args.progress else None
+
+        def report_conversion(inp: str, result: str | None, error: Exception | None) -> None:
+            if progress_line is not None:
+                progress_line.clear()
+            if error is None:
+                logger.info("Converted: %s", result)
+            else:
+                logger.error("Failed to convert %s: %s", inp, error)
+
+        converter.convert_many(
+            args.inputs, args.format,
+            jobs=args.jobs,
+            force=args.force,
+            segments=args.segments,
+            on_result=report_conversion,
+            progress=progress_line.update if progress_line is not None else None,
+        )
+
+    elif args.command == "download" and args.submit:
+        payloads = [
+            {"url": url, "format": args.format, "profile": args.encode_profile,
+             "items": args.items, "stream": args.stream, "archive": args.archive}
+            for url in args.urls
+        ]
+        run_remote(config, "download", payloads, False)
 
     elif args.command == "download":
+        from media_tool.downloaders.base import PartialDownloadError
+        from media_tool.scheduler import DownloadScheduler
+
+        def report_download(url: str, paths: list[str], error: Exception | None) -> None:
+            for path in paths:
+                logger.info("Saved to %s", path)
+            if isinstance(error, PartialDownloadError):
+                logger.error("%s: %s（再実行すると失敗したエントリから再開）", url, error)
+                for entry_url, entry_error in error.errors:
+                    logger.error("  %s: %s", entry_url, entry_error)
+            elif error is not None:
+                logger.error("Failed to download %s: %s", url, error)
+
+        scheduler = DownloadScheduler(
+            config,
+            parallel=args.parallel,
+            stream=args.stream,
+            archive=args.archive,
+            items=args.items,
+            on_result=report_download,
+        )
+        scheduler.run(args.urls, args.format)
+
+    elif args.command in ("info", "list"):
+        import json
+        from media_tool.info_cache import fetch_info
+
         for url in args.urls:
-            # URL判断とダウンローダー生成
-            downloader = (
-                YouTubeDownloader(config=config)
-                if "youtube" in url.lower()
-                else NicoNicoDownloader(config=config)
-            )
             try:
-                results = downloader.download(url, output_format=args.format)
-                # 戻り値がリストなら複数表示、そうでなければ単一
-                if isinstance(results, list):
-                    for path in results:
-                        print(f"[INFO] Saved to {path}")
-                else:
-                    print(f"[INFO] Saved to {results}")
+                info = fetch_info(url, ttl=config.INFO_CACHE_TTL, refresh=args.refresh)
             except Exception as e:
-                print(f"[ERROR] Failed to download {url}: {e}")
+                logger.error("Failed to extract %s: %s", url, e)
+                continue
+            if args.json:
+                print(json.dumps(info, ensure_ascii=False, indent=2))
+            else:
+                print_info(info)
+
+    elif args.command == "watch":
+        missing = [d for d in args.dirs if not os.path.isdir(d)]
+        if missing:
+            logger.error("Not a directory: %s", ", ".join(missing))
+            sys.exit(1)
+        from media_tool.converter import Converter
+        from media_tool.watch import HotFolder
+
+        def report_conversion(inp: str, result: str | None, error: Exception | None) -> None:
+            if error is None:
+                logger.info("Converted: %s", result)
+            else:
+                logger.error("Failed to convert %s: %s", inp, error)
+
+        HotFolder(
+            Converter(config), args.dirs, args.format,
+            jobs=args.jobs,
+            recursive=args.recursive,
+            settle=args.settle,
+            interval=args.interval,
+            polling=args.poll,
+            scan_existing=args.scan_existing,
+            on_result=report_conversion,
+        ).run()
+
+    elif args.command == "serve":
+        from urllib.parse import urlsplit
+        from media_tool.service import serve
+
+        address = urlsplit(config.SERVICE_URL)
+        serve(config, host=address.hostname or "127.0.0.1", port=address.port or 8765,
+              workers=args.workers)
 
     elif args.command == "settings":
         import tkinter as tk
+        from media_tool.settings_gui import SettingsGUI
+
         root = tk.Tk()
         SettingsGUI(root)  # type: ignore[arg-type]
         root.mainloop()
 
+
 if __name__ == "__main__":
     main()
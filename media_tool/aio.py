@@ -0,0 +1,471 @@
+"""
+asyncio 用 API
+
+asyncio のサービスに media_tool を組み込むための変換・ダウンロードの入口。
+
+- ffmpeg は asyncio.create_subprocess_exec で起動する（ジョブごとのスレッドは
+  使わない）。タスクのキャンセル・タイムアウトで ffmpeg を kill し、途中までの
+  出力を消す。
+- yt-dlp は同期 API しかないので executor のスレッドで動かし、キャンセル・
+  タイムアウト時は cancel（threading.Event）で進行中のダウンロードと変換を
+  打ち切る。
+- 結果は await で受け取るか、convert_many / download_many を async for で回して
+  1 件ごとのイベント（進捗・完了・失敗）として完了順に受け取る。
+
+    async with AsyncMediaTool(config) as tool:
+        path = await tool.convert_to_format("a.wav", "mp3", timeout=600)
+        async for event in tool.download_many(urls, "mp3"):
+            print(event.kind, event.source, event.paths, event.error)
+
+同時に走る ffmpeg は jobs（未指定時は Config.CONVERT_JOBS）まで（変換ジョブと
+ダウンロード後の変換で 1 つの ConvertBudget を共有する）、ダウンロードは
+サイトごとに DownloadScheduler と同じ上限までに抑えるので、数百件のジョブを
+まとめて投げてよい。分割並列エンコード（CONVERT_SEGMENTS）は行わない
+（ジョブ同士を並行させる用途のため）。
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Iterable, Sequence
+
+from media_tool.archive import dedupe_urls
+from media_tool.cache import get_conversion_cache
+from media_tool.config import Config
+from media_tool.converter import (
+    CANCEL_POLL_INTERVAL, ConvertBudget, Converter, expand_inputs, resolve_jobs,
+)
+from media_tool.diskspace import (
+    WAIT_INTERVAL, Reservation, disk_wait_timeout, free_space_margin, get_disk_gate,
+)
+from media_tool.progress import ConvertProgress, FFmpegProgressParser, ProgressCallback
+from media_tool.trace import get_profiler, span
+
+if TYPE_CHECKING:
+    from media_tool.downloaders.session import SessionPool
+
+logger = logging.getLogger(__name__)
+
+# 1 件分のジョブ: 進捗の受け取り先（不要なら None）を受け取り、出力パス一覧を返す
+_Job = Callable[[ProgressCallback | None], Awaitable[list[str]]]
+
+
+@dataclass
+class JobEvent:
+    """convert_many / download_many が 1 件ごとに返すイベント"""
+
+    kind: str                                       # "progress" / "done" / "failed"
+    source: str                                     # 入力パス or URL
+    paths: list[str] = field(default_factory=list)  # 出力パス（failed でも成功した分は入る）
+    error: Exception | None = None
+    progress: ConvertProgress | None = None
+
+
+def _remove(paths: Iterable[str]) -> None:
+    for path in paths:
+        try: os.remove(path)
+        except FileNotFoundError: pass
+
+
+class AsyncMediaTool:
+    """イベントループから変換・ダウンロードを実行する"""
+
+    def __init__(
+        self,
+        config: Config | None = None,
+        *,
+        profile: str | None = None,
+        jobs: int | None = None,
+        parallel: int | None = None,
+    ) -> None:
+        self.converter = Converter(config, profile=profile)
+        self.config: Config = self.converter.config
+        self.jobs = resolve_jobs(self.config.CONVERT_JOBS if jobs is None else jobs)
+        self.parallel = max(parallel if parallel is not None else self.config.DOWNLOAD_PARALLEL, 1)
+        # 変換ジョブとダウンロード後の変換（executor のスレッド）で共有する
+        self.budget = ConvertBudget(self.jobs)
+        self._site_slots: dict[str, asyncio.Semaphore] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._sessions: SessionPool | None = None
+
+    async def __aenter__(self) -> AsyncMediaTool:
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """ダウンロード用のスレッドと yt-dlp セッションを片付け、変換結果キャッシュを書き出す"""
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown)
+            self._executor = None
+        if self._sessions is not None:
+            self._sessions.close()
+            self._sessions = None
+        if self.config.CONVERT_CACHE:
+            await asyncio.to_thread(get_conversion_cache().flush)
+
+    # ------------------------------------------------------------------
+    # 変換
+    # ------------------------------------------------------------------
+    async def convert_to_format(
+        self,
+        input_path: str,
+        output_format: str,
+        *,
+        force: bool = False,
+        progress: ProgressCallback | None = None,
+        subdir: str = "",
+        timeout: float | None = None,
+    ) -> str:
+        """input_path を output_format へ変換して出力パスを返す（Converter.convert_to_format 参照）
+
+        timeout 秒を超えるかタスクがキャンセルされると ffmpeg を止め、
+        途中までの出力を消して TimeoutError / CancelledError を投げる。
+        """
+        paths = await self.convert_to_formats(
+            input_path, [output_format],
+            force=force, progress=progress, subdir=subdir, timeout=timeout,
+        )
+        return paths[0]
+
+    async def convert_to_formats(
+        self,
+        input_path: str,
+        output_formats: Sequence[str],
+        *,
+        force: bool = False,
+        progress: ProgressCallback | None = None,
+        subdir: str = "",
+        timeout: float | None = None,
+    ) -> list[str]:
+        """input_path を複数の形式へ 1 回の ffmpeg で変換し、出力パスを形式順で返す"""
+        async with asyncio.timeout(timeout):
+            return await self._convert(
+                input_path, output_formats, force=force, progress=progress, subdir=subdir
+            )
+
+    async def convert_many(
+        self,
+        input_paths: Iterable[str],
+        output_format: str | Sequence[str],
+        *,
+        force: bool = False,
+        progress: bool = False,
+        timeout: float | None = None,
+    ) -> AsyncIterator[JobEvent]:
+        """複数ファイル（ディレクトリを含む）を変換し、1 件ごとのイベントを完了順に返す
+
+        ディレクトリの扱いは Converter.convert_many と同じ（OUTPUT_DIR の下に
+        入力の階層を再現）。progress=True なら "progress" イベントも返す。
+        timeout は 1 ファイルあたり。途中で抜けると残りのジョブはキャンセルする。
+        """
+        formats = [output_format] if isinstance(output_format, str) else list(output_format)
+        inputs = await asyncio.to_thread(
+            list, expand_inputs(input_paths, exclude=[self.config.OUTPUT_DIR])
+        )
+
+        def job(path: str, subdir: str) -> _Job:
+            return lambda report: self.convert_to_formats(
+                path, formats, force=force, progress=report, subdir=subdir, timeout=timeout
+            )
+
+        try:
+            async for event in self._events([(p, job(p, sub)) for p, sub in inputs], progress):
+                yield event
+        finally:
+            if self.config.CONVERT_CACHE:
+                cache = get_conversion_cache()
+                await asyncio.to_thread(cache.evict)
+                await asyncio.to_thread(cache.flush)
+
+    async def _convert(
+        self,
+        input_path: str,
+        output_formats: Sequence[str],
+        *,
+        force: bool,
+        progress: ProgressCallback | None,
+        subdir: str,
+    ) -> list[str]:
+        conv = self.converter
+        formats = list(dict.fromkeys(conv._check_format(f) for f in output_formats))
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(
+                f"convertエラー: ファイルが存在しません: {input_path}"
+            )
+        outputs = {fmt: conv._output_path(input_path, fmt, subdir) for fmt in formats}
+
+        # ffprobe と変換済みキャッシュの確認はブロックするのでスレッドで行う
+        media, pending = await asyncio.to_thread(
+            self._plan, input_path, outputs, force=force, need_duration=progress is not None
+        )
+        streams = media["streams"] if media and self.config.STREAM_COPY else None
+        duration = media["duration"] if media else None
+
+        if pending:
+            targets = {fmt: outputs[fmt] for fmt in pending}
+            cmd = conv.build_multi_command(
+                input_path, targets, threads=self.budget.threads, streams=streams
+            )
+            first = targets[pending[0]]
+            needs = conv._space_needs(
+                input_path, targets.items(), duration=duration, streams=streams
+            )
+            # ffmpeg の枠を取ってから容量を確保する（枠を待つ間、容量を抱え込まない）
+            with span("convert", job=input_path, output=first, format=",".join(pending)):
+                async with self._ffmpeg_slot():
+                    with await self._reserve(needs, input_path):
+                        await self._run(
+                            cmd, list(targets.values()),
+                            progress=progress, input_path=input_path, duration=duration,
+                        )
+            if self.config.CONVERT_CACHE:
+                await asyncio.to_thread(self._record, input_path, targets, streams)
+        elif progress is not None:
+            progress(ConvertProgress(
+                input_path, outputs[formats[0]],
+                out_time=duration or 0.0, duration=duration, done=True,
+            ))
+        return [outputs[fmt] for fmt in formats]
+
+    def _plan(
+        self, input_path: str, outputs: dict[str, str], *, force: bool, need_duration: bool
+    ) -> tuple[dict | None, list[str]]:
+        """(probe_media の結果, 変換が必要な形式) を返す"""
+        conv = self.converter
+        media = conv._probe(input_path, need_duration=need_duration)
+        streams = media["streams"] if media and self.config.STREAM_COPY else None
+        if force or not self.config.CONVERT_CACHE:
+            return media, list(outputs)
+        cache = get_conversion_cache()
+        pending = [
+            fmt for fmt, output_path in outputs.items()
+            if not cache.lookup(
+                input_path, output_path, fmt, conv._output_args(fmt, streams),
+                fast_hash=self.config.CACHE_FAST_HASH,
+            )
+        ]
+        return media, pending
+
+    def _record(self, input_path: str, targets: dict[str, str], streams: list[dict] | None) -> None:
+        cache = get_conversion_cache()
+        for fmt, output_path in targets.items():
+            cache.record(
+                input_path, output_path, fmt, self.converter._output_args(fmt, streams),
+                fast_hash=self.config.CACHE_FAST_HASH,
+            )
+
+    @contextlib.asynccontextmanager
+    async def _ffmpeg_slot(self) -> AsyncIterator[None]:
+        """budget の枠が空くまで待って 1 つ使う（ConvertBudget.slot の非同期版、キャンセル可）"""
+        while not self.budget.try_acquire():
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            self.budget.release()
+
+    async def _reserve(self, needs: dict[str, int], label: str) -> Reservation:
+        """空き容量を確保できるまで待つ（DiskSpaceGate.reserve の非同期版、キャンセル可）"""
+        gate = get_disk_gate()
+        margin = free_space_margin(self.config)
+        timeout = disk_wait_timeout(self.config)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiting = False
+        while (reservation := gate.try_reserve(needs, margin=margin)) is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise gate.timed_out(needs, margin=margin, waited=timeout)
+            if not waiting:
+                waiting = True
+                logger.info("Waiting for disk space: %s", label, extra={"job": label})
+            await asyncio.sleep(WAIT_INTERVAL)
+        return reservation
+
+    async def _run(
+        self,
+        cmd: list[str],
+        output_paths: list[str],
+        *,
+        progress: ProgressCallback | None = None,
+        input_path: str = "",
+        duration: float | None = None,
+    ) -> None:
+        """ffmpeg を子プロセスで実行する（キャンセル時は kill して出力を消す）
+
+        呼び出し側で _ffmpeg_slot を取ってから呼ぶ。
+        """
+        output_path = output_paths[0]
+        profiler = get_profiler()
+        loglevel = "warning"
+        with contextlib.ExitStack() as stack:
+            stderr = None
+            if profiler is not None:
+                # -benchmark の結果を ffmpeg 1 回ごとのログに残す（Converter._run と同じ）
+                cmd = [cmd[0], "-benchmark", *cmd[1:]]
+                loglevel = "info"
+                log_path = profiler.ffmpeg_log(output_path)
+                stderr = stack.enter_context(open(log_path, "w", encoding="utf-8"))
+            # 端末のない常駐プロセスで使うので、進捗表示の有無にかかわらず統計表示は止める
+            flags = ["-hide_banner", "-nostats", "-loglevel", loglevel]
+            if progress is not None:
+                flags += ["-progress", "pipe:1"]
+            cmd = [cmd[0], *flags, *cmd[1:]]
+
+            job = input_path or output_path
+            with span("ffmpeg", job=job, cat="ffmpeg", output=output_path) as attrs:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE if progress is not None else None,
+                    stderr=stderr,
+                )
+                try:
+                    if progress is not None:
+                        parser = FFmpegProgressParser(input_path, output_path, duration)
+                        async for line in proc.stdout:
+                            update = parser.feed(line.decode(errors="replace"))
+                            if update is not None:
+                                progress(update)
+                    returncode = await proc.wait()
+                except BaseException:
+                    # キャンセル・タイムアウト: ffmpeg を止めて途中までの出力を消す
+                    if proc.returncode is None:
+                        proc.kill()
+                        await proc.wait()
+                    _remove(output_paths)
+                    raise
+                attrs["returncode"] = returncode
+
+        if returncode != 0:
+            _remove(output_paths)
+            raise RuntimeError(f"ffmpeg failed (exit {returncode})")
+
+    # ------------------------------------------------------------------
+    # ダウンロード
+    # ------------------------------------------------------------------
+    async def download(
+        self,
+        url: str,
+        output_format: str | None = None,
+        *,
+        items: str | None = None,
+        timeout: float | None = None,
+    ) -> list[str]:
+        """URL をダウンロード（必要なら変換）して保存パスを返す（BaseDownloader.download 参照）
+
+        timeout 秒を超えるかタスクがキャンセルされると、進行中のダウンロードと
+        変換を止め、スレッドが抜けるのを待ってから TimeoutError / CancelledError
+        を投げる。
+        """
+        from media_tool.downloaders.registry import create_downloader, site_of
+
+        site = site_of(url)
+        cancel = threading.Event()
+
+        def run() -> list[str]:
+            downloader = create_downloader(
+                site, self.config, sessions=self._get_sessions(), budget=self.budget
+            )
+            res = downloader.download(url, output_format=output_format, items=items, cancel=cancel)
+            return res if isinstance(res, list) else [res]
+
+        async with self._site_slot(site):
+            future = asyncio.get_running_loop().run_in_executor(self._get_executor(), run)
+            try:
+                async with asyncio.timeout(timeout):
+                    return await asyncio.shield(future)
+            except (asyncio.CancelledError, TimeoutError):
+                cancel.set()
+                # スレッドが止まるまで待ち、同時実行数の枠を早く返しすぎないようにする
+                with contextlib.suppress(Exception):
+                    await future
+                raise
+
+    async def download_many(
+        self,
+        urls: Iterable[str],
+        output_format: str | None = None,
+        *,
+        items: str | None = None,
+        timeout: float | None = None,
+    ) -> AsyncIterator[JobEvent]:
+        """URL 群をダウンロードし、1 URL ごとのイベントを完了順に返す
+
+        同じ動画を指す URL は最初の 1 つだけ残す。プレイリストの一部だけ
+        失敗した場合は "failed" イベントの paths に成功分が入る。
+        timeout は 1 URL あたり。
+        """
+        def job(url: str) -> _Job:
+            return lambda report: self.download(
+                url, output_format, items=items, timeout=timeout
+            )
+
+        async for event in self._events([(url, job(url)) for url in dedupe_urls(urls)], False):
+            yield event
+
+    def _site_slot(self, site: str) -> asyncio.Semaphore:
+        from media_tool.scheduler import SITE_LIMITS
+
+        if site not in self._site_slots:
+            limit = min(self.parallel, SITE_LIMITS.get(site, 1))
+            self._site_slots[site] = asyncio.Semaphore(limit)
+        return self._site_slots[site]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        from media_tool.scheduler import SITE_LIMITS
+
+        if self._executor is None:
+            # 登録済みサイトの上限の合計 + それ以外のサイトの分
+            workers = sum(min(self.parallel, n) for n in SITE_LIMITS.values()) + self.parallel
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="aio-download"
+            )
+        return self._executor
+
+    def _get_sessions(self) -> SessionPool:
+        from media_tool.downloaders.session import SessionPool
+
+        if self._sessions is None:
+            self._sessions = SessionPool()
+        return self._sessions
+
+    # ------------------------------------------------------------------
+    # イベント
+    # ------------------------------------------------------------------
+    @staticmethod
+    async def _events(
+        jobs: list[tuple[str, _Job]], progress: bool
+    ) -> AsyncIterator[JobEvent]:
+        """ジョブをすべて並行に走らせ、イベントを発生順に返す"""
+        queue: asyncio.Queue[JobEvent] = asyncio.Queue()
+
+        async def run(source: str, start: _Job) -> None:
+            report = None
+            if progress:
+                report = lambda p: queue.put_nowait(JobEvent("progress", source, progress=p))
+            try:
+                paths = await start(report)
+            except Exception as e:
+                queue.put_nowait(JobEvent("failed", source, list(getattr(e, "paths", [])), e))
+            else:
+                queue.put_nowait(JobEvent("done", source, paths))
+
+        tasks = [asyncio.create_task(run(source, start)) for source, start in jobs]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                event = await queue.get()
+                if event.kind != "progress":
+                    remaining -= 1
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,120 @@
+"""
+ダウンロード済みアーカイブ
+
+(エクストラクター, 動画 ID, 出力形式) ごとに保存先パスを SQLite に記録し、
+同じプレイリストやチャンネルを再実行したときに新しいエントリだけを取得する。
+また、1 回のバッチ内で同じ動画を指す URL をダウンロード前に取り除く。
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable
+
+from platformdirs import user_data_dir
+
+# アーカイブ DB の保存先（キャッシュではないのでデータディレクトリに置く）
+ARCHIVE_DB = os.path.join(user_data_dir("media_tool"), "downloads.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    extractor     TEXT NOT NULL,
+    video_id      TEXT NOT NULL,
+    format        TEXT NOT NULL,
+    path          TEXT NOT NULL,
+    title         TEXT,
+    url           TEXT,
+    downloaded_at REAL NOT NULL,
+    PRIMARY KEY (extractor, video_id, format)
+)
+"""
+
+
+def archive_key(info: dict) -> tuple[str, str] | None:
+    """yt-dlp の info（フラット抽出のエントリも可）から (エクストラクター, ID) を得る"""
+    extractor = info.get("extractor_key") or info.get("ie_key")
+    video_id = info.get("id")
+    if not extractor or not video_id:
+        return None
+    return extractor.lower(), str(video_id)
+
+
+def url_key(url: str) -> tuple[str, str] | None:
+    """ネットワークに触れずに URL から (エクストラクター, ID) を推定する"""
+    from yt_dlp.extractor import gen_extractor_classes
+
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == "Generic" or not ie.suitable(url):
+            continue
+        video_id = ie.get_temp_id(url)
+        return (ie.ie_key().lower(), video_id) if video_id else None
+    return None
+
+
+def dedupe_urls(urls: Iterable[str]) -> list[str]:
+    """同じ動画を指す URL を、最初に現れたものだけ残して取り除く"""
+    seen: set = set()
+    unique: list[str] = []
+    for url in urls:
+        key = url_key(url) or url.strip()
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(url)
+    return unique
+
+
+class DownloadArchive:
+    """ダウンロード済み動画の記録（スレッドセーフ）"""
+
+    def __init__(self, db_path: str = ARCHIVE_DB) -> None:
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(_SCHEMA)
+
+    def lookup(self, key: tuple[str, str], output_format: str) -> str | None:
+        """記録済みで保存先ファイルも残っていればそのパスを返す"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM downloads WHERE extractor = ? AND video_id = ? AND format = ?",
+                (*key, output_format),
+            ).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return row[0]
+
+    def record(
+        self,
+        key: tuple[str, str],
+        output_format: str,
+        path: str,
+        *,
+        title: str | None = None,
+        url: str | None = None,
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, output_format, os.path.abspath(path), title, url, time.time()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_shared: DownloadArchive | None = None
+_shared_lock = threading.Lock()
+
+
+def get_download_archive() -> DownloadArchive:
+    """プロセス内で共有する DownloadArchive"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = DownloadArchive()
+        return _shared
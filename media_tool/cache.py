@@ -0,0 +1,187 @@
+"""
+変換結果キャッシュ
+
+入力ファイルの指紋（サイズ・mtime・任意で先頭/末尾の高速ハッシュ）、出力形式、
+エンコードオプションを出力ファイルごとに記録し、同じ条件の変換がすでに済んでいて
+出力も当時のまま残っていれば ffmpeg を起動せずに再利用する。
+記録・最終利用日時の更新はメモリ上で行い、ファイルへは flush でまとめて書き出す
+（変換 1 件ごとに索引全体を書き直さない）。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from media_tool.utils import CACHE_DIR, write_json_atomic
+
+# 変換記録の保存先
+CONVERSIONS_INDEX = os.path.join(CACHE_DIR, "conversions.json")
+
+# 最終利用からこの日数を過ぎた記録は破棄する
+MAX_AGE_DAYS = 90
+# 記録の上限件数（超えた分は最終利用が古いものから破棄）
+MAX_ENTRIES = 10000
+# 高速ハッシュで読む先頭・末尾のバイト数
+HASH_CHUNK = 1024 * 1024
+
+
+def fingerprint(path: str, *, fast_hash: bool = False) -> dict:
+    """ファイルの指紋（サイズ・mtime、fast_hash 時は先頭と末尾のハッシュ）"""
+    st = os.stat(path)
+    fp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if fast_hash:
+        h = hashlib.blake2b(str(st.st_size).encode(), digest_size=16)
+        with open(path, "rb") as f:
+            h.update(f.read(HASH_CHUNK))
+            if st.st_size > HASH_CHUNK:
+                f.seek(max(st.st_size - HASH_CHUNK, HASH_CHUNK))
+                h.update(f.read(HASH_CHUNK))
+        fp["hash"] = h.hexdigest()
+    return fp
+
+
+def _output_state(path: str) -> dict | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if st.st_size == 0:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class ConversionCache:
+    """出力パスをキーにした変換記録（スレッドセーフ）"""
+
+    def __init__(self, index_path: str = CONVERSIONS_INDEX) -> None:
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] | None = None
+        self._dirty = False
+
+    def lookup(
+        self, input_path: str, output_path: str, output_format: str, args: list[str],
+        *, fast_hash: bool = False,
+    ) -> bool:
+        """同じ入力・形式・オプションの有効な出力が残っていれば True"""
+        with self._lock:
+            entry = self._load().get(os.path.abspath(output_path))
+        if entry is None:
+            return False
+        if (
+            entry["input"] != os.path.abspath(input_path)
+            or entry["format"] != output_format
+            or entry["args"] != args
+            or entry["output"] != _output_state(output_path)
+        ):
+            return False
+        # 記録時にハッシュを取っていればハッシュまで照合する
+        use_hash = fast_hash or "hash" in entry["input_fp"]
+        try:
+            current = fingerprint(input_path, fast_hash=use_hash)
+        except OSError:
+            return False
+        if current != entry["input_fp"]:
+            return False
+
+        with self._lock:
+            entry["last_used"] = time.time()
+            self._dirty = True
+        return True
+
+    def record(
+        self, input_path: str, output_path: str, output_format: str, args: list[str],
+        *, fast_hash: bool = False,
+    ) -> None:
+        """変換が完了した出力を記録する（書き出しは flush で行う）"""
+        output = _output_state(output_path)
+        if output is None:
+            return
+        try:
+            input_fp = fingerprint(input_path, fast_hash=fast_hash)
+        except OSError:
+            return
+        with self._lock:
+            self._load()[os.path.abspath(output_path)] = {
+                "input": os.path.abspath(input_path),
+                "input_fp": input_fp,
+                "format": output_format,
+                "args": args,
+                "output": output,
+                "last_used": time.time(),
+            }
+            self._dirty = True
+
+    def flush(self) -> None:
+        """record・lookup で更新した記録を書き出す（変更がなければ何もしない）"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def evict(self, *, max_age_days: float = MAX_AGE_DAYS, max_entries: int = MAX_ENTRIES) -> int:
+        """古くなった記録を破棄し、破棄した件数を返す
+
+        出力が消えた・書き換えられた、入力が消えた、最終利用から max_age_days
+        を過ぎた記録を削除し、max_entries を超えた分は最終利用が古い順に削除する。
+        """
+        with self._lock:
+            entries = self._load()
+            before = len(entries)
+            self._evict(entries, max_age_days, max_entries)
+            removed = before - len(entries)
+            if removed:
+                self._save(evict=False)
+            return removed
+
+    # ------------------------------------------------------------------
+    # 内部処理（self._lock 取得済みで呼ぶ）
+    # ------------------------------------------------------------------
+    def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self, *, evict: bool = True) -> None:
+        entries = self._load()
+        if evict and len(entries) > MAX_ENTRIES:
+            self._evict(entries, MAX_AGE_DAYS, MAX_ENTRIES)
+        try:
+            write_json_atomic(self.index_path, entries)
+            self._dirty = False
+        except OSError:
+            pass  # 記録できなくても変換自体には影響しない
+
+    @staticmethod
+    def _evict(entries: dict[str, dict], max_age_days: float, max_entries: int) -> None:
+        deadline = time.time() - max_age_days * 86400
+        for output_path, entry in list(entries.items()):
+            if (
+                entry["last_used"] < deadline
+                or entry["output"] != _output_state(output_path)
+                or not os.path.exists(entry["input"])
+            ):
+                del entries[output_path]
+        if len(entries) > max_entries:
+            oldest = sorted(entries, key=lambda k: entries[k]["last_used"])
+            for output_path in oldest[: len(entries) - max_entries]:
+                del entries[output_path]
+
+
+_shared: ConversionCache | None = None
+_shared_lock = threading.Lock()
+
+
+def get_conversion_cache() -> ConversionCache:
+    """プロセス内で共有する ConversionCache"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ConversionCache()
+        return _shared
@@ -0,0 +1,81 @@
+"""
+プレイリストのダウンロード進捗チェックポイント
+
+(プレイリスト URL, 出力形式) ごとに、完了したエントリの保存先と失敗した
+エントリを JSON に記録する。途中で失敗・中断したプレイリストを再実行すると、
+記録済みのエントリを飛ばして続きから処理する。すべて成功したら削除する。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+
+from platformdirs import user_data_dir
+
+from media_tool.archive import archive_key
+from media_tool.utils import write_json_atomic
+
+# チェックポイントの保存先（失われると再ダウンロードになるのでデータディレクトリに置く）
+CHECKPOINT_DIR = os.path.join(user_data_dir("media_tool"), "checkpoints")
+
+
+def entry_id(entry: dict) -> str:
+    """エントリを識別する文字列（フラット抽出のエントリも可）"""
+    key = archive_key(entry)
+    if key is not None:
+        return ":".join(key)
+    return str(entry.get("webpage_url") or entry.get("url") or entry.get("id"))
+
+
+class PlaylistCheckpoint:
+    """1 プレイリスト分の完了・失敗エントリの記録（スレッドセーフ）"""
+
+    def __init__(self, url: str, output_format: str, *, directory: str = CHECKPOINT_DIR) -> None:
+        digest = hashlib.sha1(f"{url}\0{output_format}".encode("utf-8")).hexdigest()
+        self.path = os.path.join(directory, f"{digest}.json")
+        self.url = url
+        self.output_format = output_format
+        self._lock = threading.Lock()
+        self.done: dict[str, str] = {}
+        self.failed: dict[str, str] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.done = dict(data.get("done", {}))
+            self.failed = dict(data.get("failed", {}))
+        except (OSError, ValueError, AttributeError):
+            pass  # 無い・壊れている場合は最初から
+
+    def lookup(self, entry: dict) -> str | None:
+        """完了済みで保存先ファイルも残っていればそのパスを返す"""
+        with self._lock:
+            path = self.done.get(entry_id(entry))
+        return path if path and os.path.exists(path) else None
+
+    def mark_done(self, entry: dict, path: str) -> None:
+        eid = entry_id(entry)
+        with self._lock:
+            self.done[eid] = os.path.abspath(path)
+            self.failed.pop(eid, None)
+            self._save()
+
+    def mark_failed(self, entry: dict, error: Exception) -> None:
+        with self._lock:
+            self.failed[entry_id(entry)] = str(error)
+            self._save()
+
+    def clear(self) -> None:
+        """プレイリストが完了したのでチェックポイントを削除する"""
+        with self._lock:
+            try: os.remove(self.path)
+            except FileNotFoundError: pass
+
+    def _save(self) -> None:
+        write_json_atomic(self.path, {
+            "url": self.url,
+            "format": self.output_format,
+            "done": self.done,
+            "failed": self.failed,
+        })
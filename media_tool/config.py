@@ -2,13 +2,78 @@ import os
 import json
 from platformdirs import user_downloads_dir, user_documents_dir
 
+# config.json に保存されるユーザー設定キー
+_USER_KEYS = (
+    "OUTPUT_DIR", "DOWNLOAD_DIR", "DEFAULT_FORMAT", "LOG_LEVEL", "CONVERT_JOBS",
+    "DOWNLOAD_PARALLEL", "STREAM_DOWNLOADS", "CONVERT_CACHE", "CACHE_FAST_HASH",
+    "DOWNLOAD_ARCHIVE", "STREAM_COPY", "ENCODE_PROFILE", "SERVICE_URL",
+    "DOWNLOAD_RETRIES", "INFO_CACHE_TTL", "CONVERT_SEGMENTS", "SCRATCH_DIR",
+    "MIN_FREE_SPACE_MB", "DISK_WAIT_TIMEOUT",
+)
+
+# エンコード設定のプロファイル（速度と画質・音質のトレードオフ）
+#   x264_*: mp4 (libx264)、vp9_*: webm (libvpx-vp9)
+#   audio_bitrate: aac / mp3 / vorbis、opus_bitrate: opus
+#   threads: ffmpeg の -threads（0 = ffmpeg に任せる。並列変換時は自動配分が優先）
+ENCODE_PROFILES: dict[str, dict] = {
+    "fast": {
+        "x264_preset": "veryfast", "x264_crf": 26,
+        "vp9_crf": 36, "vp9_deadline": "realtime", "vp9_cpu_used": 8, "vp9_row_mt": True,
+        "audio_bitrate": "128k", "opus_bitrate": "96k",
+        "threads": 0,
+    },
+    "balanced": {
+        "x264_preset": "medium", "x264_crf": 23,
+        "vp9_crf": 32, "vp9_deadline": "good", "vp9_cpu_used": 2, "vp9_row_mt": True,
+        "audio_bitrate": "192k", "opus_bitrate": "128k",
+        "threads": 0,
+    },
+    "archive": {
+        "x264_preset": "slow", "x264_crf": 18,
+        "vp9_crf": 24, "vp9_deadline": "good", "vp9_cpu_used": 0, "vp9_row_mt": True,
+        "audio_bitrate": "320k", "opus_bitrate": "192k",
+        "threads": 0,
+    },
+}
+
 
 class Config:
     def __init__(self):
         self.OUTPUT_DIR = user_documents_dir()
         self.DOWNLOAD_DIR = user_downloads_dir()
+        # 中間ファイル（変換前のダウンロード・分割エンコードの区間など）の置き場所
+        # tmpfs や高速なローカル SSD を指定する（空 = DOWNLOAD_DIR / OUTPUT_DIR をそのまま使う）
+        self.SCRATCH_DIR = ""
+        # 変換・ダウンロードの書き込み予定とは別に、保存先のディスクに常に残す空き容量（MiB）
+        self.MIN_FREE_SPACE_MB = 256
+        # 空き容量が足りないときに、ほかのジョブが書き終えるのを待つ上限（秒、0 = 無期限）
+        self.DISK_WAIT_TIMEOUT = 3600
         self.DEFAULT_FORMAT = "mp3"
         self.LOG_LEVEL = "INFO"
+        # 同時に走らせる ffmpeg の数（0 = CPU コア数に合わせて自動）
+        self.CONVERT_JOBS = 0
+        # 長い動画の mp4 / webm 変換を何区間に分けて並列エンコードするか（1 = 分割しない、0 = CPU コア数）
+        self.CONVERT_SEGMENTS = 1
+        # サイトごとの同時ダウンロード数（サイト別の上限でさらに制限される）
+        self.DOWNLOAD_PARALLEL = 1
+        # 一時的なエラー（切断・タイムアウト・429/5xx）で再試行する回数（指数バックオフ）
+        self.DOWNLOAD_RETRIES = 3
+        # URL の抽出結果（プレイリストのエントリ一覧など）を再利用する秒数（0 = 使わない）
+        self.INFO_CACHE_TTL = 3600
+        # 変換が必要なダウンロードを中間ファイルなしで ffmpeg に直接流す
+        self.STREAM_DOWNLOADS = False
+        # 同じ入力・同じ設定の変換済み出力が残っていれば再変換しない
+        self.CONVERT_CACHE = True
+        # 変換済み判定にサイズ・mtime に加えて先頭/末尾のハッシュも使う
+        self.CACHE_FAST_HASH = False
+        # ダウンロード済みの動画を記録し、再実行時は新しいものだけ取得する
+        self.DOWNLOAD_ARCHIVE = True
+        # 入力のコーデックが出力先にそのまま入る場合は再エンコードせずコピーする
+        self.STREAM_COPY = True
+        # エンコード設定のプロファイル名（ENCODE_PROFILES のキー）
+        self.ENCODE_PROFILE = "balanced"
+        # ジョブサービス（serve / --submit）の待ち受けアドレス
+        self.SERVICE_URL = "http://127.0.0.1:8765"
         self.BASE_DIR = os.path.abspath(os.path.dirname(__file__))
         self.ROOT_DIR = os.path.dirname(self.BASE_DIR)
         self.CONFIG_PATH = os.path.join(self.ROOT_DIR, "config.json")
@@ -17,7 +82,7 @@ class Config:
         if os.path.exists(config_path):
             with open(config_path, "r", encoding="utf-8") as f:
                 config_data = json.load(f)
-            for key in ["OUTPUT_DIR", "DOWNLOAD_DIR", "DEFAULT_FORMAT", "LOG_LEVEL"]:
+            for key in _USER_KEYS:
                 if key in config_data:
                     setattr(self, key, config_data[key])
 
@@ -28,20 +93,42 @@ class Config:
             errors.append("OUTPUT_DIR")
         if not os.path.isdir(self.DOWNLOAD_DIR):
             errors.append("DOWNLOAD_DIR")
+        if not isinstance(self.SCRATCH_DIR, str) or (
+            self.SCRATCH_DIR and not os.path.isdir(self.SCRATCH_DIR)
+        ):
+            errors.append("SCRATCH_DIR")
+        if not isinstance(self.MIN_FREE_SPACE_MB, (int, float)) or self.MIN_FREE_SPACE_MB < 0:
+            errors.append("MIN_FREE_SPACE_MB")
+        if not isinstance(self.DISK_WAIT_TIMEOUT, (int, float)) or self.DISK_WAIT_TIMEOUT < 0:
+            errors.append("DISK_WAIT_TIMEOUT")
         if self.DEFAULT_FORMAT not in get_ffmpeg_supported_formats():
             errors.append("DEFAULT_FORMAT")
         if self.LOG_LEVEL not in {"DEBUG", "INFO", "WARNING", "ERROR"}:
             errors.append("LOG_LEVEL")
+        if self.ENCODE_PROFILE not in ENCODE_PROFILES:
+            errors.append("ENCODE_PROFILE")
+        if not isinstance(self.CONVERT_JOBS, int) or self.CONVERT_JOBS < 0:
+            errors.append("CONVERT_JOBS")
+        if not isinstance(self.CONVERT_SEGMENTS, int) or self.CONVERT_SEGMENTS < 0:
+            errors.append("CONVERT_SEGMENTS")
+        if not isinstance(self.DOWNLOAD_PARALLEL, int) or self.DOWNLOAD_PARALLEL < 1:
+            errors.append("DOWNLOAD_PARALLEL")
+        if not isinstance(self.SERVICE_URL, str) or not self.SERVICE_URL.startswith("http://"):
+            errors.append("SERVICE_URL")
+        if not isinstance(self.DOWNLOAD_RETRIES, int) or self.DOWNLOAD_RETRIES < 0:
+            errors.append("DOWNLOAD_RETRIES")
+        if not isinstance(self.INFO_CACHE_TTL, (int, float)) or self.INFO_CACHE_TTL < 0:
+            errors.append("INFO_CACHE_TTL")
+        if not isinstance(self.STREAM_DOWNLOADS, bool):
+            errors.append("STREAM_DOWNLOADS")
+        for key in ("CONVERT_CACHE", "CACHE_FAST_HASH", "DOWNLOAD_ARCHIVE", "STREAM_COPY"):
+            if not isinstance(getattr(self, key), bool):
+                errors.append(key)
         if errors:
             raise ValueError(f"Invalid config values: {', '.join(errors)}")
 
     def save(self, config_path):
-        new_config = {
-            "OUTPUT_DIR": self.OUTPUT_DIR,
-            "DOWNLOAD_DIR": self.DOWNLOAD_DIR,
-            "DEFAULT_FORMAT": self.DEFAULT_FORMAT,
-            "LOG_LEVEL": self.LOG_LEVEL
-        }
+        new_config = self.get_config_dict()
         try:
             with open(config_path, "w", encoding="utf-8") as f:
                 json.dump(new_config, f, indent=2, ensure_ascii=False)
@@ -51,9 +138,4 @@ class Config:
             raise
     
     def get_config_dict(self):
-        return {
-                "OUTPUT_DIR": self.OUTPUT_DIR,
-                "DOWNLOAD_DIR": self.DOWNLOAD_DIR,
-                "DEFAULT_FORMAT": self.DEFAULT_FORMAT,
-                "LOG_LEVEL": self.LOG_LEVEL,
-            }
\ No newline at end of file
+        return {key: getattr(self, key) for key in _USER_KEYS}
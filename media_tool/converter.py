@@ -1,73 +1,880 @@
+import contextlib
+import glob
 import os
+import shutil
 import subprocess
-from media_tool.config import Config
-from media_tool.utils import check_ffmpeg_installed, get_ffmpeg_supported_formats
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import IO, Callable, ContextManager, Iterable, Iterator, Sequence
 
-# ffmpeg の存在確認
-check_ffmpeg_installed()
-
-# ffmpeg が扱える拡張子一覧
-SUPPORTED_FORMATS = get_ffmpeg_supported_formats()
+from media_tool.cache import get_conversion_cache
+from media_tool.config import ENCODE_PROFILES, Config
+from media_tool.diskspace import (
+    bitrate_bytes, disk_wait_timeout, free_space_margin, get_disk_gate,
+)
+from media_tool.probe import probe_media, stream_codecs
+from media_tool.progress import ConvertProgress, FFmpegProgressParser, ProgressCallback
+from media_tool.trace import get_profiler, span
+from media_tool.utils import (
+    check_ffmpeg_installed, get_ffmpeg_supported_formats, has_ffmpeg_encoder, iter_media_files,
+)
 
 # 音声／映像フォーマット分類
 AUDIO_ONLY_FORMATS = {"mp3", "m4a", "aac", "ogg", "wav", "flac", "opus"}
 VIDEO_FORMATS = {"mp4", "webm", "mkv", "flv", "3gp"}
+LOSSLESS_AUDIO_FORMATS = {"wav", "flac"}
+
+# 標準入力（パイプ）からシークせずにデコードできる入力コンテナ
+# mp4 / m4a / mov / 3gp は moov が末尾にあり得るためシークが必要
+PIPEABLE_FORMATS = {"webm", "mkv", "flv", "ts", "mp3", "ogg", "opus", "aac", "wav", "flac"}
+
+# 出力コンテナへ再エンコードせずにコピーできるコーデック（ffprobe の codec_name）
+COPY_COMPATIBLE: dict[str, dict[str, set[str]]] = {
+    "mp4": {"video": {"h264", "hevc", "av1", "mpeg4"}, "audio": {"aac", "mp3", "alac", "opus"}},
+    "webm": {"video": {"vp8", "vp9", "av1"}, "audio": {"opus", "vorbis"}},
+    "m4a": {"audio": {"aac", "alac"}},
+    "aac": {"audio": {"aac"}},
+    "mp3": {"audio": {"mp3"}},
+    "ogg": {"audio": {"vorbis", "opus", "flac"}},
+    "opus": {"audio": {"opus"}},
+    "flac": {"audio": {"flac"}},
+    "wav": {"audio": {"pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_f32le", "pcm_u8"}},
+}
+
+
+def __getattr__(name: str):
+    # ffmpeg が扱える拡張子一覧（SUPPORTED_FORMATS）は初回参照時にキャッシュから読む
+    if name == "SUPPORTED_FORMATS":
+        return get_ffmpeg_supported_formats()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# 分割並列エンコード: これより短い入力は分割しない／1 区間の最短の長さ（秒）
+SEGMENT_MIN_DURATION = 120.0
+SEGMENT_MIN_LENGTH = 30.0
+
+# 実行中の ffmpeg が取り消されていないかを確認する間隔（秒）
+CANCEL_POLL_INTERVAL = 0.2
+
+# wav / flac 出力のサイズ見積もりに使うビットレート（48kHz・16bit・ステレオ）
+PCM_BITRATE = 48000 * 16 * 2
+
+
+# 1 ファイル分の変換結果を受け取るコールバック (入力, 出力 or None, 例外 or None)
+ResultCallback = Callable[[str, str | None, Exception | None], None]
+
+
+class JobCancelled(Exception):
+    """cancel（threading.Event）がセットされて処理を中断した"""
+
+
+def resolve_jobs(jobs: int, total: int | None = None) -> int:
+    """同時変換数を決定する（0 以下は CPU コア数、件数より多くはしない）"""
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    if total is not None:
+        jobs = min(jobs, max(total, 1))
+    return max(jobs, 1)
+
+
+def expand_inputs(
+    inputs: Iterable[str], *, exclude: Sequence[str] = ()
+) -> Iterator[tuple[str, str]]:
+    """入力（ファイル or ディレクトリ）を (ファイルパス, 出力先のサブディレクトリ) にして順に返す
+
+    ディレクトリは再帰的に走査しながら ffmpeg が読める拡張子のファイルだけを返し、
+    サブディレクトリは「ディレクトリ名/相対パス」（出力先で元の階層を再現する）。
+    ファイルの指定はそのまま（サブディレクトリなし）返す。exclude の
+    ディレクトリ（出力先など）には入らない。
+    """
+    extensions = {f.lower() for f in get_ffmpeg_supported_formats()}
+    excluded = {os.path.abspath(d) for d in exclude}
+    for inp in inputs:
+        if not os.path.isdir(inp):
+            yield inp, ""
+            continue
+        root = os.path.abspath(inp)
+        name = os.path.basename(root)
+        for path in iter_media_files(root, recursive=True, exclude=excluded):
+            if os.path.splitext(path)[1].lstrip(".").lower() in extensions:
+                rel = os.path.relpath(os.path.dirname(path), root)
+                yield path, os.path.normpath(os.path.join(name, rel))
+
+
+def _kill_on_cancel(proc: subprocess.Popen, cancel: threading.Event) -> None:
+    """cancel がセットされたら proc を止める監視スレッドを起動する（proc の終了で抜ける）"""
+    def watch() -> None:
+        while proc.poll() is None:
+            if cancel.wait(CANCEL_POLL_INTERVAL):
+                proc.kill()
+                return
+
+    threading.Thread(target=watch, name="ffmpeg-cancel", daemon=True).start()
+
+
+class ConvertBudget:
+    """同時に走らせる変換（ffmpeg）の数の上限を、複数の呼び出し元で共有する枠
+
+    サービスや GUI のように変換ジョブとダウンロード後の変換が並行する場合に、
+    1 つを全体で共有して ffmpeg の数を jobs までに抑える（分割並列エンコードは
+    1 件で 1 枠と数える）。
+    """
+
+    def __init__(self, jobs: int) -> None:
+        self.jobs = max(jobs, 1)
+        self._slots = threading.BoundedSemaphore(self.jobs)
+
+    @property
+    def threads(self) -> int | None:
+        """変換 1 件あたりの ffmpeg -threads 値"""
+        return threads_per_job(self.jobs)
+
+    @contextlib.contextmanager
+    def slot(self, *, cancel: threading.Event | None = None, label: str = "") -> Iterator[None]:
+        """枠が空くまで待って 1 つ使う（待っている間に cancel がセットされたら JobCancelled）"""
+        while not self._slots.acquire(timeout=CANCEL_POLL_INTERVAL):
+            if cancel is not None and cancel.is_set():
+                raise JobCancelled(label)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def try_acquire(self) -> bool:
+        """待たずに枠を 1 つ取る（取れたら True。使い終わったら release で返す）"""
+        return self._slots.acquire(blocking=False)
+
+    def release(self) -> None:
+        self._slots.release()
+
+
+def threads_per_job(jobs: int) -> int | None:
+    """並列ジョブ 1 本あたりの ffmpeg -threads 値（単独実行なら ffmpeg 既定に任せる）"""
+    if jobs <= 1:
+        return None
+    return max((os.cpu_count() or 1) // jobs, 1)
 
 
 class Converter:
     """形式変換ユーティリティ"""
 
-    def __init__(self, config: Config | None = None) -> None:
-        self.config: Config = config or Config()
-        self.config.load(self.config.CONFIG_PATH)
+    def __init__(
+        self,
+        config: Config | None = None,
+        *,
+        profile: str | None = None,
+        budget: ConvertBudget | None = None,
+    ) -> None:
+        # 渡された Config は呼び出し側の上書きを含むので読み直さない
+        if config is None:
+            config = Config()
+            config.load(config.CONFIG_PATH)
+        self.config: Config = config
+        check_ffmpeg_installed()
         os.makedirs(self.config.OUTPUT_DIR, exist_ok=True)
+        # 中間ファイル（分割エンコードの区間など）の置き場所。未設定なら OUTPUT_DIR
+        self.scratch_dir: str = self.config.SCRATCH_DIR or self.config.OUTPUT_DIR
+        os.makedirs(self.scratch_dir, exist_ok=True)
 
-    def convert_to_format(self, input_path: str, output_format: str) -> str:
-        """input_path を output_format へ変換し、OUTPUT_DIR に保存してパスを返す"""
-        output_format = output_format.lower()
+        # エンコード設定（未指定なら Config.ENCODE_PROFILE）
+        self.profile_name: str = profile or self.config.ENCODE_PROFILE
+        if self.profile_name not in ENCODE_PROFILES:
+            raise ValueError(f"未知のエンコードプロファイルです: {self.profile_name}")
+        self.profile: dict = ENCODE_PROFILES[self.profile_name]
+        # 渡されたら ffmpeg を動かす間その枠を 1 つ使う（呼び出し元全体での同時実行数の制限）
+        self.budget = budget
 
-        # ── 妥当性チェック ────────────────────────────────
-        if output_format not in SUPPORTED_FORMATS:
-            raise ValueError(
-                f"convertエラー: ffmpeg でサポートされていないフォーマットです: {output_format}"
-            )
+    def convert_to_format(
+        self,
+        input_path: str,
+        output_format: str,
+        *,
+        threads: int | None = None,
+        force: bool = False,
+        progress: ProgressCallback | None = None,
+        segments: int | None = None,
+        subdir: str = "",
+        cancel: threading.Event | None = None,
+    ) -> str:
+        """input_path を output_format へ変換し、OUTPUT_DIR に保存してパスを返す
+
+        threads を指定すると ffmpeg の -threads に渡す（並列変換時の CPU 配分用）。
+        segments が 2 以上（未指定時は Config.CONVERT_SEGMENTS、0 = CPU コア数）で
+        長い動画を mp4 / webm へ再エンコードする場合は、キーフレーム位置で
+        分割した区間を並列にエンコードしてから結合する。
+        同じ入力・同じ設定で変換済みの出力が残っていれば ffmpeg を実行せずに
+        そのパスを返す（Config.CONVERT_CACHE、force=True で無視）。
+        progress を渡すと ffmpeg の進捗（再生位置・fps・速度・残り時間）を
+        逐次通知する。subdir を指定すると OUTPUT_DIR/subdir に保存する
+        （ディレクトリ入力の階層の再現用）。cancel をセットすると実行中の
+        ffmpeg を止め、途中までの出力を消して JobCancelled を投げる。
+        出力と中間ファイルの分の空き容量を見積もって確保し、足りなければ
+        ほかのジョブが書き終えるまで開始を待つ（diskspace）。
+        """
+        output_format = self._check_format(output_format)
         if not os.path.exists(input_path):
             raise FileNotFoundError(
                 f"convertエラー: ファイルが存在しません: {input_path}"
             )
 
         # ── 出力ファイルパス ──────────────────────────────
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        output_path = self._output_path(input_path, output_format, subdir)
+
+        with span("convert", job=input_path, output=output_path, format=output_format) as attrs:
+            # ── 入力の解析（コピー可否の判定・残り時間の算出用）─────
+            segments = self._resolve_segments(output_format, segments)
+            media = self._probe(input_path, need_duration=progress is not None or segments > 1)
+            streams = media["streams"] if media and self.config.STREAM_COPY else None
+            duration = media["duration"] if media else None
+
+            # ── 変換済みキャッシュ ────────────────────────────
+            args = self._output_args(output_format, streams)
+            cache = get_conversion_cache() if self.config.CONVERT_CACHE else None
+            fast_hash = self.config.CACHE_FAST_HASH
+            if cache and not force and cache.lookup(
+                input_path, output_path, output_format, args, fast_hash=fast_hash
+            ):
+                attrs["cached"] = True
+                if progress is not None:
+                    progress(ConvertProgress(
+                        input_path, output_path,
+                        out_time=duration or 0.0, duration=duration, done=True,
+                    ))
+                return output_path
+
+            # ── 実行 ────────────────────────────────────────
+            attrs["segments"] = self._convert_single(
+                input_path, output_format, output_path, media=media, segments=segments,
+                threads=threads, progress=progress, cancel=cancel,
+            )
+            if cache:
+                cache.record(input_path, output_path, output_format, args, fast_hash=fast_hash)
+            return output_path
+
+    def _convert_single(
+        self,
+        input_path: str,
+        output_format: str,
+        output_path: str,
+        *,
+        media: dict | None,
+        segments: int,
+        threads: int | None,
+        progress: ProgressCallback | None,
+        cancel: threading.Event | None,
+    ) -> int:
+        """1 形式への変換を実行して実際の分割数を返す（入力の解析とキャッシュ確認は呼び出し側）"""
+        streams = media["streams"] if media and self.config.STREAM_COPY else None
+        duration = media["duration"] if media else None
+        segments = self._segment_count(output_format, segments, media, streams)
+        needs = self._space_needs(
+            input_path, [(output_format, output_path)],
+            duration=duration, streams=streams, segmented=segments > 1,
+        )
+        with (
+            self.slot(cancel, input_path),
+            get_disk_gate().reserve(
+                needs, margin=free_space_margin(self.config), cancel=cancel,
+                label=input_path, timeout=disk_wait_timeout(self.config),
+            ),
+        ):
+            if segments > 1:
+                self._convert_segmented(
+                    input_path, output_format, output_path,
+                    segments=segments, media=media, streams=streams, progress=progress,
+                    cancel=cancel,
+                )
+            else:
+                cmd = self.build_command(
+                    input_path, output_format, output_path, threads=threads, streams=streams
+                )
+                self._run(
+                    cmd, output_path, progress=progress, input_path=input_path,
+                    duration=duration, cancel=cancel,
+                )
+        return segments
+
+    def convert_to_formats(
+        self,
+        input_path: str,
+        output_formats: Sequence[str],
+        *,
+        threads: int | None = None,
+        force: bool = False,
+        progress: ProgressCallback | None = None,
+        subdir: str = "",
+        cancel: threading.Event | None = None,
+    ) -> list[str]:
+        """input_path を複数の形式へ 1 回の ffmpeg 実行で変換し、出力パスを形式順で返す
+
+        入力の読み込み・デコードは 1 回だけで、各出力のエンコードに共有される。
+        変換済みキャッシュが有効な形式は出力から外す。残りが 1 形式なら
+        convert_to_format と同じ処理（分割並列エンコードを含む）になる。
+        progress の output_path は最初の出力。subdir・cancel は convert_to_format と同じ。
+        """
+        formats = list(dict.fromkeys(self._check_format(f) for f in output_formats))
+        if len(formats) == 1:
+            return [self.convert_to_format(
+                input_path, formats[0],
+                threads=threads, force=force, progress=progress, subdir=subdir, cancel=cancel,
+            )]
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(
+                f"convertエラー: ファイルが存在しません: {input_path}"
+            )
+
+        outputs = {fmt: self._output_path(input_path, fmt, subdir) for fmt in formats}
+        # 残りが 1 形式で分割エンコードになる場合に備え、その長さもここで取っておく
+        segments = {fmt: self._resolve_segments(fmt, None) for fmt in formats}
+        media = self._probe(
+            input_path,
+            need_duration=progress is not None or any(n > 1 for n in segments.values()),
+        )
+        streams = media["streams"] if media and self.config.STREAM_COPY else None
+        duration = media["duration"] if media else None
+
+        # ── 変換済みキャッシュ（形式ごと）──────────────────
+        cache = get_conversion_cache() if self.config.CONVERT_CACHE else None
+        fast_hash = self.config.CACHE_FAST_HASH
+        pending = [
+            fmt for fmt in formats
+            if not (cache and not force and cache.lookup(
+                input_path, outputs[fmt], fmt, self._output_args(fmt, streams),
+                fast_hash=fast_hash,
+            ))
+        ]
+        if len(pending) == 1:
+            # 入力の解析とキャッシュの確認は済んでいるので、実行だけ convert_to_format と共有する
+            fmt = pending[0]
+            with span("convert", job=input_path, output=outputs[fmt], format=fmt) as attrs:
+                attrs["segments"] = self._convert_single(
+                    input_path, fmt, outputs[fmt], media=media, segments=segments[fmt],
+                    threads=threads, progress=progress, cancel=cancel,
+                )
+        elif pending:
+            # ── 実行: 1 入力 → 複数出力 ───────────────────────
+            cmd = self.build_multi_command(
+                input_path, {fmt: outputs[fmt] for fmt in pending}, threads=threads, streams=streams
+            )
+            first = outputs[pending[0]]
+            needs = self._space_needs(
+                input_path, [(fmt, outputs[fmt]) for fmt in pending],
+                duration=duration, streams=streams,
+            )
+            try:
+                with (
+                    span("convert", job=input_path, output=first, format=",".join(pending)),
+                    self.slot(cancel, input_path),
+                    get_disk_gate().reserve(
+                        needs, margin=free_space_margin(self.config), cancel=cancel,
+                        label=input_path, timeout=disk_wait_timeout(self.config),
+                    ),
+                ):
+                    self._run(
+                        cmd, first, progress=progress, input_path=input_path,
+                        duration=duration, cancel=cancel,
+                    )
+            except Exception:
+                for fmt in pending[1:]:
+                    try: os.remove(outputs[fmt])
+                    except FileNotFoundError: pass
+                raise
+        if cache:
+            for fmt in pending:
+                cache.record(
+                    input_path, outputs[fmt], fmt, self._output_args(fmt, streams),
+                    fast_hash=fast_hash,
+                )
+        if not pending and progress is not None:
+            progress(ConvertProgress(
+                input_path, outputs[formats[0]],
+                out_time=duration or 0.0, duration=duration, done=True,
+            ))
+        return [outputs[fmt] for fmt in formats]
+
+    def convert_stream(
+        self,
+        source: IO[bytes],
+        base_name: str,
+        output_format: str,
+        *,
+        threads: int | None = None,
+        progress: ProgressCallback | None = None,
+        cancel: threading.Event | None = None,
+    ) -> str:
+        """パイプ（ファイルオブジェクト）から読んだデータを 1 パスで変換する
+
+        source は ffmpeg の標準入力にそのまま渡すので、シーク不要なコンテナ
+        （PIPEABLE_FORMATS）である必要がある。出力は OUTPUT_DIR/base_name.<形式>。
+        入力の大きさが分からないので、空き容量の確保は呼び出し側で行う。
+        """
+        output_format = self._check_format(output_format)
         output_path = os.path.join(self.config.OUTPUT_DIR, f"{base_name}.{output_format}")
+        cmd = self.build_command("pipe:0", output_format, output_path, threads=threads)
+        self._run(
+            cmd, output_path, progress=progress, input_path=base_name, cancel=cancel, stdin=source
+        )
+        return output_path
+
+    def build_command(
+        self,
+        input_spec: str,
+        output_format: str,
+        output_path: str,
+        *,
+        threads: int | None = None,
+        streams: list[dict] | None = None,
+    ) -> list[str]:
+        """ffmpeg のコマンドラインを組み立てる（input_spec は パス または pipe:0）
+
+        streams（probe_media の結果）を渡すと、出力先にそのまま入るストリームは
+        再エンコードせずコピーする。
+        """
+        cmd = ["ffmpeg", "-y", "-i", input_spec, *self._output_args(output_format, streams)]
+        threads = threads or self.profile["threads"]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        cmd.append(output_path)
+        return cmd
+
+    def build_multi_command(
+        self,
+        input_spec: str,
+        outputs: dict[str, str],
+        *,
+        threads: int | None = None,
+        streams: list[dict] | None = None,
+    ) -> list[str]:
+        """1 入力 → 複数出力（{形式: 出力パス}）の ffmpeg コマンドラインを組み立てる"""
+        cmd = ["ffmpeg", "-y", "-i", input_spec]
+        threads = threads or self.profile["threads"]
+        for fmt, output_path in outputs.items():
+            cmd += self._output_args(fmt, streams)
+            if threads:
+                cmd += ["-threads", str(threads)]
+            cmd.append(output_path)
+        return cmd
+
+    # ------------------------------------------------------------------
+    # 内部処理
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _check_format(output_format: str) -> str:
+        output_format = output_format.lower()
+        if output_format not in get_ffmpeg_supported_formats():
+            raise ValueError(
+                f"convertエラー: ffmpeg でサポートされていないフォーマットです: {output_format}"
+            )
+        return output_format
+
+    def _output_path(self, input_path: str, output_format: str, subdir: str = "") -> str:
+        """OUTPUT_DIR[/subdir]/<入力のファイル名>.<形式>（サブディレクトリは作成する）"""
+        directory = self.config.OUTPUT_DIR
+        if subdir:
+            directory = os.path.join(directory, subdir)
+            os.makedirs(directory, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        return os.path.join(directory, f"{base_name}.{output_format}")
+
+    def estimate_output_size(
+        self,
+        output_format: str,
+        *,
+        duration: float | None,
+        source_size: int | None,
+        streams: list[dict] | None = None,
+    ) -> int | None:
+        """変換後のファイルサイズの見積もり（空き容量の確保用）
+
+        音声の再エンコードは長さ × ビットレート、それ以外（コピー・映像の
+        再エンコード）は入力と同程度とみなす。
+        """
+        if output_format in AUDIO_ONLY_FORMATS and not self._copyable(
+            output_format, streams, "audio"
+        ):
+            if output_format in LOSSLESS_AUDIO_FORMATS:
+                bitrate: str | int = PCM_BITRATE
+            else:
+                key = "opus_bitrate" if output_format == "opus" else "audio_bitrate"
+                bitrate = self.profile[key]
+            size = bitrate_bytes(bitrate, duration)
+            if size is not None:
+                return size
+        return source_size
+
+    def _space_needs(
+        self,
+        input_path: str,
+        outputs: Iterable[tuple[str, str]],
+        *,
+        duration: float | None,
+        streams: list[dict] | None,
+        segmented: bool = False,
+    ) -> dict[str, int]:
+        """変換で書き込む量の見積もり（書き込み先ディレクトリ → バイト数）"""
+        source_size = os.path.getsize(input_path)
+        needs: dict[str, int] = {}
+        for fmt, output_path in outputs:
+            size = self.estimate_output_size(
+                fmt, duration=duration, source_size=source_size, streams=streams
+            ) or 0
+            directory = os.path.dirname(output_path)
+            needs[directory] = needs.get(directory, 0) + size
+            if segmented:
+                # 分割した映像（入力と同程度）と区間ごとのエンコード結果を作業ディレクトリに置く
+                needs[self.scratch_dir] = needs.get(self.scratch_dir, 0) + source_size + size
+        return needs
+
+    def slot(self, cancel: threading.Event | None, label: str) -> ContextManager[None]:
+        """budget があればその枠を 1 つ使う（convert_stream は呼び出し側がこれで囲む）"""
+        if self.budget is None:
+            return contextlib.nullcontext()
+        return self.budget.slot(cancel=cancel, label=label)
+
+    def _probe(self, input_path: str, *, need_duration: bool = False) -> dict | None:
+        if not (self.config.STREAM_COPY or need_duration):
+            return None
+        return probe_media(input_path)
+
+    @staticmethod
+    def _copyable(output_format: str, streams: list[dict] | None, codec_type: str) -> bool:
+        """入力の codec_type ストリームが output_format にそのまま入るか"""
+        if streams is None:
+            return False
+        codecs = stream_codecs(streams, codec_type)
+        allowed = COPY_COMPATIBLE.get(output_format, {}).get(codec_type, set())
+        return bool(codecs) and codecs <= allowed
+
+    def _output_args(self, output_format: str, streams: list[dict] | None = None) -> list[str]:
+        """出力形式ごとのエンコードオプション（コピーできるストリームはコピー）"""
+        profile = self.profile
+        copy_video = self._copyable(output_format, streams, "video")
+        copy_audio = self._copyable(output_format, streams, "audio")
 
-        # ── FFmpeg コマンド構築 ───────────────────────────
         if output_format in AUDIO_ONLY_FORMATS:
-            cmd = ["ffmpeg", "-y", "-i", input_path, "-vn", output_path]
-
-        elif output_format == "mp4":
-            cmd = [
-                "ffmpeg", "-y", "-i", input_path,
-                "-c:v", "libx264", "-c:a", "aac",
-                "-movflags", "+faststart",
-                output_path,
-            ]
-
-        elif output_format == "webm":
-            # WebM は VP9 + Opus で再エンコード
-            cmd = [
-                "ffmpeg", "-y", "-i", input_path,
-                "-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "32",
-                "-c:a", "libopus", "-b:a", "128k",
-                output_path,
-            ]
-
-        else:  # mkv, flv, 3gp など → ストリームコピー
-            cmd = ["ffmpeg", "-y", "-i", input_path, "-c", "copy", output_path]
-
-        # ── 実行 ────────────────────────────────────────
+            if copy_audio:
+                return ["-vn", "-c:a", "copy"]
+            if output_format in LOSSLESS_AUDIO_FORMATS:
+                return ["-vn"]
+            key = "opus_bitrate" if output_format == "opus" else "audio_bitrate"
+            return ["-vn", "-b:a", profile[key]]
+
+        if output_format == "mp4":
+            return (
+                self._video_args(output_format, copy_video)
+                + self._audio_args(output_format, copy_audio)
+                + ["-movflags", "+faststart"]
+            )
+
+        if output_format == "webm":
+            # WebM は VP9 + Opus で再エンコード（コピーできない場合）
+            return (
+                self._video_args(output_format, copy_video)
+                + self._audio_args(output_format, copy_audio)
+            )
+
+        # mkv, flv, 3gp など → ストリームコピー
+        return ["-c", "copy"]
+
+    def _video_args(self, output_format: str, copy: bool = False) -> list[str]:
+        """mp4 / webm の映像エンコードオプション"""
+        profile = self.profile
+        if copy:
+            return ["-c:v", "copy"]
+        if output_format == "mp4":
+            return ["-c:v", self._encoder("libx264"), "-preset", profile["x264_preset"],
+                    "-crf", str(profile["x264_crf"])]
+        return ["-c:v", self._encoder("libvpx-vp9"), "-b:v", "0", "-crf", str(profile["vp9_crf"]),
+                "-deadline", profile["vp9_deadline"],
+                "-cpu-used", str(profile["vp9_cpu_used"]),
+                "-row-mt", "1" if profile["vp9_row_mt"] else "0"]
+
+    def _audio_args(self, output_format: str, copy: bool = False) -> list[str]:
+        """mp4 / webm の音声エンコードオプション"""
+        profile = self.profile
+        if copy:
+            return ["-c:a", "copy"]
+        if output_format == "mp4":
+            return ["-c:a", self._encoder("aac"), "-b:a", profile["audio_bitrate"]]
+        return ["-c:a", self._encoder("libopus"), "-b:a", profile["opus_bitrate"]]
+
+    @staticmethod
+    def _encoder(name: str) -> str:
+        """使うエンコーダーを ffmpeg が持っているか確かめる（ないなら ffmpeg を起動する前に止める）"""
+        if not has_ffmpeg_encoder(name):
+            raise ValueError(
+                f"convertエラー: ffmpeg に {name} エンコーダーがありません"
+                f"（{name} を有効にしてビルドされた ffmpeg が必要です）"
+            )
+        return name
+
+    # ------------------------------------------------------------------
+    # 分割並列エンコード
+    # ------------------------------------------------------------------
+    def _resolve_segments(self, output_format: str, segments: int | None) -> int:
+        """分割数の指定値（0 以下は CPU コア数）。映像の再エンコード以外は 1。"""
+        if output_format not in ("mp4", "webm"):
+            return 1
+        if segments is None:
+            segments = self.config.CONVERT_SEGMENTS
+        if segments <= 0:
+            segments = os.cpu_count() or 1
+        return segments
+
+    def _segment_count(
+        self, output_format: str, segments: int, media: dict | None, streams: list[dict] | None
+    ) -> int:
+        """実際の分割数（短い入力・映像をコピーできる入力は分割しない）"""
+        if segments <= 1 or not media or not media["duration"]:
+            return 1
+        if media["duration"] < SEGMENT_MIN_DURATION:
+            return 1
+        if self._copyable(output_format, streams, "video"):
+            return 1
+        if not any(s["codec_type"] == "video" and not s["attached_pic"] for s in media["streams"]):
+            return 1
+        return max(min(segments, int(media["duration"] // SEGMENT_MIN_LENGTH)), 1)
+
+    def _convert_segmented(
+        self,
+        input_path: str,
+        output_format: str,
+        output_path: str,
+        *,
+        segments: int,
+        media: dict,
+        streams: list[dict] | None,
+        progress: ProgressCallback | None = None,
+        cancel: threading.Event | None = None,
+    ) -> None:
+        """映像をキーフレーム位置で分割 → 区間ごとに並列エンコード → 結合する
+
+        音声は継ぎ目で途切れないよう入力全体から 1 本でエンコードし、
+        concat デマルチプレクサで結合した映像に再エンコードなしで多重化する。
+        """
+        duration: float = media["duration"]
+        video = next(
+            s for s in media["streams"] if s["codec_type"] == "video" and not s["attached_pic"]
+        )
+        audio = next((s for s in media["streams"] if s["codec_type"] == "audio"), None)
+
+        workdir = tempfile.mkdtemp(prefix=".segments-", dir=self.scratch_dir)
         try:
-            subprocess.run(cmd, check=True)
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"ffmpeg failed (exit {e.returncode})") from e
+            # 1) 映像だけをストリームコピーで分割（区切りは指定時刻の次のキーフレーム）
+            pattern = os.path.join(workdir, "src%04d.mkv")
+            self._run(
+                ["ffmpeg", "-y", "-i", input_path, "-map", f"0:{video['index']}", "-an",
+                 "-c", "copy", "-f", "segment", "-segment_time", f"{duration / segments:.3f}",
+                 "-reset_timestamps", "1", pattern],
+                pattern, cancel=cancel,
+            )
+            sources = sorted(glob.glob(os.path.join(workdir, "src*.mkv")))
+            encoded = [os.path.join(workdir, f"enc{i:04d}.mkv") for i in range(len(sources))]
 
-        return output_path
+            # 2) 区間ごとの映像エンコードと音声エンコードを並列に実行
+            workers = resolve_jobs(0, len(sources))
+            threads = threads_per_job(workers)
+            out_times = [0.0] * len(sources)
+            lock = threading.Lock()
+            started = time.monotonic()
+
+            def segment_progress(i: int) -> ProgressCallback:
+                def update(p: ConvertProgress) -> None:
+                    with lock:
+                        out_times[i] = p.out_time
+                        total = min(sum(out_times), duration)
+                    elapsed = time.monotonic() - started
+                    progress(ConvertProgress(  # type: ignore[misc]
+                        input_path, output_path, out_time=total, duration=duration,
+                        speed=total / elapsed if elapsed > 0 else None,
+                    ))
+                return update
+
+            audio_path = os.path.join(workdir, "audio.mka") if audio is not None else None
+            with ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix="segment") as pool:
+                futures = []
+                if audio_path is not None:
+                    copy_audio = self._copyable(output_format, streams, "audio")
+                    futures.append(pool.submit(
+                        self._run,
+                        ["ffmpeg", "-y", "-i", input_path, "-map", f"0:{audio['index']}", "-vn",
+                         *self._audio_args(output_format, copy_audio), audio_path],
+                        audio_path, cancel=cancel,
+                    ))
+                for i, (src, enc) in enumerate(zip(sources, encoded)):
+                    cmd = ["ffmpeg", "-y", "-i", src, "-an", *self._video_args(output_format)]
+                    if threads:
+                        cmd += ["-threads", str(threads)]
+                    futures.append(pool.submit(
+                        self._run, cmd + [enc], enc,
+                        progress=segment_progress(i) if progress is not None else None,
+                        input_path=src, cancel=cancel,
+                    ))
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except Exception:
+                    pool.shutdown(cancel_futures=True)
+                    raise
+
+            # 3) concat デマルチプレクサで結合し、音声と多重化（再エンコードなし）
+            list_path = os.path.join(workdir, "concat.txt")
+            with open(list_path, "w", encoding="utf-8") as f:
+                for enc in encoded:
+                    escaped = enc.replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+            if audio_path is not None:
+                cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+            cmd += ["-c", "copy"]
+            if output_format == "mp4":
+                cmd += ["-movflags", "+faststart"]
+            self._run(cmd + [output_path], output_path, cancel=cancel)
+        finally:
+            with span("cleanup", job=input_path, path=workdir):
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        if progress is not None:
+            progress(ConvertProgress(
+                input_path, output_path, out_time=duration, duration=duration, done=True,
+            ))
+
+    @staticmethod
+    def _run(
+        cmd: list[str],
+        output_path: str,
+        *,
+        progress: ProgressCallback | None = None,
+        input_path: str = "",
+        duration: float | None = None,
+        cancel: threading.Event | None = None,
+        **kwargs,
+    ) -> None:
+        """ffmpeg を実行する。cancel がセットされたら ffmpeg を止めて JobCancelled を投げる。"""
+        if cancel is not None and cancel.is_set():
+            raise JobCancelled(input_path or output_path)
+        profiler = get_profiler()
+        loglevel = "warning"
+        with contextlib.ExitStack() as stack:
+            if profiler is not None:
+                # -benchmark の結果（CPU 時間・最大メモリ）を ffmpeg 1 回ごとのログに残す
+                cmd = [cmd[0], "-benchmark", *cmd[1:]]
+                loglevel = "info"
+                log_path = profiler.ffmpeg_log(output_path)
+                kwargs["stderr"] = stack.enter_context(open(log_path, "w", encoding="utf-8"))
+
+            job = input_path or output_path
+            with span("ffmpeg", job=job, cat="ffmpeg", output=output_path) as attrs:
+                if progress is not None:
+                    # 進捗は -progress で標準出力へ key=value 形式で出させて逐次解析する
+                    cmd = [
+                        cmd[0], "-hide_banner", "-nostats", "-loglevel", loglevel,
+                        "-progress", "pipe:1", *cmd[1:],
+                    ]
+                    kwargs.update(stdout=subprocess.PIPE, text=True)
+                with subprocess.Popen(cmd, **kwargs) as proc:
+                    if cancel is not None:
+                        _kill_on_cancel(proc, cancel)
+                    if progress is not None:
+                        parser = FFmpegProgressParser(input_path, output_path, duration)
+                        for line in proc.stdout:
+                            update = parser.feed(line)
+                            if update is not None:
+                                progress(update)
+                returncode = proc.returncode
+                attrs["returncode"] = returncode
+
+        if cancel is not None and cancel.is_set():
+            try: os.remove(output_path)
+            except FileNotFoundError: pass
+            raise JobCancelled(input_path or output_path)
+        if returncode != 0:
+            # 途中まで書かれた出力は残さない
+            try: os.remove(output_path)
+            except FileNotFoundError: pass
+            raise RuntimeError(f"ffmpeg failed (exit {returncode})")
+
+    def convert_many(
+        self,
+        input_paths: Iterable[str],
+        output_format: str | Sequence[str],
+        *,
+        jobs: int | None = None,
+        force: bool = False,
+        on_result: ResultCallback | None = None,
+        progress: ProgressCallback | None = None,
+        segments: int | None = None,
+    ) -> tuple[list[str], list[tuple[str, Exception]]]:
+        """複数ファイル（ディレクトリを含む）を並列に変換する
+
+        ディレクトリは再帰的に走査し、見つかった順に変換へ回す（一覧を先に
+        作らない）。出力は OUTPUT_DIR の下に入力の階層を再現して保存する。
+        同時に抱える未完了の変換は jobs の 2 倍までに抑える。
+        jobs 未指定時は Config.CONVERT_JOBS を使う。CPU コアは実行中のジョブで
+        等分し、ffmpeg 同士がコアを奪い合わないようにする。
+        output_format に複数の形式を渡すと、1 ファイルにつき 1 回の ffmpeg で
+        すべての形式を出力する（convert_to_formats）。
+        戻り値は (成功した出力パス一覧, [(入力パス, 例外)]) で、いずれも入力順。
+        on_result を渡すと 1 件終わるごとに完了順で、出力パスごとに呼び出す。
+        force=True で変換済みキャッシュを無視して再変換する。
+        progress は各ジョブの進捗を（複数ジョブ分が混ざって）受け取る。
+        segments は各ファイルの分割並列エンコードの分割数（convert_to_format 参照）。
+        """
+        formats = [output_format] if isinstance(output_format, str) else list(output_format)
+        jobs = self.config.CONVERT_JOBS if jobs is None else jobs
+        # ファイルだけの指定なら件数が分かるので、ジョブ数を件数までに絞る
+        if isinstance(input_paths, Sequence) and not any(os.path.isdir(p) for p in input_paths):
+            workers = resolve_jobs(jobs, len(input_paths))
+        else:
+            workers = resolve_jobs(jobs)
+        threads = threads_per_job(workers)
+
+        def convert(path: str, subdir: str) -> list[str]:
+            if len(formats) == 1:
+                return [self.convert_to_format(
+                    path, formats[0], threads=threads, force=force, progress=progress,
+                    segments=segments, subdir=subdir,
+                )]
+            return self.convert_to_formats(
+                path, formats, threads=threads, force=force, progress=progress, subdir=subdir
+            )
+
+        paths: list[str] = []
+        outcomes: list[tuple[list[str], Exception | None]] = []
+
+        def collect(future, i: int) -> None:
+            try:
+                outcomes[i] = (future.result(), None)
+            except Exception as e:
+                outcomes[i] = ([], e)
+            if on_result is not None:
+                outputs, error = outcomes[i]
+                if error is not None:
+                    on_result(paths[i], None, error)
+                for out in outputs:
+                    on_result(paths[i], out, None)
+
+        inputs = expand_inputs(input_paths, exclude=[self.config.OUTPUT_DIR])
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="convert") as pool:
+            running: dict = {}
+            for path, subdir in inputs:
+                if len(running) >= workers * 2:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, running.pop(future))
+                paths.append(path)
+                outcomes.append(([], None))
+                running[pool.submit(convert, path, subdir)] = len(paths) - 1
+            for future in as_completed(running):
+                collect(future, running[future])
+
+        if self.config.CONVERT_CACHE:
+            cache = get_conversion_cache()
+            cache.evict()
+            cache.flush()
+
+        success = [out for outs, err in outcomes if err is None for out in outs]
+        errors = [(p, err) for p, (_, err) in zip(paths, outcomes) if err is not None]
+        return success, errors
@@ -0,0 +1,230 @@
+"""
+ディスク容量の受け付け制御
+
+変換・ダウンロードを始める前に、書き込む予定のバイト数（中間ファイルと
+最終出力）を保存先ごとに見積もって確保する。空きが足りなければ、先に
+動いているジョブが書き終えて確保を返すまで開始を遅らせ、途中で容量不足に
+なって失敗するのを防ぐ。確保は書き込み先のファイルシステム単位で数え、
+同じディスク上の SCRATCH_DIR と OUTPUT_DIR は合算する。
+
+書き込み途中のジョブの分は確保と実際の書き込み済みの両方に数えるので、
+見積もりは控えめ（安全側）になる。空きが足りない間は、ほかのジョブや
+ほかのプロセスが空けるのを待つ。Config.DISK_WAIT_TIMEOUT 秒待っても空かない
+場合と、ディスクの全容量でも足りない（待っても空かない）場合は
+InsufficientDiskSpace を投げる。
+
+確保とは別に残しておく空き（余白）は Config.MIN_FREE_SPACE_MB で指定する
+（free_space_margin）。
+"""
+from __future__ import annotations
+
+import errno
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import TYPE_CHECKING, Mapping
+
+if TYPE_CHECKING:
+    from media_tool.config import Config
+
+logger = logging.getLogger(__name__)
+
+# 確保とは別に常に残しておく空き容量の既定値（バイト、Config.MIN_FREE_SPACE_MB）
+FREE_SPACE_MARGIN = 256 * 1024 * 1024
+# 空きを待つ間に再確認する間隔（秒）
+WAIT_INTERVAL = 1.0
+
+
+class InsufficientDiskSpace(OSError):
+    """見積もった書き込み量がディスクの全容量を超えているか、待っても空きができなかった
+
+    waited は空きを待った秒数（全容量を超えていて待たずに諦めた場合は None）。
+    """
+
+    def __init__(self, path: str, needed: int, total: int, *, waited: float | None = None) -> None:
+        if waited is None:
+            detail = f"全容量 {total} バイト"
+        else:
+            detail = f"{waited:g} 秒待っても空きませんでした"
+        super().__init__(
+            errno.ENOSPC, f"ディスク容量が足りません: {path}（必要 {needed} バイト、{detail}）"
+        )
+        self.path = path
+        self.needed = needed
+        self.total = total
+        self.waited = waited
+
+
+def free_space_margin(config: Config) -> int:
+    """確保とは別に残しておく空き容量（バイト）"""
+    return int(config.MIN_FREE_SPACE_MB * 1024 * 1024)
+
+
+def disk_wait_timeout(config: Config) -> float | None:
+    """空きを待つ上限（秒、Config.DISK_WAIT_TIMEOUT が 0 なら None = 無期限）"""
+    return config.DISK_WAIT_TIMEOUT or None
+
+
+def bitrate_bytes(bitrate: str | float | None, duration: float | None) -> int | None:
+    """ビットレート（"192k" / "1.5M" / bit/s の数値）× 長さ（秒）のバイト数"""
+    if bitrate is None or not duration:
+        return None
+    if isinstance(bitrate, str):
+        scale = {"k": 1e3, "m": 1e6}.get(bitrate[-1:].lower(), 1.0)
+        value = float(bitrate[:-1] if scale != 1.0 else bitrate) * scale
+    else:
+        value = float(bitrate)
+    return int(value * duration / 8)
+
+
+def download_size(info: dict) -> int | None:
+    """yt-dlp の抽出結果から、選ばれたストリーム（映像＋音声なら合計）のサイズを見積もる
+
+    filesize → filesize_approx → 長さ × tbr の順に使う。分からなければ None。
+    """
+    total = 0
+    for f in info.get("requested_formats") or [info]:
+        size = f.get("filesize") or f.get("filesize_approx")
+        if not size:
+            tbr = f.get("tbr")  # kbit/s
+            size = bitrate_bytes(tbr * 1000 if tbr else None, info.get("duration"))
+        if not size:
+            return None
+        total += size
+    return int(total)
+
+
+class Reservation:
+    """DiskSpaceGate.reserve で確保した容量（with を抜けるか release で返す）"""
+
+    def __init__(self, gate: DiskSpaceGate, amounts: dict[int, int]) -> None:
+        self._gate = gate
+        self._amounts = amounts
+
+    def release(self) -> None:
+        """確保を返す（2 回目以降は何もしない）"""
+        amounts, self._amounts = self._amounts, {}
+        if amounts:
+            self._gate._release(amounts)
+
+    def __enter__(self) -> Reservation:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class DiskSpaceGate:
+    """書き込み予定の容量をファイルシステムごとに数え、空きが足りるジョブだけ通す"""
+
+    def __init__(self, margin: int = FREE_SPACE_MARGIN) -> None:
+        self.margin = margin
+        self._reserved: dict[int, int] = {}  # st_dev → 確保中のバイト数
+        self._cond = threading.Condition()
+
+    def try_reserve(
+        self, needs: Mapping[str, int | None], *, margin: int | None = None
+    ) -> Reservation | None:
+        """needs（書き込み先ディレクトリ → バイト数）を確保する。今は足りなければ None。
+
+        見積もれない量（None）は 0 として扱い、余白（margin、未指定なら self.margin）の
+        分の空きだけ確認する。余白を含めてディスクの全容量を超える場合は
+        InsufficientDiskSpace を投げる。
+        """
+        if margin is None:
+            margin = self.margin
+        demand = self._demand(needs)
+        with self._cond:
+            for dev, (path, size) in demand.items():
+                usage = shutil.disk_usage(path)
+                if size + margin > usage.total:
+                    raise InsufficientDiskSpace(path, size + margin, usage.total)
+                if usage.free - self._reserved.get(dev, 0) - margin < size:
+                    return None
+            for dev, (_, size) in demand.items():
+                self._reserved[dev] = self._reserved.get(dev, 0) + size
+            return Reservation(self, {dev: size for dev, (_, size) in demand.items()})
+
+    def reserve(
+        self,
+        needs: Mapping[str, int | None],
+        *,
+        margin: int | None = None,
+        cancel: threading.Event | None = None,
+        label: str = "",
+        timeout: float | None = None,
+    ) -> Reservation:
+        """needs を確保できるまで待つ
+
+        cancel がセットされたら JobCancelled、timeout 秒（None なら無期限）待っても
+        確保できなければ InsufficientDiskSpace を投げる。
+        """
+        from media_tool.converter import JobCancelled  # converter がこのモジュールを使う
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiting = False
+        while True:
+            with self._cond:
+                reservation = self.try_reserve(needs, margin=margin)
+                if reservation is not None:
+                    if waiting:
+                        logger.info("Disk space available: %s", label, extra={"job": label})
+                    return reservation
+                if not waiting:
+                    waiting = True
+                    logger.info("Waiting for disk space: %s", label, extra={"job": label})
+                # 確保が返されるか、ほかのプロセスが空けるのを待つ
+                self._cond.wait(WAIT_INTERVAL)
+            if cancel is not None and cancel.is_set():
+                raise JobCancelled(label)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise self.timed_out(needs, margin=margin, waited=timeout)
+
+    def timed_out(
+        self, needs: Mapping[str, int | None], *, margin: int | None, waited: float
+    ) -> InsufficientDiskSpace:
+        """待っても確保できなかった needs の InsufficientDiskSpace（足りないディスクを示す）"""
+        if margin is None:
+            margin = self.margin
+        demand = self._demand(needs)
+        with self._cond:
+            for dev, (path, size) in demand.items():
+                usage = shutil.disk_usage(path)
+                if usage.free - self._reserved.get(dev, 0) - margin < size:
+                    break
+        return InsufficientDiskSpace(path, size + margin, usage.total, waited=waited)
+
+    @staticmethod
+    def _demand(needs: Mapping[str, int | None]) -> dict[int, tuple[str, int]]:
+        """needs をファイルシステムごとに合算する（st_dev → (代表のパス, バイト数)）"""
+        demand: dict[int, tuple[str, int]] = {}
+        for path, size in needs.items():
+            dev = os.stat(path).st_dev
+            _, total = demand.get(dev, (path, 0))
+            demand[dev] = (path, total + max(size or 0, 0))
+        return demand
+
+    def _release(self, amounts: dict[int, int]) -> None:
+        with self._cond:
+            for dev, size in amounts.items():
+                left = self._reserved.get(dev, 0) - size
+                if left > 0:
+                    self._reserved[dev] = left
+                else:
+                    self._reserved.pop(dev, None)
+            self._cond.notify_all()
+
+
+_shared: DiskSpaceGate | None = None
+_shared_lock = threading.Lock()
+
+
+def get_disk_gate() -> DiskSpaceGate:
+    """プロセス内で共有する DiskSpaceGate"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = DiskSpaceGate()
+        return _shared
@@ -1,20 +1,562 @@
+import contextlib
+import http.client
+import logging
 import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator
+
+import yt_dlp
+from yt_dlp.networking.exceptions import TransportError
+
+from media_tool.archive import DownloadArchive, archive_key, get_download_archive, url_key
+from media_tool.cache import get_conversion_cache
+from media_tool.checkpoint import PlaylistCheckpoint
 from media_tool.config import Config
+from media_tool.diskspace import (
+    Reservation, disk_wait_timeout, download_size, free_space_margin, get_disk_gate,
+)
+from media_tool.info_cache import get_info_cache, parse_items
+from media_tool.progress import DownloadProgress, DownloadProgressCallback
+from media_tool.trace import span
+from media_tool.converter import (
+    ConvertBudget, Converter, JobCancelled, PIPEABLE_FORMATS, VIDEO_FORMATS, resolve_jobs,
+    threads_per_job,
+)
+from media_tool.downloaders.formats import source_format
+from media_tool.downloaders.session import SessionPool, YdlSession
+
+logger = logging.getLogger(__name__)
+
+# 一時的な失敗とみなす HTTP ステータス
+TRANSIENT_HTTP_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class PartialDownloadError(Exception):
+    """プレイリストの一部のエントリだけが失敗した"""
+
+    def __init__(self, paths: list[str], errors: list[tuple[str, Exception]]) -> None:
+        self.paths = paths
+        self.errors = errors
+        total = len(paths) + len(errors)
+        super().__init__(f"{len(errors)} of {total} entries failed")
+
+
+def backoff_delay(attempt: int) -> float:
+    """attempt 回目（0 始まり）の再試行までの待ち時間（1, 2, 4, ... 最大 60 秒 + ゆらぎ）"""
+    return min(2.0 ** attempt, 60.0) * random.uniform(0.8, 1.2)
+
+
+def is_transient(error: BaseException) -> bool:
+    """ネットワーク切断・タイムアウト・429/5xx など、やり直せば通りうるエラーか"""
+    seen: set[int] = set()
+    stack: list[BaseException | None] = [error]
+    while stack:
+        exc = stack.pop()
+        if exc is None or id(exc) in seen:
+            continue
+        seen.add(id(exc))
+        if getattr(exc, "expected", False):
+            return False  # 削除済み・非公開など yt-dlp が想定済みのエラー
+        status = getattr(exc, "status", None) or getattr(exc, "code", None)
+        if isinstance(status, int) and status in TRANSIENT_HTTP_STATUS:
+            return True
+        if isinstance(exc, (ConnectionError, TimeoutError, http.client.HTTPException)):
+            return True
+        if isinstance(exc, TransportError):
+            return True
+        if isinstance(exc, urllib.error.URLError) and status is None:
+            return True
+        # yt-dlp は元の例外を exc_info / cause に包んで投げ直す
+        exc_info = getattr(exc, "exc_info", None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1:
+            stack.append(exc_info[1])
+        stack.extend((getattr(exc, "cause", None), exc.__cause__, exc.__context__))
+    return False
 
 
 class BaseDownloader:
     """共通ダウンローダー基底クラス。
 
-    - Config を自動ロードしてユーザー設定を反映
+    - config が未指定の場合のみ Config を自動ロードしてユーザー設定を反映
+      （渡された Config は呼び出し側の上書きを含むのでそのまま使う）
     - download_dir が未指定の場合は Config.DOWNLOAD_DIR
+    - 変換前のダウンロードは Config.SCRATCH_DIR（未設定なら download_dir）に置き、
+      変換後に消す。変換しないものは download_dir へ移す
     - ディレクトリが存在しない場合は自動生成
+    - 取得するストリームは出力形式に合わせて選ぶ（downloaders.formats）
+    - サイト固有の yt-dlp オプションはサブクラスの _ydl_options で指定
+    - sessions を渡すと yt-dlp のセッションをその SessionPool から借りて使い回す
+      （未指定なら download 1 回ごとに作って閉じる）
+    - budget を渡すと変換（ffmpeg）の同時実行数をその ConvertBudget で数える
+      （未指定なら download 1 回ごとに Config.CONVERT_JOBS まで）
     """
 
-    def __init__(self, download_dir: str | None = None, *, config: Config | None = None) -> None:
-        # 設定を 1 度だけロードして共有
-        self.config: Config = config or Config()
-        self.config.load(self.config.CONFIG_PATH)
+    def __init__(
+        self,
+        download_dir: str | None = None,
+        *,
+        config: Config | None = None,
+        site: str = "generic",
+        sessions: SessionPool | None = None,
+        budget: ConvertBudget | None = None,
+    ) -> None:
+        if config is None:
+            config = Config()
+            config.load(config.CONFIG_PATH)
+        self.config: Config = config
+        self.site = site
+        self.sessions = sessions
+        self.budget = budget
 
         # 保存先ディレクトリ
         self.download_dir: str = download_dir or self.config.DOWNLOAD_DIR
         os.makedirs(self.download_dir, exist_ok=True)
+        # 中間ファイル（yt-dlp の .part・結合前のストリーム・変換前のファイル）の置き場所
+        self.scratch_dir: str = self.config.SCRATCH_DIR or self.download_dir
+        os.makedirs(self.scratch_dir, exist_ok=True)
+
+    def download(
+        self,
+        url: str,
+        *,
+        output_format: str | None = None,
+        stream: bool | None = None,
+        archive: bool | None = None,
+        items: str | None = None,
+        cancel: threading.Event | None = None,
+        progress: DownloadProgressCallback | None = None,
+    ) -> list[str] | str:
+        """URL をダウンロードし、必要なら output_format へ変換して保存パスを返す
+
+        stream が真（未指定時は Config.STREAM_DOWNLOADS）で変換が必要な場合、
+        中間ファイルを作らずダウンロードデータを直接 ffmpeg に流す。
+        ソースがパイプで扱えない場合は通常のファイル経由の処理に戻る。
+        archive が真（未指定時は Config.DOWNLOAD_ARCHIVE）なら、同じ形式で
+        ダウンロード済みの動画は取得せずに記録済みのパスを返す。
+        プレイリストのエントリ一覧は抽出結果キャッシュを優先して使い、
+        items（"1-3,7" など 1 始まり）を指定するとそのエントリだけを取得する。
+        cancel をセットすると進行中のダウンロード・変換を止めて JobCancelled を投げる。
+        progress を渡すとダウンロードの進捗（バイト数・速度・残り時間）を逐次通知する。
+        各エントリは取得を始める前にダウンロードと変換後の出力の分の空き容量を
+        確保し、足りなければほかのジョブが書き終えるまで待つ（diskspace）。
+        """
+        try:
+            return self._download(
+                url, output_format=output_format, stream=stream, archive=archive,
+                items=items, cancel=cancel, progress=progress,
+            )
+        finally:
+            # 変換結果キャッシュへの記録はまとめて書き出す
+            if self.config.CONVERT_CACHE:
+                get_conversion_cache().flush()
+
+    def _download(
+        self,
+        url: str,
+        *,
+        output_format: str | None,
+        stream: bool | None,
+        archive: bool | None,
+        items: str | None,
+        cancel: threading.Event | None,
+        progress: DownloadProgressCallback | None,
+    ) -> list[str] | str:
+        fmt = (output_format or "mp4").lower()
+        if stream is None:
+            stream = self.config.STREAM_DOWNLOADS
+        if archive is None:
+            archive = self.config.DOWNLOAD_ARCHIVE
+        store = get_download_archive() if archive else None
+
+        # 単一動画の URL ならネットワークに触れる前にアーカイブを確認
+        if store is not None:
+            key = url_key(url)
+            done = store.lookup(key, fmt) if key else None
+            if done is not None:
+                logger.info("Already downloaded: %s", done, extra={"url": url, "path": done})
+                return done
+
+        if stream and output_format:
+            with span("download", job=url, stream=True):
+                streamed = self._download_streaming(url, fmt, store=store, cancel=cancel)
+            if streamed is not None:
+                logger.info("Downloaded: %s", streamed, extra={"url": url, "path": streamed})
+                return streamed
+
+        # 各エントリはダウンロード完了（after_move）の時点で変換プールへ回し、
+        # 次のエントリのダウンロードと変換を並行させる
+        if self.budget is not None:
+            workers = self.budget.jobs
+        else:
+            workers = resolve_jobs(self.config.CONVERT_JOBS)
+        threads = threads_per_job(workers)
+        # エントリ順の (エントリ, 変換中の Future or 保存済みパス)
+        results: list[tuple[dict, Future[str] | str]] = []
+        failures: list[tuple[str, Exception]] = []
+        seen: set[tuple[str, str]] = set()
+        checkpoint: PlaylistCheckpoint | None = None
+        # 取得中のエントリの空き容量の確保（エントリは 1 件ずつ取得するので高々 1 つ）
+        held: list[Reservation] = []
+
+        def release() -> None:
+            # ダウンロードが済めば書き込んだ分は空き容量に反映されている
+            while held:
+                held.pop().release()
+
+        def admit(entry: dict) -> None:
+            release()  # 再試行で同じエントリを取り直す場合は前回の確保を返してから
+            held.append(self._reserve_download(entry, fmt, cancel=cancel))
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="convert") as pool:
+            def submit(entry: dict) -> None:
+                release()
+                results.append((entry, pool.submit(
+                    self._finalize, entry, fmt,
+                    threads=threads, store=store, checkpoint=checkpoint, cancel=cancel,
+                )))
+
+            def skip_archived(entry: dict, *, incomplete: bool = False) -> str | None:
+                key = archive_key(entry)
+                done = store.lookup(key, fmt) if key else None
+                if done is None:
+                    return None
+                if key not in seen:
+                    seen.add(key)
+                    results.append((entry, done))
+                    logger.info("Already downloaded: %s", done, extra={"path": done})
+                return "already in download archive"
+
+            ydl_opts = {**self._ydl_options(fmt), **self._retry_options()}
+            with self._session(ydl_opts) as session, contextlib.ExitStack() as stack:
+                stack.callback(release)
+                session.on_before_download = admit
+                session.on_finished = submit
+                session.cancel = cancel
+                if progress is not None:
+                    session.on_progress = lambda d: progress(DownloadProgress.from_hook(url, d))
+                if store is not None:
+                    session.match_filter = skip_archived
+                ydl = session.ydl
+                # エントリ一覧だけ先に取得し、1 件ずつ個別にダウンロードする
+                info = self._list_entries(ydl, url)
+                if not self._is_playlist(info):
+                    try:
+                        info = self._fetch(ydl, info, url)
+                    except Exception as e:
+                        release()
+                        self._raise_if_cancelled(cancel, url, e)
+                        raise
+                else:
+                    checkpoint = PlaylistCheckpoint(url, fmt)
+                    entries = [e for e in info["entries"] if e is not None]
+                    if items:
+                        entries = [entries[n - 1] for n in parse_items(items, len(entries))]
+                    for entry in entries:
+                        self._raise_if_cancelled(cancel, url)
+                        done = checkpoint.lookup(entry)
+                        if done is not None:
+                            results.append((entry, done))
+                            logger.info("Already downloaded: %s", done, extra={"path": done})
+                            continue
+                        entry_url = entry.get("webpage_url") or entry.get("url") or url
+                        try:
+                            self._fetch(ydl, entry, entry_url)
+                        except Exception as e:
+                            release()
+                            self._raise_if_cancelled(cancel, url, e)
+                            # 1 件の失敗でプレイリスト全体を止めない
+                            checkpoint.mark_failed(entry, e)
+                            failures.append((entry_url, e))
+                            logger.error("Failed to download %s: %s", entry_url, e,
+                                         extra={"url": entry_url})
+
+        paths: list[str] = []
+        for entry, res in results:
+            if isinstance(res, str):
+                paths.append(res)
+                continue
+            try:
+                paths.append(res.result())
+            except Exception as e:
+                entry_url = entry.get("webpage_url") or entry.get("url") or url
+                self._raise_if_cancelled(cancel, url, e)
+                if checkpoint is None:
+                    raise
+                checkpoint.mark_failed(entry, e)
+                failures.append((entry_url, e))
+                logger.error("Failed to convert %s: %s", entry_url, e, extra={"url": entry_url})
+
+        # プレイリスト or マルチビデオ判定
+        if self._is_playlist(info):
+            if failures:
+                raise PartialDownloadError(paths, failures)
+            if checkpoint is not None:
+                checkpoint.clear()
+            return paths
+
+        # 単一動画
+        return paths[0] if paths else self._finalize(info, fmt, store=store, cancel=cancel)
+
+    # ------------------------------------------------------------------
+    # サブクラスで上書きするフック
+    # ------------------------------------------------------------------
+    def _ydl_options(self, fmt: str) -> dict:
+        """yt-dlp に渡すオプション
+
+        取得するストリームは出力形式から選ぶ（音声形式なら音声だけ、コピーで
+        変換できるコーデックを優先）。サイト固有の事情があればサブクラスで上書きする。
+        """
+        return {
+            "outtmpl": os.path.join(self.scratch_dir, "%(title)s.%(ext)s"),
+            "format": source_format(fmt),
+        }
+
+    # ------------------------------------------------------------------
+    # 内部処理
+    # ------------------------------------------------------------------
+    @contextlib.contextmanager
+    def _session(self, opts: dict) -> Iterator[YdlSession]:
+        """opts の yt-dlp セッションを借りる（プールがなければこの場限りで作る）"""
+        if self.sessions is not None:
+            with self.sessions.acquire(self.site, opts) as session:
+                yield session
+            return
+        with SessionPool() as pool, pool.acquire(self.site, opts) as session:
+            yield session
+
+    @staticmethod
+    def _raise_if_cancelled(
+        cancel: threading.Event | None, url: str, error: Exception | None = None
+    ) -> None:
+        """取り消されていれば（error の原因が取り消しでも）JobCancelled を投げる"""
+        if cancel is not None and cancel.is_set():
+            if isinstance(error, JobCancelled):
+                raise error
+            raise JobCancelled(url) from error
+
+    def _retry_options(self) -> dict:
+        """yt-dlp 内部の再試行（HTTP・フラグメント・抽出）と途中からの再開"""
+        retries = self.config.DOWNLOAD_RETRIES
+        sleep = {kind: lambda n: backoff_delay(n) for kind in ("http", "fragment", "extractor")}
+        return {
+            "retries": retries,
+            "fragment_retries": retries,
+            "extractor_retries": retries,
+            "retry_sleep_functions": sleep,
+            "continuedl": True,  # 残った .part ファイルの続きから取得する
+        }
+
+    def _with_retries(self, fn: Callable[[int], dict], label: str) -> dict:
+        """一時的なエラーなら指数バックオフで fn(試行回数) をやり直す"""
+        retries = self.config.DOWNLOAD_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                return fn(attempt)
+            except Exception as e:
+                if attempt >= retries or not is_transient(e):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning("Retrying %s in %.0fs (%d/%d): %s", label, delay, attempt + 1,
+                               retries, e, extra={"url": label})
+                time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def _list_entries(self, ydl: yt_dlp.YoutubeDL, url: str) -> dict:
+        """プレイリストのエントリ一覧（抽出結果キャッシュ優先）か単一動画の抽出結果
+
+        単一動画の抽出結果はメディア URL の期限が切れうるのでキャッシュを使わない。
+        """
+        cache = get_info_cache()
+        ttl = self.config.INFO_CACHE_TTL
+        with span("resolve", job=url) as attrs:
+            cached = cache.get(url, ttl=ttl) if ttl > 0 else None
+            if cached is not None and self._is_playlist(cached):
+                attrs["cached"] = True
+                return cached
+
+            info = self._with_retries(lambda attempt: self._extract_entries(ydl, url), url)
+            if self._is_playlist(info):
+                attrs["entries"] = len(info.get("entries") or [])
+            if self._is_playlist(info) and ttl > 0:
+                cache.put(url, ydl.sanitize_info(info))
+            return info
+
+    @staticmethod
+    def _extract_unprocessed(ydl: yt_dlp.YoutubeDL, url: str) -> dict:
+        """形式選択やエントリの解決をせずに抽出する（プレイリストかどうかの判定用）"""
+        info = ydl.extract_info(url, download=False, process=False)
+        # チャンネル URL → タブなどの転送は、プレイリストかどうか分かるまでたどる
+        seen = {url}
+        while info.get("_type") == "url" and info["url"] not in seen:
+            seen.add(info["url"])
+            info = ydl.extract_info(
+                info["url"], ie_key=info.get("ie_key"), download=False, process=False
+            )
+        return info
+
+    @classmethod
+    def _extract_entries(cls, ydl: yt_dlp.YoutubeDL, url: str) -> dict:
+        """ダウンロードせずに抽出する（プレイリストはエントリ一覧だけ）"""
+        info = cls._extract_unprocessed(ydl, url)
+        if "entries" in info:
+            # 遅延評価のエントリはここで取り切る（途中の失敗も再試行の対象にする）
+            info = {**info, "entries": list(info["entries"] or [])}
+        return info
+
+    def _fetch(self, ydl: yt_dlp.YoutubeDL, ie_result: dict, url: str) -> dict:
+        """抽出済みの結果をダウンロードする。再試行時は URL から抽出し直す。"""
+        def attempt_download(attempt: int) -> dict:
+            if attempt == 0:
+                return ydl.process_ie_result(ie_result, download=True)
+            return ydl.extract_info(url, download=True)  # 期限切れの URL を取り直す
+        with span("download", job=url):
+            return self._with_retries(attempt_download, url)
+
+    @staticmethod
+    def _is_playlist(info: dict) -> bool:
+        return info.get("_type") in ("playlist", "multi_video") or "entries" in info
+
+    def _downloaded_path(self, info: dict, fmt: str) -> str:
+        """yt-dlp が実際に保存したファイルのパス"""
+        if info.get("filepath"):
+            return info["filepath"]
+        downloads = info.get("requested_downloads") or []
+        if downloads and downloads[-1].get("filepath"):
+            return downloads[-1]["filepath"]
+        title = info.get("title", "video")
+        ext = info.get("ext", fmt) if fmt in VIDEO_FORMATS else fmt
+        return os.path.join(self.scratch_dir, f"{title}.{ext}")
+
+    def _reserve_download(
+        self, info: dict, fmt: str, *, cancel: threading.Event | None = None
+    ) -> Reservation:
+        """取得するエントリのダウンロードと、変換後の出力（または保存先への移動）の分を確保する"""
+        size = download_size(info)
+        needs: dict[str, int] = {self.scratch_dir: size or 0}
+        if (info.get("ext") or "").lower() != fmt:
+            output = Converter(self.config).estimate_output_size(
+                fmt, duration=info.get("duration"), source_size=size
+            )
+            output_dir = self.config.OUTPUT_DIR
+            needs[output_dir] = needs.get(output_dir, 0) + (output or 0)
+        elif os.path.abspath(self.scratch_dir) != os.path.abspath(self.download_dir):
+            # 変換しないものは SCRATCH_DIR から保存先へ移す（別ディスクならコピーになる）
+            needs[self.download_dir] = needs.get(self.download_dir, 0) + (size or 0)
+        label = info.get("webpage_url") or info.get("title") or ""
+        return get_disk_gate().reserve(
+            needs, margin=free_space_margin(self.config), cancel=cancel, label=label,
+            timeout=disk_wait_timeout(self.config),
+        )
+
+    def _finalize(
+        self,
+        info: dict,
+        fmt: str,
+        *,
+        threads: int | None = None,
+        store: DownloadArchive | None = None,
+        checkpoint: PlaylistCheckpoint | None = None,
+        cancel: threading.Event | None = None,
+    ) -> str:
+        """ダウンロード済みファイルを必要に応じて変換し、最終パスを返す"""
+        path = self._downloaded_path(info, fmt)
+        ext = os.path.splitext(path)[1].lstrip(".")
+
+        if ext.lower() != fmt:
+            converter = Converter(self.config, budget=self.budget)
+            try:
+                converted = converter.convert_to_format(path, fmt, threads=threads, cancel=cancel)
+            finally:
+                # 変換前のファイルは中間ファイルなので、失敗・中止でも残さない
+                with span("cleanup", job=info.get("webpage_url"), path=path):
+                    try: os.remove(path)
+                    except FileNotFoundError: pass
+            path = converted
+        elif os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.download_dir):
+            # SCRATCH_DIR に取得したものを保存先へ移す
+            path = shutil.move(path, os.path.join(self.download_dir, os.path.basename(path)))
+
+        key = archive_key(info)
+        if store is not None and key is not None:
+            store.record(key, fmt, path, title=info.get("title"), url=info.get("webpage_url"))
+        if checkpoint is not None:
+            checkpoint.mark_done(info, path)
+
+        logger.info("Downloaded: %s", path, extra={"url": info.get("webpage_url"), "path": path})
+        return path
+
+    def _download_streaming(
+        self,
+        url: str,
+        fmt: str,
+        *,
+        store: DownloadArchive | None = None,
+        cancel: threading.Event | None = None,
+    ) -> str | None:
+        """ダウンロードしながら ffmpeg へパイプして変換する
+
+        パイプで扱えない場合（プレイリスト、映像と音声の別ストリーム結合が
+        必要、シークが必要なコンテナ、変換不要）は None を返す。
+        """
+        opts = {**self._ydl_options(fmt), "quiet": True, "noplaylist": True}
+        with self._session(opts) as session:
+            # プレイリストはエントリを 1 件ずつ解決する前に見分けて通常の処理へ回す
+            info = self._extract_unprocessed(session.ydl, url)
+            if self._is_playlist(info):
+                return None
+            info = session.ydl.process_ie_result(info, download=False)
+            base_name = os.path.splitext(os.path.basename(session.ydl.prepare_filename(info)))[0]
+
+        if self._is_playlist(info) or info.get("requested_formats"):
+            return None
+        source_ext = (info.get("ext") or "").lower()
+        if source_ext == fmt or source_ext not in PIPEABLE_FORMATS:
+            return None
+
+        # yt-dlp を子プロセスで動かし、標準出力をそのまま ffmpeg の標準入力へ
+        cmd = [
+            sys.executable, "-m", "yt_dlp", "--quiet", "--no-playlist",
+            "-f", info["format_id"], "-o", "-",
+            info.get("webpage_url") or url,
+        ]
+        converter = Converter(self.config, budget=self.budget)
+        output_size = converter.estimate_output_size(
+            fmt, duration=info.get("duration"), source_size=download_size(info)
+        )
+        # 取得を始める前に変換の枠と出力の容量を確保する（待つ間 yt-dlp を止めておかない）
+        with (
+            converter.slot(cancel, url),
+            get_disk_gate().reserve(
+                {self.config.OUTPUT_DIR: output_size},
+                margin=free_space_margin(self.config), cancel=cancel, label=url,
+                timeout=disk_wait_timeout(self.config),
+            ),
+        ):
+            fetch = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+            try:
+                output_path = converter.convert_stream(fetch.stdout, base_name, fmt, cancel=cancel)
+            finally:
+                fetch.stdout.close()
+                if cancel is not None and cancel.is_set():
+                    fetch.kill()
+                returncode = fetch.wait()
+
+        if returncode != 0:
+            # 取得が途中で失敗すると ffmpeg は欠けた出力を正常終了で書いてしまう
+            try: os.remove(output_path)
+            except FileNotFoundError: pass
+            raise RuntimeError(f"yt-dlp failed (exit {returncode})")
+
+        key = archive_key(info)
+        if store is not None and key is not None:
+            store.record(
+                key, fmt, output_path, title=info.get("title"), url=info.get("webpage_url")
+            )
+        return output_path
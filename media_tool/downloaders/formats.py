@@ -0,0 +1,73 @@
+"""
+出力形式に合わせたダウンロード元ストリームの選択
+
+yt-dlp に渡す format 指定を出力形式から組み立てる（全ダウンローダー共通）。
+
+- 音声形式（mp3 / m4a / ogg など）は音声だけのストリームを取得し、映像は
+  落とさない。音声だけのストリームがないサイトでは、映像付きのうち解像度の
+  低いものを選ぶ（音声を取り出すだけなので映像の画質は要らない）。
+- 出力コンテナへそのままコピーできるコーデック（COPY_COMPATIBLE）の
+  ストリームがあれば優先し、変換を再エンコードなしの詰め替えで済ませる。
+- 該当するものがなければ従来どおり最良のストリームに戻る。
+"""
+from __future__ import annotations
+
+from media_tool.converter import AUDIO_ONLY_FORMATS, COPY_COMPATIBLE
+
+# ffprobe のコーデック名 → yt-dlp の vcodec / acodec の表記（先頭一致）
+YTDLP_CODEC_PREFIXES: dict[str, tuple[str, ...]] = {
+    "h264": ("avc1", "avc3", "h264"),
+    "hevc": ("hvc1", "hev1", "hevc", "h265"),
+    "av1": ("av01",),
+    "vp9": ("vp09", "vp9"),
+    "vp8": ("vp8",),
+    "mpeg4": ("mp4v",),
+    "aac": ("mp4a", "aac"),
+    "mp3": ("mp3",),
+    "opus": ("opus",),
+    "vorbis": ("vorbis",),
+    "flac": ("flac",),
+    "alac": ("alac",),
+}
+
+# 音声だけ欲しいときに映像付きストリームから選ぶ解像度の上限
+AUDIO_FALLBACK_MAX_HEIGHT = 480
+
+
+def _codec_filter(field: str, output_format: str, codec_type: str) -> str:
+    """output_format へコピーできるコーデックに絞る yt-dlp のフィルタ（なければ空文字）"""
+    codecs = COPY_COMPATIBLE.get(output_format, {}).get(codec_type, set())
+    prefixes = sorted({p for c in codecs for p in YTDLP_CODEC_PREFIXES.get(c, ())})
+    if not prefixes:
+        return ""
+    return f"[{field}~='^(?:{'|'.join(prefixes)})']"
+
+
+def source_format(output_format: str) -> str:
+    """output_format への変換に使うダウンロード元の yt-dlp format 指定
+
+    >>> source_format("m4a")
+    "bestaudio[acodec~='^(?:aac|alac|mp4a)']/bestaudio/best[height<=480]/best"
+    """
+    output_format = output_format.lower()
+    audio = _codec_filter("acodec", output_format, "audio")
+
+    if output_format in AUDIO_ONLY_FORMATS:
+        choices = [f"bestaudio{audio}"] if audio else []
+        choices += [
+            "bestaudio",
+            f"best[height<={AUDIO_FALLBACK_MAX_HEIGHT}]",
+            "best",
+        ]
+        return "/".join(choices)
+
+    video = _codec_filter("vcodec", output_format, "video")
+    choices = []
+    if video and audio:
+        choices.append(f"bestvideo{video}+bestaudio{audio}")
+    if video:
+        choices += [f"bestvideo{video}+bestaudio", f"best{video}"]
+    if audio:
+        choices.append(f"bestvideo+bestaudio{audio}")
+    choices += ["bestvideo+bestaudio", "best"]
+    return "/".join(choices)
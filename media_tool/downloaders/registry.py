@@ -0,0 +1,78 @@
+"""
+URL → ダウンローダーの対応表
+
+サイトごとに URL の正規表現とダウンローダークラスを登録しておき、URL に
+最初に一致したサイトのダウンローダーを使う。どれにも一致しない URL は
+yt-dlp の汎用エクストラクタに任せる（"generic"）。
+
+新しいサイトは register_downloader で追加する::
+
+    register_downloader("vimeo", r"^https?://(?:[\\w-]+\\.)*vimeo\\.com/", VimeoDownloader)
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable
+
+from media_tool.config import Config
+from media_tool.converter import ConvertBudget
+from media_tool.downloaders.base import BaseDownloader
+from media_tool.downloaders.niconico import NicoNicoDownloader
+from media_tool.downloaders.session import SessionPool
+from media_tool.downloaders.youtube import YouTubeDownloader
+
+# どのパターンにも一致しない URL のサイト名
+GENERIC_SITE = "generic"
+
+# ダウンローダーを作る関数（クラスそのものでよい）
+DownloaderFactory = Callable[..., BaseDownloader]
+
+# 登録順に照合する (サイト名, URL パターン, ダウンローダー)
+_REGISTRY: list[tuple[str, re.Pattern[str], DownloaderFactory]] = []
+
+
+def register_downloader(
+    site: str, pattern: str | re.Pattern[str], factory: DownloaderFactory
+) -> None:
+    """URL パターンに一致するサイトのダウンローダーを登録する（同名は置き換え）"""
+    compiled = re.compile(pattern, re.IGNORECASE) if isinstance(pattern, str) else pattern
+    _REGISTRY[:] = [entry for entry in _REGISTRY if entry[0] != site]
+    _REGISTRY.append((site, compiled, factory))
+
+
+def registered_sites() -> list[str]:
+    return [site for site, _, _ in _REGISTRY]
+
+
+def site_of(url: str) -> str:
+    """URL からサイト名を判定する"""
+    for site, pattern, _ in _REGISTRY:
+        if pattern.search(url):
+            return site
+    return GENERIC_SITE
+
+
+def create_downloader(
+    site: str,
+    config: Config,
+    *,
+    sessions: SessionPool | None = None,
+    budget: ConvertBudget | None = None,
+) -> BaseDownloader:
+    """サイト名に対応するダウンローダーを生成する"""
+    for name, _, factory in _REGISTRY:
+        if name == site:
+            return factory(config=config, site=site, sessions=sessions, budget=budget)
+    return BaseDownloader(config=config, site=GENERIC_SITE, sessions=sessions, budget=budget)
+
+
+register_downloader(
+    "youtube",
+    r"^(?:https?://)?(?:[\w-]+\.)*(?:youtube\.com|youtube-nocookie\.com|youtu\.be)(?:[/:?#]|$)",
+    YouTubeDownloader,
+)
+register_downloader(
+    "niconico",
+    r"^(?:https?://)?(?:[\w-]+\.)*(?:nicovideo\.jp|nico\.ms)(?:[/:?#]|$)",
+    NicoNicoDownloader,
+)
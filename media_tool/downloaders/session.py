@@ -0,0 +1,148 @@
+"""
+yt-dlp セッションの使い回し
+
+YoutubeDL はクッキー・HTTP コネクションプール・エクストラクタの初期化を
+インスタンスごとに持つ。URL ごとに作り直すとそのたびに初期化と TLS
+ハンドシェイクが掛かるので、サイトとオプションの組ごとにプールしておき、
+バッチ（スケジューラの 1 回の run やサービスの稼働中）の間は同じものを使う。
+
+YoutubeDL はスレッドセーフではないので、1 つのセッションを同時に使うのは
+1 スレッドだけ（acquire で借りて、使い終わったらプールへ返す）。
+呼び出しごとに変わる match_filter・ダウンロード開始前と完了後のエントリと
+進捗の受け取り先・取り消し用の Event は、セッションを作り直さずに差し替え
+られるようにしてある。
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import threading
+from typing import Callable, Iterator
+
+import yt_dlp
+from yt_dlp.postprocessor import PostProcessor
+from yt_dlp.utils import DownloadCancelled
+
+from media_tool.trace import YtDlpPhaseHook
+
+# match_filter の形（エントリ → スキップ理由 or None）
+MatchFilter = Callable[..., "str | None"]
+
+
+class _CallbackPP(PostProcessor):
+    """エントリを受け取り、コールバックへ渡す（登録した時点: before_dl / after_move）"""
+
+    def __init__(self, submit: Callable[[dict], None]) -> None:
+        super().__init__()
+        self._submit = submit
+
+    def run(self, info: dict):
+        self._submit(dict(info))
+        return [], info
+
+
+class YdlSession:
+    """使い回す YoutubeDL 1 つと、呼び出しごとに差し替えるコールバック"""
+
+    def __init__(self, opts: dict) -> None:
+        self.match_filter: MatchFilter | None = None
+        self.on_before_download: Callable[[dict], None] | None = None
+        self.on_finished: Callable[[dict], None] | None = None
+        self.on_progress: Callable[[dict], None] | None = None
+        self.cancel: threading.Event | None = None
+        self.ydl = yt_dlp.YoutubeDL({
+            **opts,
+            "match_filter": self._match_filter,
+            "progress_hooks": [self._progress_hook],
+            "postprocessor_hooks": [YtDlpPhaseHook()],  # トレース中だけ記録する
+        })
+        # ストリームが決まってから取得を始める前（空き容量の確保用）と、保存先への移動後
+        self.ydl.add_post_processor(_CallbackPP(self._before_download), when="before_dl")
+        self.ydl.add_post_processor(_CallbackPP(self._finished), when="after_move")
+
+    def _match_filter(self, info: dict, *, incomplete: bool = False) -> str | None:
+        if self.match_filter is None:
+            return None
+        return self.match_filter(info, incomplete=incomplete)
+
+    def _progress_hook(self, d: dict) -> None:
+        # ダウンロード中の進捗通知ごとに呼ばれる。取り消されていれば例外で打ち切る
+        if self.cancel is not None and self.cancel.is_set():
+            raise DownloadCancelled()
+        if self.on_progress is not None:
+            self.on_progress(d)
+
+    def _before_download(self, info: dict) -> None:
+        if self.on_before_download is not None:
+            self.on_before_download(info)
+
+    def _finished(self, info: dict) -> None:
+        if self.on_finished is not None:
+            self.on_finished(info)
+
+    def reset(self) -> None:
+        """呼び出しごとのコールバックを外す（プールへ返す前）"""
+        self.match_filter = None
+        self.on_before_download = None
+        self.on_finished = None
+        self.on_progress = None
+        self.cancel = None
+
+    def close(self) -> None:
+        self.ydl.close()
+
+
+def _opaque(value: object) -> str:
+    return "<callable>" if callable(value) else repr(value)
+
+
+class SessionPool:
+    """(サイト, オプション) ごとに空いている YdlSession を保持する
+
+    オプションは JSON にできる値で比較する（関数は中身を比べず、最初に
+    セッションを作ったときのものがそのまま使われる）。
+    """
+
+    def __init__(self) -> None:
+        self._idle: dict[tuple[str, str], list[YdlSession]] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @staticmethod
+    def _key(site: str, opts: dict) -> tuple[str, str]:
+        return site, json.dumps(opts, sort_keys=True, default=_opaque)
+
+    @contextlib.contextmanager
+    def acquire(self, site: str, opts: dict) -> Iterator[YdlSession]:
+        """空いているセッションを借りる（なければ作る）。抜けるとプールへ返す。"""
+        key = self._key(site, opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            session = idle.pop() if idle else None
+        if session is None:
+            session = YdlSession(opts)
+        try:
+            yield session
+        finally:
+            session.reset()
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._idle.setdefault(key, []).append(session)
+            if closed:
+                session.close()
+
+    def close(self) -> None:
+        """空いているセッションを閉じる（以降に返されたものもその場で閉じる）"""
+        with self._lock:
+            self._closed = True
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+    def __enter__(self) -> SessionPool:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
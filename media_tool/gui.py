@@ -6,23 +6,45 @@ Media-Tool GUI
 機能:
   • ファイルの一括変換
   • URL/プレイリストの一括ダウンロード
+  • ジョブ一覧（状態・進捗・速度の表示、個別／バッチ単位の中止）
+  • URL の情報プレビューとエントリ選択
   • 拡張子個別指定 (ffmpeg 対応形式)
   • 設定 GUI の呼び出しと即時反映
 """
 from __future__ import annotations
 
+import copy
+import queue
 import sys
 import threading
 from pathlib import Path
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
-from media_tool.config import Config
-from media_tool.converter import Converter, SUPPORTED_FORMATS
-from media_tool.downloaders.youtube import YouTubeDownloader
-from media_tool.downloaders.niconico import NicoNicoDownloader
+from media_tool.archive import dedupe_urls
+from media_tool.cache import get_conversion_cache
+from media_tool.config import ENCODE_PROFILES, Config
+from media_tool.converter import ConvertBudget, Converter, SUPPORTED_FORMATS, resolve_jobs
+from media_tool.downloaders.registry import create_downloader, site_of
+from media_tool.downloaders.session import SessionPool
+from media_tool.info_cache import fetch_info
+from media_tool.jobs import Job, JobManager, JobWork, Reporter
+from media_tool.log import setup_logging
+from media_tool.progress import (
+    ConvertProgress, DownloadProgress, format_bytes, format_duration,
+)
+from media_tool.scheduler import SITE_LIMITS
 from media_tool.settings_gui import SettingsGUI
 
+# ジョブ一覧を更新する間隔（ミリ秒）と 1 回に取り出す更新の上限
+POLL_MS = 100
+POLL_BATCH = 500
+
+KIND_LABELS = {"convert": "変換", "download": "ダウンロード"}
+STATE_LABELS = {
+    "queued": "待機中", "running": "実行中", "done": "完了", "failed": "失敗", "cancelled": "中止",
+}
+
 # ----------------------------------------------------------------------
 # ユーティリティ
 # ----------------------------------------------------------------------
@@ -37,6 +59,22 @@ def format_paths_for_dialog(paths: list[str], limit: int = 5) -> str:
     return f"{shown}\n…他 {len(names) - limit} 件"
 
 
+def describe_convert(p: ConvertProgress) -> str:
+    """変換の速度と残り時間（例: "38.2fps  2.10x  ETA 00:43"）"""
+    fps = f"{p.fps:.1f}fps" if p.fps else "-fps"
+    speed = f"{p.speed:.2f}x" if p.speed else "-x"
+    return f"{fps}  {speed}  ETA {format_duration(p.eta)}"
+
+
+def describe_download(p: DownloadProgress) -> str:
+    """ダウンロードの量・速度・残り時間（例: "12.3MiB / 40.0MiB  3.1MiB/s  ETA 00:09"）"""
+    size = format_bytes(p.downloaded_bytes)
+    if p.total_bytes:
+        size += f" / {format_bytes(p.total_bytes)}"
+    speed = f"{format_bytes(p.speed)}/s" if p.speed else "-/s"
+    return f"{size}  {speed}  ETA {format_duration(p.eta)}"
+
+
 # ----------------------------------------------------------------------
 # メイン GUI
 # ----------------------------------------------------------------------
@@ -54,9 +92,21 @@ class MediaToolGUI(tk.Tk):
         except ValueError as e:
             messagebox.showerror("設定エラー", str(e))
             sys.exit(1)
+        setup_logging(self.config.LOG_LEVEL)  # 処理の詳細はコンソールに出す
+
+        # 変換・ダウンロードはすべて共有の有界プールで実行する（バッチ同士で CPU を奪い合わない）
+        self.jobs = JobManager(resolve_jobs(self.config.CONVERT_JOBS))
+        # ffmpeg はダウンロード後の変換も含めてプールの大きさまで
+        self.budget = ConvertBudget(self.jobs.workers)
+        self.sessions = SessionPool()  # yt-dlp のセッションは GUI の起動中使い回す
+        self._rows: dict[int, Job] = {}        # 一覧に表示中のジョブ（最新の写し）
+        self._batches: dict[int, str] = {}     # 結果をまだ表示していないバッチ → 処理名
+        self._note = ""                        # ジョブ以外の状態表示（情報取得中など）
 
         # ウィジェット構築
         self._build_widgets()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.after(POLL_MS, self._poll_jobs)
 
     # ------------------------------------------------------------------
     # ウィジェット
@@ -83,6 +133,15 @@ class MediaToolGUI(tk.Tk):
             command=self._on_convert_click,
         ).grid(row=0, column=2, **pad)
 
+        ttk.Label(convert_frame, text="エンコード設定").grid(row=1, column=0, **pad)
+        self.cv_profile_var = tk.StringVar(value=self.config.ENCODE_PROFILE)
+        ttk.OptionMenu(
+            convert_frame,
+            self.cv_profile_var,
+            self.cv_profile_var.get(),
+            *sorted(ENCODE_PROFILES),
+        ).grid(row=1, column=1, **pad)
+
         # ==== ダウンロードセクション ===================================
         download_frame = ttk.LabelFrame(self, text="ダウンロード")
         download_frame.grid(row=1, column=0, sticky="ew", **pad)
@@ -106,13 +165,65 @@ class MediaToolGUI(tk.Tk):
             download_frame, text="ダウンロード", command=self._on_download_click
         ).grid(row=1, column=2, **pad)
 
+        ttk.Label(download_frame, text="エンコード設定").grid(row=2, column=0, **pad)
+        self.dl_profile_var = tk.StringVar(value=self.config.ENCODE_PROFILE)
+        ttk.OptionMenu(
+            download_frame,
+            self.dl_profile_var,
+            self.dl_profile_var.get(),
+            *sorted(ENCODE_PROFILES),
+        ).grid(row=2, column=1, **pad)
+
+        ttk.Button(
+            download_frame, text="プレビュー", command=self._on_preview_click
+        ).grid(row=2, column=2, **pad)
+
+        # ==== ジョブ一覧 ===============================================
+        jobs_frame = ttk.LabelFrame(self, text="ジョブ")
+        jobs_frame.grid(row=2, column=0, sticky="ew", **pad)
+        jobs_frame.columnconfigure(0, weight=1)
+
+        self.progress_var = tk.DoubleVar(value=0.0)
+        ttk.Progressbar(
+            jobs_frame, variable=self.progress_var, maximum=100.0
+        ).grid(row=0, column=0, columnspan=2, sticky="ew", **pad)
+        self.progress_text = tk.StringVar(value="待機中")
+        ttk.Label(jobs_frame, textvariable=self.progress_text).grid(
+            row=1, column=0, columnspan=2, sticky="w", **pad
+        )
+
+        columns = (
+            ("kind", "種類", 90), ("name", "対象", 220), ("state", "状態", 60),
+            ("progress", "進捗", 60), ("detail", "速度・残り時間", 230),
+        )
+        self.job_tree = ttk.Treeview(
+            jobs_frame, columns=[c for c, _, _ in columns], show="headings", height=8
+        )
+        for column, text, width in columns:
+            self.job_tree.heading(column, text=text)
+            self.job_tree.column(column, width=width, stretch=column in ("name", "detail"))
+        self.job_tree.grid(row=2, column=0, sticky="ew", padx=(10, 0), pady=4)
+        scrollbar = ttk.Scrollbar(jobs_frame, orient=tk.VERTICAL, command=self.job_tree.yview)
+        scrollbar.grid(row=2, column=1, sticky="ns", padx=(0, 10), pady=4)
+        self.job_tree.configure(yscrollcommand=scrollbar.set)
+
+        buttons = ttk.Frame(jobs_frame)
+        buttons.grid(row=3, column=0, columnspan=2, sticky="w", **pad)
+        for text, command in (
+            ("選択を中止", self._cancel_selected),
+            ("バッチごと中止", self._cancel_selected_batches),
+            ("すべて中止", self.jobs.cancel_all),
+            ("終わったものを消去", self._clear_finished),
+        ):
+            ttk.Button(buttons, text=text, command=command).pack(side=tk.LEFT, padx=(0, 6))
+
         # ==== 設定ボタン ===============================================
         ttk.Button(
             self,
             text="設定を開く",
             command=self._open_settings,
             width=30,
-        ).grid(row=2, column=0, padx=10, pady=(6, 10), sticky="ew")
+        ).grid(row=3, column=0, padx=10, pady=(6, 10), sticky="ew")
 
     # ------------------------------------------------------------------
     # イベントハンドラ
@@ -125,21 +236,31 @@ class MediaToolGUI(tk.Tk):
         )
         if not paths:
             return
-        threading.Thread(
-            target=self._convert_worker,
-            args=(list(paths), self.cv_format_var.get()),
-            daemon=True,
-        ).start()
-
-    def _convert_worker(self, paths: list[str], fmt: str) -> None:
-        converter = Converter(self.config)
-        success, errors = [], []
-        for p in paths:
-            try:
-                success.append(converter.convert_to_format(p, fmt))
-            except Exception as e:
-                errors.append(f"{Path(p).name}: {e}")
-        self.after(0, lambda: self._show_result("変換", success, errors))
+        try:
+            converter = Converter(
+                self.config, profile=self.cv_profile_var.get(), budget=self.budget
+            )
+        except Exception as e:
+            messagebox.showerror("変換失敗", str(e))
+            return
+        fmt = self.cv_format_var.get()
+        # CPU コアは同時に動くジョブで等分する
+        threads = self.budget.threads
+        batch = self.jobs.new_batch()
+        self._batches[batch] = "変換"
+        for path in paths:
+            self.jobs.submit(batch, "convert", path, self._convert_job(converter, path, fmt, threads))
+
+    @staticmethod
+    def _convert_job(converter: Converter, path: str, fmt: str, threads: int | None) -> JobWork:
+        def work(job: Job, report: Reporter) -> list[str]:
+            def on_progress(p: ConvertProgress) -> None:
+                report(p.percent, describe_convert(p))
+
+            return [converter.convert_to_format(
+                path, fmt, threads=threads, progress=on_progress, cancel=job.cancel
+            )]
+        return work
 
     # --- ダウンロード -------------------------------------------------
     def _on_download_click(self) -> None:
@@ -148,26 +269,89 @@ class MediaToolGUI(tk.Tk):
             messagebox.showwarning("入力エラー", "URL を入力してください。")
             return
         urls = url_text.split()  # スペース区切り可
-        threading.Thread(
-            target=self._download_worker,
-            args=(urls, self.dl_format_var.get()),
-            daemon=True,
-        ).start()
-
-    def _download_worker(self, urls: list[str], fmt: str) -> None:
-        success, errors = [], []
-        for url in urls:
-            try:
-                dl = (
-                    YouTubeDownloader(config=self.config)
-                    if "youtube" in url.lower()
-                    else NicoNicoDownloader(config=self.config)
-                )
-                res = dl.download(url, output_format=fmt)
-                success.extend(res if isinstance(res, list) else [res])
-            except Exception as e:
-                errors.append(f"{url}: {e}")
-        self.after(0, lambda: self._show_result("ダウンロード", success, errors))
+        self._submit_downloads(urls, self.dl_format_var.get(), self.dl_profile_var.get())
+
+    def _submit_downloads(
+        self, urls: list[str], fmt: str, profile: str, items: str | None = None
+    ) -> None:
+        # 選択したエンコード設定はこのダウンロードだけに適用する
+        config = copy.copy(self.config)
+        config.ENCODE_PROFILE = profile
+        batch = self.jobs.new_batch()
+        self._batches[batch] = "ダウンロード"
+        for url in dedupe_urls(urls):
+            site = site_of(url)
+            # サイトごとの同時ダウンロード数は DownloadScheduler と同じ上限に抑える
+            # （枠が空くまではプールへ渡さない）
+            limit = min(max(config.DOWNLOAD_PARALLEL, 1), SITE_LIMITS.get(site, 1))
+            self.jobs.submit(
+                batch, "download", url, self._download_job(config, site, url, fmt, items),
+                lane=site, lane_limit=limit,
+            )
+
+    def _download_job(
+        self, config: Config, site: str, url: str, fmt: str, items: str | None
+    ) -> JobWork:
+        def work(job: Job, report: Reporter) -> list[str]:
+            def on_progress(p: DownloadProgress) -> None:
+                report(p.percent, describe_download(p))
+
+            downloader = create_downloader(site, config, sessions=self.sessions, budget=self.budget)
+            res = downloader.download(
+                url, output_format=fmt, items=items, cancel=job.cancel, progress=on_progress
+            )
+            return res if isinstance(res, list) else [res]
+        return work
+
+    # --- プレビュー ---------------------------------------------------
+    def _on_preview_click(self) -> None:
+        url = self.url_var.get().strip().split()
+        if not url:
+            messagebox.showwarning("入力エラー", "URL を入力してください。")
+            return
+        self._note = "情報を取得中…"
+        threading.Thread(target=self._preview_worker, args=(url[0],), daemon=True).start()
+
+    def _preview_worker(self, url: str) -> None:
+        try:
+            info = fetch_info(url, ttl=self.config.INFO_CACHE_TTL)
+        except Exception as e:
+            msg = str(e)  # e は except を抜けると消えるので、after で使う値は先に取り出す
+            self.after(0, lambda: setattr(self, "_note", ""))
+            self.after(0, lambda: messagebox.showerror("情報取得失敗", msg))
+            return
+        self.after(0, lambda: setattr(self, "_note", ""))
+        self.after(0, lambda: self._show_preview(url, info))
+
+    def _show_preview(self, url: str, info: dict) -> None:
+        """抽出結果を一覧表示し、選択したエントリだけをダウンロードできるようにする"""
+        entries = [e for e in info.get("entries") or [info] if e is not None]
+        win = tk.Toplevel(self)
+        win.title(info.get("title") or url)
+
+        listbox = tk.Listbox(win, selectmode=tk.EXTENDED, width=70, height=min(len(entries), 20))
+        listbox.grid(row=0, column=0, sticky="nsew", padx=10, pady=(10, 4))
+        scrollbar = ttk.Scrollbar(win, orient=tk.VERTICAL, command=listbox.yview)
+        scrollbar.grid(row=0, column=1, sticky="ns", pady=(10, 4))
+        listbox.configure(yscrollcommand=scrollbar.set)
+        for n, entry in enumerate(entries, 1):
+            duration = format_duration(entry["duration"]) if entry.get("duration") else ""
+            listbox.insert(tk.END, f"{n}. {entry.get('title') or entry.get('url')}  {duration}")
+        listbox.select_set(0, tk.END)
+
+        def download_selected() -> None:
+            selected = [i + 1 for i in listbox.curselection()]
+            if not selected:
+                return
+            items = ",".join(map(str, selected)) if "entries" in info else None
+            win.destroy()
+            self._submit_downloads(
+                [url], self.dl_format_var.get(), self.dl_profile_var.get(), items
+            )
+
+        ttk.Button(win, text="選択したものをダウンロード", command=download_selected).grid(
+            row=1, column=0, columnspan=2, padx=10, pady=(4, 10), sticky="ew"
+        )
 
     # --- 設定 ---------------------------------------------------------
     def _open_settings(self) -> None:
@@ -180,11 +364,103 @@ class MediaToolGUI(tk.Tk):
         """設定ファイルを再読み込みし、GUI へ反映。"""
         try:
             self.config.load(self.config.CONFIG_PATH)
+            setup_logging(self.config.LOG_LEVEL)
             self.cv_format_var.set(self.config.DEFAULT_FORMAT)
             self.dl_format_var.set(self.config.DEFAULT_FORMAT)
+            self.cv_profile_var.set(self.config.ENCODE_PROFILE)
+            self.dl_profile_var.set(self.config.ENCODE_PROFILE)
         except Exception as e:
             messagebox.showerror("設定再読込失敗", str(e))
 
+    # ------------------------------------------------------------------
+    # ジョブ一覧
+    # ------------------------------------------------------------------
+    def _poll_jobs(self) -> None:
+        """ワーカーから届いた状態の写しを一覧へ反映する（メインスレッドで定期実行）"""
+        self._drain_updates()
+        self._refresh_summary()
+        self._report_finished_batches()
+        self.after(POLL_MS, self._poll_jobs)
+
+    def _drain_updates(self) -> None:
+        for _ in range(POLL_BATCH):
+            try:
+                job = self.jobs.updates.get_nowait()
+            except queue.Empty:
+                break
+            self._rows[job.id] = job
+            percent = "" if job.percent is None else f"{job.percent:.0f}%"
+            values = (
+                KIND_LABELS.get(job.kind, job.kind),
+                Path(job.source).name if job.kind == "convert" else job.source,
+                STATE_LABELS.get(job.state, job.state),
+                percent,
+                job.detail,
+            )
+            iid = str(job.id)
+            if self.job_tree.exists(iid):
+                self.job_tree.item(iid, values=values)
+            else:
+                self.job_tree.insert("", tk.END, iid=iid, values=values)
+
+    def _refresh_summary(self) -> None:
+        active = [job for job in self._rows.values() if not job.finished]
+        if not active:
+            self.progress_var.set(0.0)
+            self.progress_text.set(self._note or "待機中")
+            return
+        # まだ表示中のバッチ全体の平均（終わったジョブは 100% として数える）
+        batch_jobs = [job for job in self._rows.values() if job.batch in self._batches]
+        total = sum(100.0 if job.finished else job.percent or 0.0 for job in batch_jobs)
+        self.progress_var.set(total / max(len(batch_jobs), 1))
+        running = sum(1 for job in active if job.state == "running")
+        text = f"実行中 {running} 件 / 待機中 {len(active) - running} 件"
+        self.progress_text.set(f"{text}  {self._note}" if self._note else text)
+
+    def _report_finished_batches(self) -> None:
+        for batch, title in list(self._batches.items()):
+            jobs = [job for job in self._rows.values() if job.batch == batch]
+            if not jobs or not all(job.finished for job in jobs):
+                continue
+            del self._batches[batch]
+            if title == "変換" and self.config.CONVERT_CACHE:
+                cache = get_conversion_cache()
+                cache.evict()
+                cache.flush()
+            if all(job.state == "cancelled" for job in jobs):
+                continue  # 自分で中止したものは結果を出さない
+            success = [path for job in jobs for path in job.paths]
+            errors = [f"{job.source}: {job.error}" for job in jobs if job.state == "failed"]
+            self._show_result(title, success, errors)
+
+    def _selected_jobs(self) -> list[int]:
+        return [int(iid) for iid in self.job_tree.selection()]
+
+    def _cancel_selected(self) -> None:
+        self.jobs.cancel(self._selected_jobs())
+
+    def _cancel_selected_batches(self) -> None:
+        batches = {self._rows[i].batch for i in self._selected_jobs() if i in self._rows}
+        for batch in batches:
+            self.jobs.cancel_batch(batch)
+
+    def _clear_finished(self) -> None:
+        self._drain_updates()  # 直前に終わったものも取りこぼさない
+        finished = [
+            job.id for job in self._rows.values()
+            if job.finished and job.batch not in self._batches
+        ]
+        self.jobs.forget(finished)
+        for job_id in finished:
+            del self._rows[job_id]
+            self.job_tree.delete(str(job_id))
+
+    def _on_close(self) -> None:
+        # 実行中の ffmpeg・ダウンロードを止めてから閉じる
+        self.jobs.shutdown()
+        self.sessions.close()
+        self.destroy()
+
     # ------------------------------------------------------------------
     # 共通ダイアログ
     # ------------------------------------------------------------------
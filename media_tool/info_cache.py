@@ -0,0 +1,143 @@
+"""
+抽出結果（メタデータ）キャッシュ
+
+yt-dlp の extract_info をダウンロードなしで実行した結果（プレイリストは
+フラット抽出のエントリ一覧）を URL ごとの JSON としてディスクに保存し、
+有効期限内は info コマンド・GUI のプレビュー・download のエントリ一覧で
+サイトに問い合わせずに再利用する。合計サイズが上限を超えたら
+最終利用が古いものから削除する。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from media_tool.utils import CACHE_DIR, write_json_atomic
+
+# 抽出結果の保存先
+INFO_CACHE_DIR = os.path.join(CACHE_DIR, "info")
+
+# 合計サイズの上限（超えた分は最終利用が古いものから削除）
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def parse_items(spec: str, count: int) -> list[int]:
+    """"1-3,7,10-" のような指定を 1 始まりのエントリ番号一覧にする"""
+    selected: list[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition("-")
+        try:
+            first = int(start) if start else 1
+            last = (int(end) if end else count) if sep else first
+        except ValueError:
+            raise ValueError(f"invalid item selection: {part!r}") from None
+        for n in range(max(first, 1), min(last, count) + 1):
+            if n not in selected:
+                selected.append(n)
+    return selected
+
+
+class InfoCache:
+    """URL ごとの抽出結果 JSON（スレッドセーフ）"""
+
+    def __init__(self, directory: str = INFO_CACHE_DIR, *, max_bytes: int = MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def get(self, url: str, *, ttl: float) -> dict | None:
+        """ttl 秒以内に保存した抽出結果があれば返す"""
+        path = self._path(url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url or time.time() - entry.get("fetched_at", 0) > ttl:
+            return None
+        try:
+            os.utime(path)  # 最終利用として mtime を更新
+        except OSError:
+            pass
+        return entry["info"]
+
+    def put(self, url: str, info: dict) -> None:
+        try:
+            entry = {"url": url, "fetched_at": time.time(), "info": info}
+            write_json_atomic(self._path(url), entry)
+        except (OSError, TypeError, ValueError):
+            return  # 保存できなくても抽出結果はそのまま使える
+        self.evict()
+
+    def evict(self, *, max_bytes: int | None = None) -> int:
+        """合計サイズが上限に収まるまで古いものから削除し、削除した件数を返す"""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            try:
+                files = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+            except FileNotFoundError:
+                return 0
+            stats = []
+            for e in files:
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                stats.append((st.st_mtime, st.st_size, e.path))
+            total = sum(size for _, size, _ in stats)
+            removed = 0
+            for _, size, path in sorted(stats):
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+
+_shared: InfoCache | None = None
+_shared_lock = threading.Lock()
+
+
+def get_info_cache() -> InfoCache:
+    """プロセス内で共有する InfoCache"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = InfoCache()
+        return _shared
+
+
+def fetch_info(url: str, *, ttl: float, refresh: bool = False) -> dict:
+    """URL の抽出結果をダウンロードせずに得る（キャッシュ優先）
+
+    プレイリストはフラット抽出（各エントリは URL と ID などのみ）で取得する。
+    ttl が 0 ならキャッシュを読み書きしない。
+    """
+    import yt_dlp
+
+    cache = get_info_cache()
+    if not refresh and ttl > 0:
+        cached = cache.get(url, ttl=ttl)
+        if cached is not None:
+            return cached
+
+    opts = {"quiet": True, "skip_download": True, "extract_flat": "in_playlist"}
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+    if ttl > 0:
+        cache.put(url, info)
+    return info
@@ -0,0 +1,250 @@
+"""
+GUI 用のジョブ管理
+
+変換・ダウンロードを 1 ファイル／1 URL 単位のジョブとして、共有の有界スレッド
+プールで実行する。続けてボタンを押しても同時に動くジョブはプールの大きさまでで、
+バッチ同士が CPU を奪い合わない。
+
+状態の変化（待機中・実行中・進捗・完了・失敗・中止）は Job の写しとして
+スレッドセーフなキュー（updates）に流す。GUI はそれを after() で定期的に
+取り出して表示するので、Tk のウィジェットにはメインスレッドからしか触れない。
+ジョブは個別にもバッチ単位でも中止でき、実行中の ffmpeg は cancel
+（threading.Event）で止める。
+
+サイトごとの同時ダウンロード数のような、プールとは別の上限はレーンで表す。
+レーンを指定したジョブは、そのレーンで動いている数が上限を下回るまで
+プールへ渡さずに待たせるので、枠を待つジョブがプールのスレッドを塞がない。
+"""
+from __future__ import annotations
+
+import copy
+import itertools
+import queue
+from collections import deque
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from media_tool.converter import JobCancelled
+
+# ジョブの状態
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED_STATES = frozenset({"done", "failed", "cancelled"})
+
+# 進捗の通知を updates に流す最短間隔（秒、完了時は間引かない）
+REPORT_INTERVAL = 0.2
+
+
+@dataclass
+class Job:
+    """変換 1 ファイル／ダウンロード 1 URL 分のジョブ"""
+
+    id: int
+    batch: int
+    kind: str                          # "convert" / "download"
+    source: str                        # 入力パス or URL
+    state: str = "queued"
+    percent: float | None = None
+    detail: str = ""                   # 速度・残り時間・エラーなど表示用の補足
+    paths: list[str] = field(default_factory=list)
+    error: str | None = None
+    cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+
+# 進捗の報告先 (完了割合 % or None, 補足)
+Reporter = Callable[[float | None, str], None]
+
+# ジョブの処理本体: (ジョブ, 報告先) → 出力パス一覧。job.cancel を見て中断する
+JobWork = Callable[[Job, Reporter], list[str]]
+
+
+@dataclass
+class _Lane:
+    """同時に動かすジョブの数を limit までに抑える待ち行列"""
+
+    limit: int
+    running: int = 0
+    waiting: deque[tuple[Job, JobWork]] = field(default_factory=deque)
+
+
+class JobManager:
+    """ジョブを共有の有界スレッドプールで実行し、状態の写しを updates に流す"""
+
+    def __init__(self, workers: int) -> None:
+        self.workers = max(workers, 1)
+        self.updates: queue.Queue[Job] = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._jobs: dict[int, Job] = {}
+        self._futures: dict[int, Future] = {}
+        self._lanes: dict[str, _Lane] = {}
+        self._lane_of: dict[int, str] = {}     # プールへ渡したレーンのジョブ → レーン名
+        self._ids = itertools.count(1)
+        self._batches = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_batch(self) -> int:
+        """ボタン 1 回分のジョブをまとめる番号を払い出す"""
+        return next(self._batches)
+
+    def submit(
+        self,
+        batch: int,
+        kind: str,
+        source: str,
+        work: JobWork,
+        *,
+        lane: str | None = None,
+        lane_limit: int = 1,
+    ) -> Job:
+        """ジョブを登録して実行を待たせる
+
+        lane を指定すると、同じレーンで同時に動くジョブを lane_limit 個までに抑える
+        （上限はレーンを最初に使ったときの値）。
+        """
+        job = Job(next(self._ids), batch, kind, source)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._publish(job)
+            if lane is None:
+                self._futures[job.id] = self._pool.submit(self._run, job, work)
+            else:
+                queued = self._lanes.setdefault(lane, _Lane(max(lane_limit, 1)))
+                queued.waiting.append((job, work))
+                self._dispatch(lane)
+        return job
+
+    def jobs(self, batch: int | None = None) -> list[Job]:
+        """ジョブの写し（batch を指定するとそのバッチだけ）"""
+        with self._lock:
+            return [
+                copy.copy(job) for job in self._jobs.values()
+                if batch is None or job.batch == batch
+            ]
+
+    # ------------------------------------------------------------------
+    # 中止・片付け
+    # ------------------------------------------------------------------
+    def cancel(self, job_ids: Iterable[int]) -> None:
+        """ジョブを中止する（待機中なら実行せず、実行中なら ffmpeg などを止める）"""
+        for job_id in job_ids:
+            with self._lock:
+                job = self._jobs.get(job_id)
+                future = self._futures.get(job_id)
+                if job is None or job.finished:
+                    continue
+                job.cancel.set()
+                if self._drop_waiting(job) or (future is not None and future.cancel()):
+                    # まだ始まっていなかった
+                    self._set(job, state="cancelled", detail="")
+                    self._leave_lane(job)
+
+    def cancel_batch(self, batch: int) -> None:
+        self.cancel(job.id for job in self.jobs(batch))
+
+    def cancel_all(self) -> None:
+        self.cancel(job.id for job in self.jobs())
+
+    def forget(self, job_ids: Iterable[int]) -> None:
+        """終わったジョブを管理対象から外す"""
+        with self._lock:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job is not None and job.finished:
+                    del self._jobs[job_id]
+                    self._futures.pop(job_id, None)
+
+    def shutdown(self) -> None:
+        """残りのジョブを中止し、スレッドの終了は待たずに戻る"""
+        self.cancel_all()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # 内部処理
+    # ------------------------------------------------------------------
+    def _dispatch(self, name: str) -> None:
+        # _lock を持った状態で呼ぶ。レーンに空きがある分だけ待ち行列からプールへ渡す
+        lane = self._lanes[name]
+        while lane.running < lane.limit and lane.waiting:
+            job, work = lane.waiting.popleft()
+            try:
+                self._futures[job.id] = self._pool.submit(self._run_in_lane, job, work)
+            except RuntimeError:
+                # shutdown 後（GUI の終了中）
+                self._set(job, state="cancelled", detail="")
+                continue
+            lane.running += 1
+            self._lane_of[job.id] = name
+
+    def _drop_waiting(self, job: Job) -> bool:
+        # _lock を持った状態で呼ぶ。レーンの待ち行列にあれば取り除く
+        for lane in self._lanes.values():
+            for entry in lane.waiting:
+                if entry[0] is job:
+                    lane.waiting.remove(entry)
+                    return True
+        return False
+
+    def _leave_lane(self, job: Job) -> None:
+        # _lock を持った状態で呼ぶ。プールへ渡したレーンのジョブが終わったら次を渡す
+        name = self._lane_of.pop(job.id, None)
+        if name is not None:
+            self._lanes[name].running -= 1
+            self._dispatch(name)
+
+    def _run_in_lane(self, job: Job, work: JobWork) -> None:
+        try:
+            self._run(job, work)
+        finally:
+            with self._lock:
+                self._leave_lane(job)
+
+    def _run(self, job: Job, work: JobWork) -> None:
+        if job.cancel.is_set():
+            self._update(job, state="cancelled")
+            return
+        self._update(job, state="running", percent=0.0)
+        last = 0.0
+
+        def report(percent: float | None, detail: str) -> None:
+            nonlocal last
+            now = time.monotonic()
+            if (percent is not None and percent >= 100.0) or now - last >= REPORT_INTERVAL:
+                last = now
+                self._update(job, percent=percent, detail=detail)
+
+        try:
+            paths = work(job, report)
+        except JobCancelled:
+            self._update(job, state="cancelled", detail="")
+        except Exception as e:
+            if job.cancel.is_set():
+                self._update(job, state="cancelled", detail="")
+                return
+            # プレイリストの一部だけ失敗した場合は、成功した分と各エントリのエラーも残す
+            errors = getattr(e, "errors", None) or []
+            message = "; ".join(f"{url}: {err}" for url, err in errors) or str(e)
+            self._update(
+                job, state="failed", paths=list(getattr(e, "paths", [])),
+                error=message, detail=message,
+            )
+        else:
+            self._update(job, state="done", percent=100.0, paths=paths, detail="")
+
+    def _update(self, job: Job, **fields) -> None:
+        with self._lock:
+            self._set(job, **fields)
+
+    def _set(self, job: Job, **fields) -> None:
+        # _lock を持った状態で呼ぶ
+        for key, value in fields.items():
+            setattr(job, key, value)
+        self._publish(job)
+
+    def _publish(self, job: Job) -> None:
+        self.updates.put(copy.copy(job))
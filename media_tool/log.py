@@ -0,0 +1,57 @@
+"""
+ログ設定
+
+media_tool 以下のモジュールは logging.getLogger(__name__) で出力し、
+出力先・レベル（Config.LOG_LEVEL）・形式は setup_logging でまとめて決める。
+テキスト形式は従来どおり "[INFO] メッセージ"、JSON 形式は 1 行 1 レコードで
+extra に渡した項目（url / path / job など）もそのまま出力する。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import time
+from typing import IO
+
+# ログの形式
+LOG_FORMATS = ("text", "json")
+
+# LogRecord が標準で持つ属性（これ以外は extra で渡された項目）
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """1 レコードを 1 行の JSON にする"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                    + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = "INFO", *, fmt: str = "text", stream: IO[str] | None = None) -> None:
+    """media_tool のロガーに出力先を設定する（何度呼んでも置き換えるだけ）"""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+
+    logger = logging.getLogger("media_tool")
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
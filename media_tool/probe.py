@@ -0,0 +1,66 @@
+"""
+ffprobe による入力ファイルの解析
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import subprocess
+
+
+def probe_media(path: str) -> dict | None:
+    """入力の長さ（秒）とストリーム一覧を返す
+
+    戻り値は {"duration": float | None, "streams": [{"index", "codec_type",
+    "codec_name", "attached_pic"}, ...]}。ffprobe が無い・解析に失敗した
+    場合は None。
+    """
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        return None
+    startupinfo = None
+    if os.name == 'nt':
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    try:
+        result = subprocess.run(
+            [
+                ffprobe, "-v", "error",
+                "-show_entries",
+                "format=duration:stream=index,codec_type,codec_name:stream_disposition=attached_pic",
+                "-of", "json", path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=True,
+            startupinfo=startupinfo,
+        )
+        data = json.loads(result.stdout)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+    try:
+        duration = float(data.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    streams = [
+        {
+            "index": s.get("index"),
+            "codec_type": s.get("codec_type"),
+            "codec_name": s.get("codec_name"),
+            "attached_pic": bool(s.get("disposition", {}).get("attached_pic")),
+        }
+        for s in data.get("streams", [])
+    ]
+    return {"duration": duration, "streams": streams}
+
+
+def stream_codecs(streams: list[dict], codec_type: str) -> set[str]:
+    """指定種別（video / audio）のコーデック名一覧（カバー画像は除く）"""
+    return {
+        s["codec_name"]
+        for s in streams
+        if s["codec_type"] == codec_type and not s["attached_pic"] and s["codec_name"]
+    }
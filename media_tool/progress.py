@@ -0,0 +1,142 @@
+"""
+ffmpeg の進捗（-progress 出力）の解析と表示用の整形
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass
+class ConvertProgress:
+    """変換 1 件分の進捗"""
+
+    input_path: str
+    output_path: str
+    out_time: float = 0.0            # 出力済みの再生位置（秒）
+    duration: float | None = None    # 入力の長さ（秒、不明なら None）
+    fps: float | None = None
+    speed: float | None = None       # 実時間に対する倍率（2.0 = 2 倍速）
+    done: bool = False
+
+    @property
+    def percent(self) -> float | None:
+        if self.done:
+            return 100.0
+        if not self.duration:
+            return None
+        return min(self.out_time / self.duration * 100.0, 100.0)
+
+    @property
+    def eta(self) -> float | None:
+        """残り時間の見込み（秒）"""
+        if self.done:
+            return 0.0
+        if not self.duration or not self.speed:
+            return None
+        return max(self.duration - self.out_time, 0.0) / self.speed
+
+
+# 進捗を受け取るコールバック
+ProgressCallback = Callable[[ConvertProgress], None]
+
+
+@dataclass
+class DownloadProgress:
+    """ダウンロード 1 件分の進捗（yt-dlp の progress_hooks から作る）"""
+
+    url: str
+    downloaded_bytes: int = 0
+    total_bytes: int | None = None   # 不明なら None（見積もりがあればそれ）
+    speed: float | None = None       # バイト／秒
+    eta: float | None = None         # 残り時間（秒）
+    done: bool = False
+
+    @property
+    def percent(self) -> float | None:
+        if self.done:
+            return 100.0
+        if not self.total_bytes:
+            return None
+        return min(self.downloaded_bytes / self.total_bytes * 100.0, 100.0)
+
+    @classmethod
+    def from_hook(cls, url: str, d: dict) -> DownloadProgress:
+        info = d.get("info_dict") or {}
+        return cls(
+            url=info.get("webpage_url") or url,
+            downloaded_bytes=d.get("downloaded_bytes") or 0,
+            total_bytes=d.get("total_bytes") or d.get("total_bytes_estimate"),
+            speed=d.get("speed"),
+            eta=d.get("eta"),
+            done=d.get("status") == "finished",
+        )
+
+
+# ダウンロードの進捗を受け取るコールバック
+DownloadProgressCallback = Callable[[DownloadProgress], None]
+
+
+def _to_float(value: str | None) -> float | None:
+    try:
+        return float(value.rstrip("x")) if value else None
+    except ValueError:
+        return None  # "N/A" など
+
+
+class FFmpegProgressParser:
+    """ffmpeg -progress の key=value 行を 1 行ずつ受け取り、区切りごとに進捗を返す"""
+
+    def __init__(self, input_path: str, output_path: str, duration: float | None = None) -> None:
+        self.state = ConvertProgress(input_path, output_path, duration=duration)
+        self._block: dict[str, str] = {}
+
+    def feed(self, line: str) -> ConvertProgress | None:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        self._block[key] = value
+        if key != "progress":
+            return None
+
+        # progress=continue / end で 1 ブロック終わり
+        block, self._block = self._block, {}
+        out_time_us = _to_float(block.get("out_time_us"))
+        if out_time_us is not None:
+            self.state.out_time = out_time_us / 1_000_000
+        self.state.fps = _to_float(block.get("fps"))
+        self.state.speed = _to_float(block.get("speed"))
+        self.state.done = value == "end"
+        return ConvertProgress(**vars(self.state))
+
+
+def format_duration(seconds: float | None) -> str:
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def format_bytes(size: float | None) -> str:
+    """バイト数の表示（例: "12.3MiB"）"""
+    if size is None:
+        return "-"
+    units = ("B", "KiB", "MiB", "GiB")
+    n = 0
+    while size >= 1024 and n < len(units) - 1:
+        size /= 1024
+        n += 1
+    return f"{size:.0f}{units[n]}" if n == 0 else f"{size:.1f}{units[n]}"
+
+
+def format_progress(p: ConvertProgress, name: str | None = None) -> str:
+    """1 行表示用の文字列（例: "song.wav  42.0%  00:31  38.2fps  2.10x  ETA 00:43"）"""
+    percent = f"{p.percent:5.1f}%" if p.percent is not None else "  ?  %"
+    fps = f"{p.fps:.1f}fps" if p.fps else "-fps"
+    speed = f"{p.speed:.2f}x" if p.speed else "-x"
+    return (
+        f"{name or p.input_path}  {percent}  {format_duration(p.out_time)}  "
+        f"{fps}  {speed}  ETA {format_duration(p.eta)}"
+    )
@@ -0,0 +1,155 @@
+"""
+複数 URL の並列ダウンロードスケジューラ
+
+サイトごとに有界キューとワーカースレッドを持ち、サイト単位の同時実行数上限を
+守りながら複数の URL を並行してダウンロードする。遅いサイトがあっても
+他サイトの URL は止まらずに進む。サイトは URL パターンの登録表
+（downloaders.registry）で判定し、yt-dlp のセッションは 1 回の run の間
+（sessions を渡せばその SessionPool が閉じられるまで）サイトごとに使い回す。
+ダウンロード後の変換（ffmpeg）は 1 回の run の全ワーカーで 1 つの ConvertBudget を
+共有し、同時に走る数を Config.CONVERT_JOBS までに抑える。
+"""
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Callable, Iterable
+
+from media_tool.archive import dedupe_urls
+from media_tool.config import Config
+from media_tool.converter import ConvertBudget, resolve_jobs
+from media_tool.downloaders.base import BaseDownloader, PartialDownloadError
+from media_tool.downloaders.registry import create_downloader, site_of
+from media_tool.downloaders.session import SessionPool
+
+# サイトごとの同時ダウンロード数の上限（--parallel を大きくしてもこれを超えない）
+SITE_LIMITS: dict[str, int] = {"youtube": 4, "niconico": 2, "generic": 2}
+
+# 1 URL 分の結果を受け取るコールバック (URL, 保存パス一覧, 例外 or None)
+DownloadCallback = Callable[[str, list[str], Exception | None], None]
+
+_STOP = object()  # ワーカー終了の合図
+
+
+class DownloadScheduler:
+    """サイト別の同時実行数上限つきで URL をまとめてダウンロードする"""
+
+    def __init__(
+        self,
+        config: Config,
+        *,
+        parallel: int | None = None,
+        limits: dict[str, int] | None = None,
+        queue_size: int | None = None,
+        stream: bool | None = None,
+        archive: bool | None = None,
+        items: str | None = None,
+        on_result: DownloadCallback | None = None,
+        sessions: SessionPool | None = None,
+        budget: ConvertBudget | None = None,
+    ) -> None:
+        self.config = config
+        self.parallel = max(parallel if parallel is not None else config.DOWNLOAD_PARALLEL, 1)
+        self.limits = {**SITE_LIMITS, **(limits or {})}
+        self.queue_size = queue_size
+        self.stream = stream
+        self.archive = archive
+        self.items = items
+        self.on_result = on_result
+        self.sessions = sessions
+        self.budget = budget
+        self._lock = threading.Lock()
+
+    def run(
+        self, urls: Iterable[str], output_format: str | None = None
+    ) -> tuple[list[str], list[tuple[str, Exception]]]:
+        """URL 群をダウンロードし (保存パス一覧, [(URL, 例外)]) を URL 順で返す
+
+        同じ動画を指す URL は、作業を始める前に最初の 1 つだけ残して取り除く。
+        プレイリストの一部だけ失敗した場合、成功分のパスは保存パス一覧に入り、
+        例外は PartialDownloadError（エントリごとのエラーを持つ）になる。
+        """
+        urls = dedupe_urls(urls)
+        lanes: dict[str, list[tuple[int, str]]] = {}
+        for i, url in enumerate(urls):
+            lanes.setdefault(site_of(url), []).append((i, url))
+
+        outcomes: list[tuple[list[str], Exception | None]] = [([], None)] * len(urls)
+        sessions = self.sessions or SessionPool()
+        budget = self.budget or ConvertBudget(resolve_jobs(self.config.CONVERT_JOBS))
+        threads: list[threading.Thread] = []
+        for site, items in lanes.items():
+            workers = min(self.parallel, self.limits.get(site, 1), len(items))
+            lane: queue.Queue = queue.Queue(maxsize=self.queue_size or workers * 2)
+            for n in range(workers):
+                threads.append(threading.Thread(
+                    target=self._worker,
+                    args=(site, lane, output_format, outcomes, sessions, budget),
+                    name=f"download-{site}-{n}",
+                    daemon=True,
+                ))
+            # キューが満杯でも他サイトの投入を止めないよう、投入もサイトごとに分ける
+            threads.append(threading.Thread(
+                target=self._feed, args=(lane, items, workers),
+                name=f"feed-{site}", daemon=True,
+            ))
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if sessions is not self.sessions:
+            sessions.close()
+
+        success = [path for paths, _ in outcomes for path in paths]
+        errors = [(url, err) for url, (_, err) in zip(urls, outcomes) if err is not None]
+        return success, errors
+
+    # ------------------------------------------------------------------
+    # 内部処理
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _feed(lane: queue.Queue, items: list[tuple[int, str]], workers: int) -> None:
+        for item in items:
+            lane.put(item)  # 満杯ならワーカーが空けるまで待つ
+        for _ in range(workers):
+            lane.put(_STOP)
+
+    def _worker(
+        self,
+        site: str,
+        lane: queue.Queue,
+        output_format: str | None,
+        outcomes: list[tuple[list[str], Exception | None]],
+        sessions: SessionPool,
+        budget: ConvertBudget,
+    ) -> None:
+        # ダウンローダーはワーカー内で使い回す（生成失敗時も投入側を詰まらせない）
+        downloader: BaseDownloader | None = None
+        init_error: Exception | None = None
+        try:
+            downloader = create_downloader(site, self.config, sessions=sessions, budget=budget)
+        except Exception as e:
+            init_error = e
+
+        while True:
+            item = lane.get()
+            if item is _STOP:
+                return
+            i, url = item
+            try:
+                if downloader is None:
+                    raise init_error  # type: ignore[misc]
+                res = downloader.download(
+                    url, output_format=output_format, stream=self.stream,
+                    archive=self.archive, items=self.items,
+                )
+                outcome = (res if isinstance(res, list) else [res], None)
+            except PartialDownloadError as e:
+                outcome = (e.paths, e)  # 成功したエントリの保存先は結果に含める
+            except Exception as e:
+                outcome = ([], e)
+            outcomes[i] = outcome
+            if self.on_result is not None:
+                with self._lock:
+                    self.on_result(url, *outcome)
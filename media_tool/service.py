@@ -0,0 +1,445 @@
+"""
+ジョブキューサービス
+
+変換・ダウンロードのジョブを localhost の HTTP API で受け付け、SQLite の
+キューに保存して常駐ワーカーで処理する。プロセスが落ちても実行中だった
+ジョブは次回起動時にキューへ戻して再開し、同時実行数はサービス全体で制限する
+（ダウンロードジョブの中で走る変換も含め、ffmpeg は --workers 個まで）。
+
+API（JSON）:
+  POST /jobs        {"kind": "convert", "input": "/abs/path", "format": "mp3,flac",
+                     "profile": "fast", "force": false, "segments": 4,
+                     "subdir": "album/disc1"}  # subdir: OUTPUT_DIR 下の出力先（省略可）
+                    {"kind": "download", "url": "https://...", "format": "mp3",
+                     "profile": "fast", "items": "1-3", "stream": false, "archive": true}
+  GET  /jobs        ジョブ一覧（新しい順）
+  GET  /jobs/<id>   ジョブ 1 件（state: queued / running / done / failed）
+
+ブラウザで開いたページからの送信（CORS のプリフライトが不要な text/plain の
+POST など）でジョブを投入されないよう、POST は Content-Type: application/json
+だけを受け付け（プリフライトには応答しない）、すべての要求に config.json と
+同じ場所に置いたトークン（X-Media-Tool-Token ヘッダ）を要求する。
+"""
+from __future__ import annotations
+
+import copy
+import hmac
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import urlsplit
+
+from platformdirs import user_data_dir
+
+from media_tool.cache import get_conversion_cache
+from media_tool.config import ENCODE_PROFILES, Config
+from media_tool.converter import ConvertBudget, Converter, resolve_jobs
+from media_tool.downloaders.base import PartialDownloadError
+from media_tool.downloaders.session import SessionPool
+from media_tool.progress import ConvertProgress
+from media_tool.trace import span
+
+logger = logging.getLogger(__name__)
+
+# ジョブキュー DB の保存先
+JOBS_DB = os.path.join(user_data_dir("media_tool"), "jobs.sqlite3")
+
+JOB_KINDS = ("convert", "download")
+
+# 進捗を DB に書き出す最短間隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+# API のトークンを送るヘッダと、config.json と同じディレクトリに置くトークンファイル名
+TOKEN_HEADER = "X-Media-Tool-Token"
+TOKEN_FILE = ".service_token"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id       TEXT PRIMARY KEY,
+    kind     TEXT NOT NULL,
+    payload  TEXT NOT NULL,
+    state    TEXT NOT NULL,
+    result   TEXT,
+    error    TEXT,
+    progress TEXT,
+    created  REAL NOT NULL,
+    updated  REAL NOT NULL
+)
+"""
+
+
+def load_service_token(config: Config, *, create: bool = False) -> str | None:
+    """API のトークンを読む（create=True でなければ作らず、なければ None）"""
+    path = os.path.join(os.path.dirname(config.CONFIG_PATH), TOKEN_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        if not create:
+            return None
+    token = secrets.token_urlsafe(32)
+    # 本人以外が読めないように作る
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def _check_subdir(subdir: object) -> str:
+    """OUTPUT_DIR からの相対パスに正規化する（絶対パスや .. で外に出るものは ValueError）"""
+    if not isinstance(subdir, str):
+        raise ValueError("'subdir' must be a string")
+    if os.path.isabs(subdir) or os.path.splitdrive(subdir)[0]:
+        raise ValueError(f"'subdir' must be relative to OUTPUT_DIR: {subdir}")
+    parts = subdir.replace("\\", "/").split("/")
+    if ".." in parts:
+        raise ValueError(f"'subdir' must not contain '..': {subdir}")
+    return os.path.normpath(subdir)
+
+
+class JobStore:
+    """SQLite に永続化したジョブキュー（スレッドセーフ）"""
+
+    def __init__(self, db_path: str = JOBS_DB) -> None:
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(_SCHEMA)
+
+    def submit(self, kind: str, payload: dict) -> dict:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, state, created, updated)"
+                " VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+        return self.get(job_id)  # type: ignore[return-value]
+
+    def claim_next(self) -> dict | None:
+        """最も古い待ちジョブを実行中にして返す"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE state = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = 'running', updated = ? WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+        return self.get(row["id"])
+
+    def requeue_interrupted(self) -> int:
+        """前回の実行中に中断されたジョブを待ち状態へ戻す"""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE jobs SET state = 'queued', progress = NULL, updated = ?"
+                " WHERE state = 'running'",
+                (time.time(),),
+            )
+        return cur.rowcount
+
+    def update(self, job_id: str, **fields) -> None:
+        """state / result / error / progress を更新する（dict は JSON 化）"""
+        columns = {k: json.dumps(v, ensure_ascii=False) if isinstance(v, dict) else v
+                   for k, v in fields.items()}
+        assignments = ", ".join(f"{k} = ?" for k in columns)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ?",
+                (*columns.values(), time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 100) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        for key in ("payload", "result", "progress"):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+
+class JobService:
+    """JobStore のジョブを常駐ワーカーで処理する"""
+
+    def __init__(
+        self, config: Config, *, workers: int | None = None, store: JobStore | None = None
+    ) -> None:
+        self.config = config
+        self.store = store or JobStore()
+        self.workers = resolve_jobs(self.config.CONVERT_JOBS if workers is None else workers)
+        # ffmpeg の同時実行数は、ダウンロードジョブ内の変換も含めて workers までにする
+        self.budget = ConvertBudget(self.workers)
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+        # ダウンロードジョブの yt-dlp セッションはサービスの稼働中使い回す
+        self.sessions = SessionPool()
+
+    def start(self) -> None:
+        resumed = self.store.requeue_interrupted()
+        if resumed:
+            logger.info("Resuming %d interrupted job(s)", resumed)
+        for n in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for t in self._threads:
+            t.join()
+        self.sessions.close()
+        get_conversion_cache().flush()
+
+    def submit(self, kind: str, payload: dict) -> dict:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"unknown job kind: {kind}")
+        required = "input" if kind == "convert" else "url"
+        if not payload.get(required):
+            raise ValueError(f"'{required}' is required for {kind} jobs")
+        if payload.get("profile") and payload["profile"] not in ENCODE_PROFILES:
+            raise ValueError(f"unknown encode profile: {payload['profile']}")
+        for key in ("stream", "archive"):
+            if payload.get(key) is not None and not isinstance(payload[key], bool):
+                raise ValueError(f"'{key}' must be a boolean")
+        if payload.get("subdir"):
+            payload = {**payload, "subdir": _check_subdir(payload["subdir"])}
+        job = self.store.submit(kind, payload)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job
+
+    # ------------------------------------------------------------------
+    # ワーカー
+    # ------------------------------------------------------------------
+    def _worker(self) -> None:
+        while not self._stopping.is_set():
+            job = self.store.claim_next()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+            try:
+                with span("job", job=job["id"], kind=job["kind"]):
+                    paths = self._execute(job)
+                self.store.update(job["id"], state="done", result={"paths": paths})
+                logger.info("Job %s done", job["id"], extra={"job": job["id"], "paths": paths})
+            except PartialDownloadError as e:
+                details = "; ".join(f"{url}: {err}" for url, err in e.errors)
+                self.store.update(job["id"], state="failed", result={"paths": e.paths},
+                                  error=f"{e} ({details})")
+                logger.error("Job %s failed: %s", job["id"], e, extra={"job": job["id"]})
+            except Exception as e:
+                self.store.update(job["id"], state="failed", error=str(e))
+                logger.error("Job %s failed: %s", job["id"], e, extra={"job": job["id"]})
+
+    def _execute(self, job: dict) -> list[str]:
+        payload = job["payload"]
+        if job["kind"] == "convert":
+            converter = Converter(self.config, profile=payload.get("profile"), budget=self.budget)
+            # 検証前に保存されたジョブもあるので実行時にも確かめる
+            subdir = _check_subdir(payload["subdir"]) if payload.get("subdir") else ""
+            formats = (payload.get("format") or self.config.DEFAULT_FORMAT).split(",")
+            if len(formats) > 1:
+                return converter.convert_to_formats(
+                    payload["input"], formats,
+                    threads=self.budget.threads,
+                    force=bool(payload.get("force")),
+                    progress=self._progress_writer(job["id"]),
+                    subdir=subdir,
+                )
+            output = converter.convert_to_format(
+                payload["input"], formats[0],
+                threads=self.budget.threads,
+                force=bool(payload.get("force")),
+                segments=payload.get("segments"),
+                progress=self._progress_writer(job["id"]),
+                subdir=subdir,
+            )
+            return [output]
+
+        from media_tool.downloaders.registry import create_downloader, site_of
+
+        config = copy.copy(self.config)
+        if payload.get("profile"):
+            config.ENCODE_PROFILE = payload["profile"]
+        downloader = create_downloader(
+            site_of(payload["url"]), config, sessions=self.sessions, budget=self.budget
+        )
+        res = downloader.download(
+            payload["url"], output_format=payload.get("format"), items=payload.get("items"),
+            stream=payload.get("stream"), archive=payload.get("archive"),
+        )
+        return res if isinstance(res, list) else [res]
+
+    def _progress_writer(self, job_id: str) -> Callable[[ConvertProgress], None]:
+        last = 0.0
+
+        def write(p: ConvertProgress) -> None:
+            nonlocal last
+            now = time.monotonic()
+            if p.done or now - last >= PROGRESS_INTERVAL:
+                last = now
+                self.store.update(job_id, progress=vars(p))
+        return write
+
+
+# ──────────────────────────────────────────────────────────
+# HTTP API
+# ──────────────────────────────────────────────────────────
+class _Handler(BaseHTTPRequestHandler):
+    service: JobService  # serve() がサブクラスで設定
+    token: str
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if parts == ["jobs"]:
+            self._send(200, self.service.store.list())
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self.service.store.get(parts[1])
+            self._send(200, job) if job else self._send(404, {"error": "job not found"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        if urlsplit(self.path).path.strip("/") != "jobs":
+            self._send(404, {"error": "not found"})
+            return
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._send(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("request body must be a JSON object")
+            kind = body.pop("kind", None)
+            self._send(201, self.service.submit(kind, body))
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+
+    def _authorized(self) -> bool:
+        """トークンが一致しなければ 403 を返して False"""
+        if hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), self.token):
+            return True
+        self._send(403, {"error": "invalid or missing service token"})
+        return False
+
+    def _send(self, status: int, data) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # アクセスログは出さない
+
+
+def serve(config: Config, *, host: str, port: int, workers: int | None = None) -> None:
+    """ジョブサービスを起動し、Ctrl+C まで待ち受ける"""
+    service = JobService(config, workers=workers)
+    token = load_service_token(config, create=True)
+    handler = type("Handler", (_Handler,), {"service": service, "token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    service.start()
+    logger.info("Job service listening on http://%s:%d (%d workers)", host, port, service.workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+# ──────────────────────────────────────────────────────────
+# クライアント
+# ──────────────────────────────────────────────────────────
+class ServiceClient:
+    """ジョブサービスへの投入と進捗の追跡"""
+
+    def __init__(self, base_url: str, token: str | None = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+
+    def submit(self, kind: str, **payload) -> dict:
+        return self._request("POST", "/jobs", {"kind": kind, **payload})
+
+    def get(self, job_id: str) -> dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def tail(
+        self,
+        job_ids: list[str],
+        *,
+        on_progress: Callable[[dict], None] | None = None,
+        on_finish: Callable[[dict], None] | None = None,
+        interval: float = 0.5,
+    ) -> list[dict]:
+        """ジョブがすべて終わるまでポーリングし、最終状態を投入順で返す"""
+        finished: dict[str, dict] = {}
+        while len(finished) < len(job_ids):
+            for job_id in job_ids:
+                if job_id in finished:
+                    continue
+                job = self.get(job_id)
+                if job["state"] in ("done", "failed"):
+                    finished[job_id] = job
+                    if on_finish is not None:
+                        on_finish(job)
+                elif job["progress"] and on_progress is not None:
+                    on_progress(job)
+            if len(finished) < len(job_ids):
+                time.sleep(interval)
+        return [finished[job_id] for job_id in job_ids]
+
+    def _request(self, method: str, path: str, data: dict | None = None) -> dict:
+        body = json.dumps(data).encode("utf-8") if data is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=10) as res:
+                return json.loads(res.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read() or b"{}").get("error", str(e))) from e
+        except urllib.error.URLError as e:
+            raise ConnectionError(
+                f"ジョブサービスに接続できません: {self.base_url} ({e.reason})"
+            ) from e
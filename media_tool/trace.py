@@ -0,0 +1,232 @@
+"""
+処理時間のトレースとプロファイル
+
+ジョブごとのフェーズ（resolve / download / convert / ffmpeg / cleanup / move など）の
+開始・終了時刻を記録し、JSONL か Chrome のトレースイベント形式（chrome://tracing・
+Perfetto で表示できる）で書き出す。start_tracing() を呼ぶまでは span() は
+何もしない。
+
+start_profiling() を呼ぶと cProfile（ワーカースレッドを含む）で Python 側を、
+ffmpeg の -benchmark で各 ffmpeg プロセスの CPU 時間・メモリを記録する。
+"""
+from __future__ import annotations
+
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Iterator
+
+
+class Tracer:
+    """スパン（名前・ジョブ・開始・終了・スレッド・属性）を集める（スレッドセーフ）"""
+
+    def __init__(self) -> None:
+        self.spans: list[dict] = []
+        self._lock = threading.Lock()
+        # 経過時間は perf_counter、書き出す時刻は開始時の time.time() からの相対で求める
+        self._epoch = time.time()
+        self._origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, *, job: str | None = None, cat: str = "phase", **attrs
+    ) -> Iterator[dict]:
+        """with の間を 1 スパンとして記録する（yield した dict に属性を足せる）"""
+        start = time.perf_counter()
+        args = dict(attrs)
+        error: str | None = None
+        try:
+            yield args
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if error is not None:
+                args["error"] = error
+            self.add(name, start, time.perf_counter(), job=job, cat=cat, **args)
+
+    def add(self, name: str, start: float, end: float, *, job: str | None = None,
+            cat: str = "phase", **attrs) -> None:
+        """perf_counter の開始・終了時刻でスパンを追加する"""
+        thread = threading.current_thread()
+        span = {
+            "name": name,
+            "cat": cat,
+            "job": job,
+            "start": self._epoch + (start - self._origin),
+            "duration_ms": round((end - start) * 1000, 3),
+            "thread": thread.name,
+            "tid": thread.ident,
+            "args": attrs,
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def write(self, path: str) -> None:
+        """拡張子が .jsonl なら JSONL、それ以外は Chrome のトレースイベント形式で書き出す"""
+        if path.endswith(".jsonl"):
+            self.write_jsonl(path)
+        else:
+            self.write_chrome_trace(path)
+
+    def write_jsonl(self, path: str) -> None:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        with open(path, "w", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+
+    def write_chrome_trace(self, path: str) -> None:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        pid = os.getpid()
+        events: list[dict] = []
+        threads: dict[int, str] = {}
+        for span in spans:
+            threads.setdefault(span["tid"], span["thread"])
+            events.append({
+                "name": span["name"],
+                "cat": span["cat"],
+                "ph": "X",
+                "ts": round((span["start"] - self._epoch) * 1_000_000),
+                "dur": round(span["duration_ms"] * 1000),
+                "pid": pid,
+                "tid": span["tid"],
+                "args": {"job": span["job"], **span["args"]},
+            })
+        for tid, name in threads.items():
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name},
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False,
+                      default=str)
+
+
+_tracer: Tracer | None = None
+
+
+def start_tracing() -> Tracer:
+    """以降の span() を記録する Tracer を有効にして返す"""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def span(name: str, *, job: str | None = None, cat: str = "phase", **attrs):
+    """トレース中ならスパンを記録する with ブロック（無効時は何もしない）"""
+    if _tracer is None:
+        return contextlib.nullcontext({})
+    return _tracer.span(name, job=job, cat=cat, **attrs)
+
+
+class YtDlpPhaseHook:
+    """yt-dlp の postprocessor_hooks からポストプロセッサ（移動・結合など）の時間を記録する
+
+    MoveFiles（一時ファイルから保存先への移動）は "move"、それ以外は
+    "postprocess" スパンとして記録する。
+    """
+
+    def __init__(self) -> None:
+        self._started: dict[tuple[int, str, str | None], float] = {}
+
+    def __call__(self, d: dict) -> None:
+        if _tracer is None:
+            return
+        name = d.get("postprocessor") or "?"
+        info = d.get("info_dict") or {}
+        key = (threading.get_ident(), name, info.get("id"))
+        if d.get("status") == "started":
+            self._started[key] = time.perf_counter()
+        elif d.get("status") == "finished" and key in self._started:
+            start, end = self._started.pop(key), time.perf_counter()
+            job = info.get("webpage_url") or info.get("original_url")
+            if name == "MoveFiles":
+                _tracer.add("move", start, end, job=job, path=info.get("filepath"))
+            else:
+                _tracer.add("postprocess", start, end, job=job, postprocessor=name)
+
+
+# ----------------------------------------------------------------------
+# プロファイル
+# ----------------------------------------------------------------------
+class Profiler:
+    """cProfile で全スレッドを計測し、ffmpeg の -benchmark 出力の保存先を提供する
+
+    Python 3.11 までは cProfile がスレッドごとなので、threading.setprofile で
+    新しいスレッドにもプロファイラを仕掛ける（3.12 以降は 1 つで全スレッドを計測）。
+    """
+
+    def __init__(self, directory: str) -> None:
+        import cProfile
+
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._profile_cls = cProfile.Profile
+        self._main = cProfile.Profile()
+        self._threads: list = []
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def start(self) -> None:
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._start_thread)
+        self._main.enable()
+
+    def _start_thread(self, frame, event, arg) -> None:
+        # 新しいスレッドの最初のイベントでそのスレッド用のプロファイラに切り替える
+        profile = self._profile_cls()
+        with self._lock:
+            self._threads.append(profile)
+        profile.enable()
+
+    def stop(self) -> list[str]:
+        """計測を止めて統計を書き出し、書き出したファイルのパスを返す"""
+        import pstats
+
+        self._main.disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(self._main)
+        with self._lock:
+            for profile in self._threads:
+                profile.disable()
+                try:
+                    stats.add(profile)
+                except TypeError:
+                    continue  # 何も計測しないまま終わったスレッド
+
+        prof_path = os.path.join(self.directory, "media_tool.prof")
+        text_path = os.path.join(self.directory, "media_tool-stats.txt")
+        stats.dump_stats(prof_path)
+        with open(text_path, "w", encoding="utf-8") as f:
+            stats.stream = f
+            stats.sort_stats("cumulative").print_stats(60)
+        return [prof_path, text_path]
+
+    def ffmpeg_log(self, output_path: str) -> str:
+        """ffmpeg 1 回分の -benchmark 出力（stderr）の保存先"""
+        name = os.path.basename(output_path) or "ffmpeg"
+        return os.path.join(self.directory, f"ffmpeg-{next(self._seq):04d}-{name}.log")
+
+
+_profiler: Profiler | None = None
+
+
+def start_profiling(directory: str) -> Profiler:
+    """cProfile を開始し、以降の ffmpeg を -benchmark 付きで実行する"""
+    global _profiler
+    _profiler = Profiler(directory)
+    _profiler.start()
+    return _profiler
+
+
+def get_profiler() -> Profiler | None:
+    return _profiler
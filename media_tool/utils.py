@@ -1,43 +1,179 @@
-import subprocess
+import json
 import os
+import shutil
+import threading
+from typing import Collection, Iterator
+
+from platformdirs import user_cache_dir
+
+# キャッシュ類の保存先
+CACHE_DIR = user_cache_dir("media_tool")
+
+# ffmpeg の検出結果を保存するキャッシュファイル
+CAPABILITIES_CACHE = os.path.join(CACHE_DIR, "ffmpeg_capabilities.json")
+
+# 利用可否を調べておくエンコーダー
+PROBED_ENCODERS = ("libx264", "libvpx-vp9", "libopus", "aac", "libmp3lame", "libvorbis", "flac")
+
+# ffmpeg から拡張子一覧が取れなかった場合の既定値
+FALLBACK_FORMATS = {
+    "mp3", "wav", "ogg", "flac", "aac",
+    "mp4", "avi", "mkv", "mov", "wmv",
+    "webm", "m4a", "mpg", "mpeg", "flv"
+}
+
+_capabilities: dict | None = None
+_capabilities_lock = threading.Lock()
+
+
+def _run_ffmpeg(ffmpeg: str, *args: str) -> str:
+    # ffmpeg を起動するのはキャッシュが使えないときだけなので、起動時には読み込まない
+    import subprocess
+
+    startupinfo = None
+    if os.name == 'nt':
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    result = subprocess.run(
+        [ffmpeg, "-hide_banner", *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        check=True,
+        startupinfo=startupinfo,
+    )
+    return result.stdout
+
+
+def _parse_formats(output: str) -> list[str]:
+    supported = set()
+    for line in output.splitlines():
+        if line.startswith(" D "):
+            parts = line.split()
+            exts = [e for e in parts if e.startswith(".")]
+            for e in exts:
+                supported.add(e[1:].lower())
+    return sorted(supported)
+
+
+def _parse_encoders(output: str) -> list[str]:
+    available = set()
+    for line in output.splitlines():
+        parts = line.split()
+        # 例: " V....D libx264   libx264 H.264 / AVC ..."
+        if len(parts) >= 2 and parts[1] in PROBED_ENCODERS:
+            available.add(parts[1])
+    return sorted(available)
+
+
+def _load_cached_capabilities(key: dict) -> dict | None:
+    try:
+        with open(CAPABILITIES_CACHE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if any(cached.get(k) != v for k, v in key.items()):
+        return None
+    return cached
+
+
+def write_json_atomic(path: str, data) -> None:
+    """JSON を一時ファイル経由で書き込み、途中状態のファイルを残さない"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def iter_media_files(
+    directory: str, *, recursive: bool = False, exclude: Collection[str] = ()
+) -> Iterator[str]:
+    """ディレクトリ内のファイルを走査しながら順に返す（隠しファイルは除く）
+
+    exclude に含まれる絶対パスのディレクトリには入らない。
+    """
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and os.path.abspath(entry.path) not in exclude:
+                        yield from iter_media_files(entry.path, recursive=True, exclude=exclude)
+                elif entry.is_file():
+                    yield entry.path
+            except OSError:
+                continue
+
+
+def _save_cached_capabilities(caps: dict) -> None:
+    try:
+        write_json_atomic(CAPABILITIES_CACHE, caps)
+    except OSError:
+        pass  # キャッシュが書けなくても動作には影響しない
+
+
+def get_ffmpeg_capabilities(*, refresh: bool = False) -> dict:
+    """ffmpeg の対応拡張子・エンコーダーを返す
+
+    結果はディスクにキャッシュし、ffmpeg バイナリのパス・mtime・サイズが
+    変わらない限り再利用する（ffmpeg プロセスを起動しない）。
+    バージョン文字列もキャッシュに記録する。
+    """
+    global _capabilities
+    with _capabilities_lock:
+        if _capabilities is not None and not refresh:
+            return _capabilities
+
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise EnvironmentError("ffmpeg が見つかりません")
+        ffmpeg = os.path.realpath(ffmpeg)
+        st = os.stat(ffmpeg)
+        key = {"path": ffmpeg, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+        caps = None if refresh else _load_cached_capabilities(key)
+        if caps is None:
+            try:
+                version = (_run_ffmpeg(ffmpeg, "-version").splitlines() or [""])[0].strip()
+                formats = _parse_formats(_run_ffmpeg(ffmpeg, "-formats"))
+                encoders = _parse_encoders(_run_ffmpeg(ffmpeg, "-encoders"))
+            except Exception as e:
+                raise EnvironmentError("ffmpeg が見つかりません") from e
+            caps = {**key, "version": version, "formats": formats, "encoders": encoders}
+            _save_cached_capabilities(caps)
+
+        _capabilities = caps
+        return caps
+
 
 def check_ffmpeg_installed():
+    get_ffmpeg_capabilities()
+
+
+def has_ffmpeg_encoder(name: str) -> bool:
+    """ffmpeg が指定エンコーダーを持つか（PROBED_ENCODERS に含まれるもののみ判定可能）"""
     try:
-        startupinfo = None
-        if os.name == 'nt':
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        subprocess.run(["ffmpeg", "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, startupinfo=startupinfo)
-    except Exception as e:
-        raise EnvironmentError("ffmpeg が見つかりません") from e
+        return name in get_ffmpeg_capabilities()["encoders"]
+    except EnvironmentError:
+        return False
+
 
 def get_ffmpeg_supported_formats():
     """ffmpeg がサポートする拡張子一覧を取得"""
     try:
-        check_ffmpeg_installed()
-        result = subprocess.run(
-            ["ffmpeg", "-hide_banner", "-formats"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            check=True
-        )
-        lines = result.stdout.splitlines()
-
-        supported = set()
-        for line in lines:
-            if line.startswith(" D "):
-                parts = line.split()
-                exts = [e for e in parts if e.startswith(".")]
-                for e in exts:
-                    ext = e[1:].lower()
-                    supported.add(ext)
+        supported = set(get_ffmpeg_capabilities()["formats"])
         if not supported:
             raise ValueError("No formats found from ffmpeg.")
     except Exception as e:
-        return {
-            "mp3", "wav", "ogg", "flac", "aac",
-            "mp4", "avi", "mkv", "mov", "wmv",
-            "webm", "m4a", "mpg", "mpeg", "flv"
-        }
+        return set(FALLBACK_FORMATS)
     return supported
@@ -0,0 +1,314 @@
+"""
+ホットフォルダ（監視フォルダ）
+
+指定ディレクトリに新しく書き込まれたメディアファイルを検知し、書き込みが
+終わった（サイズと mtime が一定時間変わらない）時点で変換に回す。
+Linux では inotify（ctypes 経由）でイベント駆動に、それ以外や inotify が
+使えない場合は定期的な走査（ポーリング）で検知する。
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Sequence
+
+from media_tool.cache import get_conversion_cache
+from media_tool.converter import Converter, ResultCallback, resolve_jobs, threads_per_job
+from media_tool.utils import get_ffmpeg_supported_formats, iter_media_files
+
+logger = logging.getLogger(__name__)
+
+# 書き込み完了とみなすまでにサイズ・mtime が変わらないでいる秒数
+SETTLE_SECONDS = 2.0
+# ポーリング時の走査間隔（秒）
+POLL_INTERVAL = 2.0
+# yt-dlp が結合・後処理中に書く一時ファイル（*.temp.<拡張子>）の目印
+# （.part / .ytdl はメディアの拡張子ではないので拡張子の確認で除かれる）
+TEMP_MARKER = ".temp."
+
+# inotify のイベントマスク（<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class _PollingSource:
+    """一定間隔の走査で、前回から追加・変更されたファイルを返す"""
+
+    def __init__(self, directories: Sequence[str], *, recursive: bool, interval: float) -> None:
+        self.directories = list(directories)
+        self.recursive = recursive
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            for path in iter_media_files(directory, recursive=self.recursive):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def poll(self, stop: threading.Event) -> list[str]:
+        if stop.wait(self.interval):
+            return []
+        snapshot = self._scan()
+        changed = [p for p, state in snapshot.items() if self._snapshot.get(p) != state]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class _InotifySource:
+    """inotify のイベントから、書き込み・移動されたファイルを返す（Linux のみ）"""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MODIFY | IN_CREATE
+
+    def __init__(self, directories: Sequence[str], *, recursive: bool, interval: float) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.recursive = recursive
+        self.interval = interval
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, str] = {}  # watch descriptor → ディレクトリ
+        self.directories = list(directories)
+        for directory in self.directories:
+            self._add_tree(directory)
+
+    def _add_tree(self, directory: str) -> None:
+        self._add(directory)
+        if self.recursive:
+            for root, dirs, _ in os.walk(directory):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                for d in dirs:
+                    self._add(os.path.join(root, d))
+
+    def _add(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+        self._dirs[wd] = directory
+
+    def poll(self, stop: threading.Event) -> list[str]:
+        # stop を確認できるよう一定時間で select から戻る
+        ready, _, _ = select.select([self._fd], [], [], self.interval)
+        if not ready or stop.is_set():
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed: list[str] = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # イベントが溢れたので走査で取りこぼしを拾う
+                for directory in self.directories:
+                    changed.extend(iter_media_files(directory, recursive=self.recursive))
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name or name.startswith("."):
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+                    changed.extend(iter_media_files(path, recursive=True))
+                continue
+            changed.append(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class HotFolder:
+    """監視フォルダの新しいファイルを、書き込み完了後に変換する"""
+
+    def __init__(
+        self,
+        converter: Converter,
+        directories: Sequence[str],
+        output_formats: Sequence[str],
+        *,
+        jobs: int | None = None,
+        recursive: bool = False,
+        settle: float | None = None,
+        interval: float | None = None,
+        polling: bool = False,
+        scan_existing: bool = False,
+        on_result: ResultCallback | None = None,
+    ) -> None:
+        self.converter = converter
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.output_formats = list(output_formats)
+        self.jobs = resolve_jobs(converter.config.CONVERT_JOBS if jobs is None else jobs)
+        self.recursive = recursive
+        self.settle = SETTLE_SECONDS if settle is None else settle
+        self.interval = POLL_INTERVAL if interval is None else interval
+        self.polling = polling or not sys.platform.startswith("linux")
+        self.scan_existing = scan_existing
+        self.on_result = on_result
+
+        self._extensions = {f.lower() for f in get_ffmpeg_supported_formats()}
+        self._output_dir = os.path.abspath(converter.config.OUTPUT_DIR)
+        # 書き込み完了待ち: パス → (サイズ, mtime, その状態になった時刻)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        # 変換に回したファイル: パス → 投入時の (サイズ, mtime)
+        self._submitted: dict[str, tuple[int, int]] = {}
+        self._inflight: set[str] = set()
+        self._lock = threading.Lock()
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        """stop がセットされるまで（または Ctrl+C まで）監視を続ける"""
+        stop = stop or threading.Event()
+        source = self._open_source()
+        mode = "polling" if isinstance(source, _PollingSource) else "inotify"
+        logger.info("Watching %s (%s)", ", ".join(self.directories), mode)
+
+        threads = threads_per_job(self.jobs)
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="watch") as pool:
+            if self.scan_existing:
+                for directory in self.directories:
+                    self._track(iter_media_files(directory, recursive=self.recursive))
+            try:
+                while not stop.is_set():
+                    self._track(source.poll(stop))
+                    for path, state in self._settled():
+                        with self._lock:
+                            self._submitted[path] = state
+                            self._inflight.add(path)
+                        future = pool.submit(self._convert, path, threads)
+                        future.add_done_callback(lambda f, p=path: self._done(p, f))
+            except KeyboardInterrupt:
+                pass
+            finally:
+                source.close()
+
+    # ------------------------------------------------------------------
+    # 内部処理
+    # ------------------------------------------------------------------
+    def _open_source(self) -> _PollingSource | _InotifySource:
+        # inotify は書き込み完了の判定中も定期的に起きる必要があるので、間隔は短めにする
+        if not self.polling:
+            try:
+                return _InotifySource(
+                    self.directories, recursive=self.recursive, interval=min(self.settle, 0.5)
+                )
+            except (OSError, AttributeError) as e:
+                logger.warning("inotify unavailable (%s); falling back to polling", e)
+        return _PollingSource(self.directories, recursive=self.recursive, interval=self.interval)
+
+    def _wanted(self, path: str) -> bool:
+        name = os.path.basename(path).lower()
+        ext = os.path.splitext(name)[1].lstrip(".")
+        if not ext or ext not in self._extensions:
+            return False
+        if TEMP_MARKER in name:
+            return False
+        # 出力先を監視していても自分の出力は拾わない（出力形式と同じ拡張子の入力は変換する）
+        return not os.path.abspath(path).startswith(self._output_dir + os.sep)
+
+    def _track(self, paths) -> None:
+        now = time.monotonic()
+        for path in dict.fromkeys(paths):  # 同じファイルへの連続したイベントはまとめる
+            if not self._wanted(path):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state = (st.st_size, st.st_mtime_ns)
+            with self._lock:
+                if self._submitted.get(path) == state:
+                    continue
+            prev = self._pending.get(path)
+            if prev is None or prev[:2] != state:
+                self._pending[path] = (*state, now)
+
+    def _settled(self) -> list[tuple[str, tuple[int, int]]]:
+        """サイズ・mtime が settle 秒以上変わっていないファイルを待ちから取り出す"""
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime_ns, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]  # 書き込み途中で消えた・移動された
+                continue
+            state = (st.st_size, st.st_mtime_ns)
+            if state != (size, mtime_ns):
+                self._pending[path] = (*state, now)
+            elif now - since >= self.settle and size > 0:
+                with self._lock:
+                    if path in self._inflight:
+                        continue  # 変換中に書き換えられた。終わってから改めて投入する
+                    del self._pending[path]
+                    if self._submitted.get(path) != state:
+                        ready.append((path, state))
+        return ready
+
+    def _convert(self, path: str, threads: int | None) -> list[str]:
+        subdir = self._subdir(path)
+        if len(self.output_formats) == 1:
+            return [self.converter.convert_to_format(
+                path, self.output_formats[0], threads=threads, subdir=subdir
+            )]
+        return self.converter.convert_to_formats(
+            path, self.output_formats, threads=threads, subdir=subdir
+        )
+
+    def _subdir(self, path: str) -> str:
+        """サブディレクトリ内のファイルは、出力先でも同じ階層に置く（convert と同じ配置）"""
+        if not self.recursive:
+            return ""
+        parent = os.path.dirname(os.path.abspath(path))
+        for directory in self.directories:
+            if parent == directory or parent.startswith(directory + os.sep):
+                rel = os.path.relpath(parent, directory)
+                return os.path.normpath(os.path.join(os.path.basename(directory), rel))
+        return ""
+
+    def _done(self, path: str, future: Future) -> None:
+        try:
+            outputs, error = future.result(), None
+        except Exception as e:
+            outputs, error = [], e
+        with self._lock:
+            self._inflight.discard(path)
+            if error is not None:
+                self._submitted.pop(path, None)  # 失敗したものは書き直されたら再挑戦する
+            idle = not self._inflight
+        if idle and self.converter.config.CONVERT_CACHE:
+            # 変換結果キャッシュは処理中のファイルがなくなった時点でまとめて書き出す
+            get_conversion_cache().flush()
+        if self.on_result is not None:
+            if error is not None:
+                self.on_result(path, None, error)
+            for out in outputs:
+                self.on_result(path, out, None)
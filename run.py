@@ -7,16 +7,24 @@ Pixi が自動で依存を解決し、GUI もしくは CLI が起動します。
 
 オプション:
   --cli       CLI モードで起動
+
+依存パッケージと ffmpeg が現在の Python から使えるとき（pip install 済みなど）は
+Pixi を経由せずにそのまま起動する。
 """
 
 from __future__ import annotations
 import os
 import sys
 import shutil
+from importlib.util import find_spec
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent
 
+# モードごとに必要なモジュール（import せずに存在だけ確認する）
+REQUIRED_MODULES = ("yt_dlp", "platformdirs")
+GUI_MODULES = ("tkinter",)
+
 
 # ──────────────────────────────────────────────────────────
 # 判定・チェック系
@@ -26,6 +34,14 @@ def inside_pixi() -> bool:
     return "PIXI_PROJECT_ROOT" in os.environ
 
 
+def ready_without_pixi(cli: bool) -> bool:
+    """Pixi で再実行しなくても、この Python で依存と ffmpeg が揃っているか"""
+    modules = REQUIRED_MODULES if cli else REQUIRED_MODULES + GUI_MODULES
+    if any(find_spec(name) is None for name in modules):
+        return False
+    return shutil.which("ffmpeg") is not None
+
+
 def ensure_pixi():
     """Pixi がインストールされているか確認"""
     if shutil.which("pixi"):
@@ -71,8 +87,8 @@ def main():
         args.remove("--_internal")
         internal = True
 
-    # Pixi 外なら Pixi で再実行
-    if not inside_pixi() and not internal:
+    # Pixi 外で依存が揃っていなければ Pixi で再実行（揃っていればそのまま起動）
+    if not inside_pixi() and not internal and not ready_without_pixi("--cli" in args):
         ensure_pixi()
         reinvoke_via_pixi(args)
 
@@ -0,0 +1,42 @@
+import pytest
+
+from media_tool.archive import archive_key, dedupe_urls, url_key
+
+
+@pytest.mark.parametrize("url, key", [
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", ("youtube", "dQw4w9WgXcQ")),
+    ("https://youtu.be/dQw4w9WgXcQ", ("youtube", "dQw4w9WgXcQ")),
+    ("https://www.nicovideo.jp/watch/sm9", ("niconico", "sm9")),
+    ("https://example.com/video.mp4", None),
+])
+def test_url_key(url, key):
+    assert url_key(url) == key
+
+
+def test_archive_key_matches_url_key():
+    info = {"extractor_key": "Youtube", "id": "dQw4w9WgXcQ", "title": "x"}
+    assert archive_key(info) == url_key("https://youtu.be/dQw4w9WgXcQ")
+
+
+def test_archive_key_accepts_flat_entries():
+    assert archive_key({"ie_key": "Youtube", "id": "abc"}) == ("youtube", "abc")
+
+
+@pytest.mark.parametrize("info", [{"id": "abc"}, {"extractor_key": "Youtube"}, {}])
+def test_archive_key_needs_extractor_and_id(info):
+    assert archive_key(info) is None
+
+
+def test_dedupe_urls_keeps_first_of_each_video():
+    urls = [
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://example.com/a.mp4",
+        "https://youtu.be/dQw4w9WgXcQ",
+        " https://example.com/a.mp4 ",
+        "https://www.nicovideo.jp/watch/sm9",
+    ]
+    assert dedupe_urls(urls) == [
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://example.com/a.mp4",
+        "https://www.nicovideo.jp/watch/sm9",
+    ]
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from media_tool.cache import ConversionCache, fingerprint
+
+ARGS = ["-c:a", "libmp3lame", "-b:a", "192k"]
+
+
+@pytest.fixture
+def files(tmp_path):
+    src = tmp_path / "in.wav"
+    src.write_bytes(b"\0" * 4096)
+    out = tmp_path / "out.mp3"
+    out.write_bytes(b"\1" * 1024)
+    return str(src), str(out)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ConversionCache(str(tmp_path / "conversions.json"))
+
+
+def test_lookup_hits_after_record(cache, files):
+    src, out = files
+    assert not cache.lookup(src, out, "mp3", ARGS)
+    cache.record(src, out, "mp3", ARGS)
+    assert cache.lookup(src, out, "mp3", ARGS)
+
+
+@pytest.mark.parametrize("fmt, args", [
+    ("ogg", ARGS),
+    ("mp3", ["-c:a", "libmp3lame", "-b:a", "320k"]),
+])
+def test_lookup_misses_on_different_format_or_args(cache, files, fmt, args):
+    src, out = files
+    cache.record(src, out, "mp3", ARGS)
+    assert not cache.lookup(src, out, fmt, args)
+
+
+def test_lookup_misses_on_other_input(cache, files, tmp_path):
+    src, out = files
+    other = tmp_path / "other.wav"
+    other.write_bytes(b"\0" * 4096)
+    cache.record(src, out, "mp3", ARGS)
+    assert not cache.lookup(str(other), out, "mp3", ARGS)
+
+
+def test_lookup_misses_when_input_changes(cache, files):
+    src, out = files
+    cache.record(src, out, "mp3", ARGS)
+    with open(src, "ab") as f:
+        f.write(b"\0")
+    assert not cache.lookup(src, out, "mp3", ARGS)
+
+
+def test_lookup_misses_when_output_is_rewritten_or_removed(cache, files):
+    src, out = files
+    cache.record(src, out, "mp3", ARGS)
+    with open(out, "ab") as f:
+        f.write(b"\1")
+    assert not cache.lookup(src, out, "mp3", ARGS)
+    os.remove(out)
+    assert not cache.lookup(src, out, "mp3", ARGS)
+
+
+def test_record_skips_empty_output(cache, files):
+    src, out = files
+    open(out, "wb").close()
+    cache.record(src, out, "mp3", ARGS)
+    assert not cache.lookup(src, out, "mp3", ARGS)
+
+
+def test_fast_hash_detects_same_size_and_mtime(cache, files):
+    src, out = files
+    cache.record(src, out, "mp3", ARGS, fast_hash=True)
+    st = os.stat(src)
+    with open(src, "r+b") as f:
+        f.write(b"\2")
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert fingerprint(src)["size"] == st.st_size
+    assert not cache.lookup(src, out, "mp3", ARGS)
+
+
+def test_record_is_written_on_flush(cache, files):
+    src, out = files
+    cache.record(src, out, "mp3", ARGS)
+    assert not os.path.exists(cache.index_path)
+    cache.flush()
+    with open(cache.index_path, encoding="utf-8") as f:
+        assert list(json.load(f)) == [os.path.abspath(out)]
+    assert ConversionCache(cache.index_path).lookup(src, out, "mp3", ARGS)
+
+
+def test_evict_drops_entries_whose_output_is_gone(cache, files):
+    src, out = files
+    cache.record(src, out, "mp3", ARGS)
+    os.remove(out)
+    assert cache.evict() == 1
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from media_tool import converter
+from media_tool.converter import (
+    ConvertBudget, Converter, JobCancelled, resolve_jobs, threads_per_job,
+)
+
+
+def test_resolve_jobs(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    assert resolve_jobs(0) == 8
+    assert resolve_jobs(-1) == 8
+    assert resolve_jobs(3) == 3
+    assert resolve_jobs(0, total=2) == 2
+    assert resolve_jobs(4, total=0) == 1
+
+
+def test_threads_per_job(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    assert threads_per_job(1) is None
+    assert threads_per_job(2) == 4
+    assert threads_per_job(3) == 2
+    assert threads_per_job(16) == 1
+
+
+def test_convert_budget_limits_concurrent_slots():
+    budget = ConvertBudget(2)
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+    entered = threading.Barrier(2)
+
+    def work():
+        nonlocal running, peak
+        with budget.slot():
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            try:
+                entered.wait(timeout=0.2)
+            except threading.BrokenBarrierError:
+                pass
+            with lock:
+                running -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak == 2
+
+
+def test_convert_budget_slot_can_be_cancelled():
+    budget = ConvertBudget(1)
+    cancel = threading.Event()
+    cancel.set()
+    with budget.slot():
+        with pytest.raises(JobCancelled):
+            with budget.slot(cancel=cancel, label="x"):
+                pass
+
+
+def test_convert_budget_try_acquire_shares_slots():
+    budget = ConvertBudget(1)
+
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(JobCancelled):
+        with budget.slot(cancel=cancel):
+            pass
+    budget.release()
+    with budget.slot():
+        assert not budget.try_acquire()
+
+
+def test_missing_encoder_fails_before_running_ffmpeg(monkeypatch):
+    monkeypatch.setattr(converter, "has_ffmpeg_encoder", lambda name: name != "libx264")
+
+    assert Converter._encoder("libopus") == "libopus"
+    with pytest.raises(ValueError, match="libx264"):
+        Converter._encoder("libx264")
@@ -0,0 +1,126 @@
+import threading
+from collections import namedtuple
+
+import pytest
+
+import media_tool.diskspace as diskspace
+from media_tool.config import Config
+from media_tool.converter import JobCancelled
+from media_tool.diskspace import (
+    DiskSpaceGate, InsufficientDiskSpace, bitrate_bytes, disk_wait_timeout, download_size,
+)
+
+_Usage = namedtuple("_Usage", "total used free")
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def disk(monkeypatch):
+    """tmp_path のディスクを全容量 1000 MiB・空き 100 MiB に見せる"""
+    usage = {"total": 1000 * MB, "free": 100 * MB}
+    monkeypatch.setattr(
+        diskspace.shutil, "disk_usage",
+        lambda path: _Usage(usage["total"], usage["total"] - usage["free"], usage["free"]),
+    )
+    return usage
+
+
+def test_try_reserve_counts_reservations(disk, tmp_path):
+    gate = DiskSpaceGate(margin=10 * MB)
+    first = gate.try_reserve({str(tmp_path): 50 * MB})
+    assert first is not None
+    # 空き 100 - 確保 50 - 余白 10 = 40 MiB しか残っていない
+    assert gate.try_reserve({str(tmp_path): 45 * MB}) is None
+    second = gate.try_reserve({str(tmp_path): 40 * MB})
+    assert second is not None
+    first.release()
+    second.release()
+    assert gate._reserved == {}
+
+
+def test_try_reserve_sums_directories_on_the_same_disk(disk, tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+    gate = DiskSpaceGate(margin=0)
+    assert gate.try_reserve({str(a): 60 * MB, str(b): 60 * MB}) is None
+    assert gate.try_reserve({str(a): 50 * MB, str(b): 50 * MB}) is not None
+
+
+def test_try_reserve_treats_unknown_sizes_as_zero(disk, tmp_path):
+    gate = DiskSpaceGate(margin=100 * MB)
+    assert gate.try_reserve({str(tmp_path): None}) is not None
+    disk["free"] = 99 * MB
+    assert gate.try_reserve({str(tmp_path): None}) is None
+
+
+def test_try_reserve_waits_when_nothing_else_is_reserved(disk, tmp_path):
+    # ほかのプロセスが空ける可能性があるので、全容量に収まる限り投げずに待つ
+    gate = DiskSpaceGate(margin=256 * MB)
+    assert gate.try_reserve({str(tmp_path): 10 * MB}) is None
+
+
+def test_try_reserve_raises_beyond_disk_capacity(disk, tmp_path):
+    gate = DiskSpaceGate(margin=10 * MB)
+    with pytest.raises(InsufficientDiskSpace) as e:
+        gate.try_reserve({str(tmp_path): 995 * MB})
+    assert e.value.needed == 1005 * MB
+    assert e.value.total == 1000 * MB
+
+
+def test_margin_can_be_given_per_call(disk, tmp_path):
+    gate = DiskSpaceGate(margin=256 * MB)
+    assert gate.try_reserve({str(tmp_path): 90 * MB}, margin=0) is not None
+
+
+def test_reserve_waits_for_release(disk, tmp_path):
+    gate = DiskSpaceGate(margin=0)
+    held = gate.reserve({str(tmp_path): 80 * MB})
+    threading.Timer(0.1, held.release).start()
+    with gate.reserve({str(tmp_path): 80 * MB}):
+        assert gate._reserved
+    assert gate._reserved == {}
+
+
+def test_reserve_stops_waiting_on_cancel(disk, tmp_path, monkeypatch):
+    monkeypatch.setattr(diskspace, "WAIT_INTERVAL", 0.05)
+    gate = DiskSpaceGate(margin=0)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(JobCancelled):
+        gate.reserve({str(tmp_path): 200 * MB}, cancel=cancel)
+
+
+def test_reserve_gives_up_after_timeout(disk, tmp_path, monkeypatch):
+    monkeypatch.setattr(diskspace, "WAIT_INTERVAL", 0.05)
+    gate = DiskSpaceGate(margin=10 * MB)
+    with pytest.raises(InsufficientDiskSpace) as e:
+        gate.reserve({str(tmp_path): 200 * MB}, timeout=0.1)
+    assert e.value.path == str(tmp_path)
+    assert e.value.needed == 210 * MB
+    assert e.value.waited == 0.1
+    assert gate._reserved == {}
+
+
+def test_disk_wait_timeout():
+    config = Config()
+    assert disk_wait_timeout(config) == 3600
+    config.DISK_WAIT_TIMEOUT = 0
+    assert disk_wait_timeout(config) is None
+
+
+def test_bitrate_bytes():
+    assert bitrate_bytes("192k", 10) == 240000
+    assert bitrate_bytes("1.5M", 8) == 1500000
+    assert bitrate_bytes(8000, 2) == 2000
+    assert bitrate_bytes(None, 10) is None
+    assert bitrate_bytes("192k", None) is None
+
+
+def test_download_size():
+    assert download_size({"filesize": 100}) == 100
+    assert download_size({"requested_formats": [
+        {"filesize": 100}, {"filesize_approx": 50},
+    ]}) == 150
+    assert download_size({"tbr": 8, "duration": 10}) == 10000
+    assert download_size({"requested_formats": [{"filesize": 100}, {}]}) is None
@@ -0,0 +1,25 @@
+from media_tool.downloaders.formats import AUDIO_FALLBACK_MAX_HEIGHT, source_format
+
+
+def test_audio_formats_prefer_copyable_audio_only_streams():
+    assert source_format("m4a") == (
+        "bestaudio[acodec~='^(?:aac|alac|mp4a)']/bestaudio"
+        f"/best[height<={AUDIO_FALLBACK_MAX_HEIGHT}]/best"
+    )
+    assert source_format("MP3").startswith("bestaudio[acodec~='^(?:mp3)']/")
+
+
+def test_audio_formats_without_copyable_codec_take_any_audio():
+    assert source_format("wav") == f"bestaudio/best[height<={AUDIO_FALLBACK_MAX_HEIGHT}]/best"
+
+
+def test_video_formats_prefer_copyable_codecs_then_fall_back():
+    choices = source_format("webm").split("/")
+    assert choices[0] == (
+        "bestvideo[vcodec~='^(?:av01|vp09|vp8|vp9)']+bestaudio[acodec~='^(?:opus|vorbis)']"
+    )
+    assert choices[-2:] == ["bestvideo+bestaudio", "best"]
+
+
+def test_video_formats_without_copy_table_keep_previous_selector():
+    assert source_format("mkv") == "bestvideo+bestaudio/best"
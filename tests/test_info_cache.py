@@ -0,0 +1,68 @@
+import os
+import sys
+import types
+
+import pytest
+
+from media_tool import info_cache
+from media_tool.info_cache import InfoCache, fetch_info, parse_items
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("1-3", [1, 2, 3]),
+    ("2,5", [2, 5]),
+    ("8-", [8, 9, 10]),
+    ("-2", [1, 2]),
+    ("3,1-2,3", [3, 1, 2]),
+    ("9-20", [9, 10]),
+    (" 1 , , 4 ", [1, 4]),
+    ("0-1", [1]),
+    ("11", []),
+])
+def test_parse_items(spec, expected):
+    assert parse_items(spec, 10) == expected
+
+
+@pytest.mark.parametrize("spec", ["a", "1-b", "1..3"])
+def test_parse_items_rejects_garbage(spec):
+    with pytest.raises(ValueError):
+        parse_items(spec, 10)
+
+
+def test_evict_removes_oldest_first(tmp_path):
+    cache = InfoCache(str(tmp_path), max_bytes=10**9)
+    for n, url in enumerate(["a", "b", "c"]):
+        cache.put(url, {"n": n})
+        os.utime(cache._path(url), (n, n))
+    size = os.path.getsize(cache._path("c"))
+
+    assert cache.evict(max_bytes=size * 2) == 1
+    assert cache.get("a", ttl=float("inf")) is None
+    assert cache.get("c", ttl=float("inf")) == {"n": 2}
+
+
+@pytest.mark.parametrize("ttl, cached", [(0, False), (60, True)])
+def test_fetch_info_writes_cache_only_with_ttl(tmp_path, monkeypatch, ttl, cached):
+    class YoutubeDL:
+        def __init__(self, opts):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+        def extract_info(self, url, download=True):
+            return {"id": "x", "webpage_url": url}
+
+        @staticmethod
+        def sanitize_info(info):
+            return info
+
+    cache = InfoCache(str(tmp_path))
+    monkeypatch.setattr(info_cache, "_shared", cache)
+    monkeypatch.setitem(sys.modules, "yt_dlp", types.SimpleNamespace(YoutubeDL=YoutubeDL))
+
+    assert fetch_info("https://example.com/v", ttl=ttl)["id"] == "x"
+    assert (cache.get("https://example.com/v", ttl=60) is not None) is cached
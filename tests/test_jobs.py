@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from media_tool.jobs import JobManager
+
+
+def _wait_finished(manager, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not all(job.finished for job in manager.jobs()):
+        assert time.monotonic() < deadline, manager.jobs()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(1)
+    yield manager
+    manager.shutdown()
+
+
+def test_job_reports_progress_and_result(manager):
+    def work(job, report):
+        report(50.0, "half")
+        return ["/out/a.mp3"]
+
+    job = manager.submit(manager.new_batch(), "convert", "a.wav", work)
+    _wait_finished(manager)
+    [done] = manager.jobs()
+    assert (done.id, done.state, done.percent, done.paths) == (job.id, "done", 100.0, ["/out/a.mp3"])
+
+    states = []
+    while not manager.updates.empty():
+        states.append(manager.updates.get().state)
+    assert states[0] == "queued" and states[-1] == "done"
+
+
+def test_failed_job_keeps_partial_paths_and_entry_errors(manager):
+    class Partial(Exception):
+        paths = ["/out/1.mp3"]
+        errors = [("https://example.com/2", ValueError("gone"))]
+
+    def work(job, report):
+        raise Partial()
+
+    manager.submit(manager.new_batch(), "download", "https://example.com/list", work)
+    _wait_finished(manager)
+    [failed] = manager.jobs()
+    assert failed.state == "failed"
+    assert failed.paths == ["/out/1.mp3"]
+    assert failed.error == "https://example.com/2: gone"
+
+
+def test_cancel_queued_and_running_jobs(manager):
+    started = threading.Event()
+
+    def running(job, report):
+        started.set()
+        while not job.cancel.wait(0.01):
+            pass
+        raise RuntimeError("killed")
+
+    batch = manager.new_batch()
+    first = manager.submit(batch, "convert", "a.wav", running)
+    second = manager.submit(batch, "convert", "b.wav", lambda job, report: ["/out/b.mp3"])
+    assert started.wait(2.0)
+    manager.cancel_batch(batch)
+    _wait_finished(manager)
+    states = {job.id: job.state for job in manager.jobs()}
+    assert states == {first.id: "cancelled", second.id: "cancelled"}
+
+    manager.forget([first.id, second.id])
+    assert manager.jobs() == []
+
+
+def test_lane_limits_running_jobs_without_holding_pool_threads():
+    manager = JobManager(3)
+    release = threading.Event()
+    lock = threading.Lock()
+    running = {"lane": 0, "free": 0}
+    peak = {"lane": 0, "free": 0}
+
+    def work(kind):
+        def run(job, report):
+            with lock:
+                running[kind] += 1
+                peak[kind] = max(peak[kind], running[kind])
+            release.wait(1.0)
+            with lock:
+                running[kind] -= 1
+            return []
+        return run
+
+    batch = manager.new_batch()
+    for n in range(4):
+        manager.submit(batch, "download", f"u{n}", work("lane"), lane="site", lane_limit=1)
+    for n in range(2):
+        manager.submit(batch, "convert", f"c{n}", work("free"))
+    # レーンの待ちがプールのスレッドを塞がないので、残り 2 本で変換が並ぶ
+    deadline = time.monotonic() + 2.0
+    while peak["free"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    _wait_finished(manager)
+    assert peak == {"lane": 1, "free": 2}
+    assert {job.state for job in manager.jobs()} == {"done"}
+    manager.shutdown()
+
+
+def test_cancel_removes_waiting_lane_job(manager):
+    release = threading.Event()
+    started = []
+
+    def work(job, report):
+        started.append(job.source)
+        release.wait(1.0)
+        return []
+
+    batch = manager.new_batch()
+    jobs = [
+        manager.submit(batch, "download", f"u{n}", work, lane="site", lane_limit=1)
+        for n in range(3)
+    ]
+    manager.cancel([jobs[1].id])
+    release.set()
+    _wait_finished(manager)
+    states = {job.source: job.state for job in manager.jobs()}
+    assert states == {"u0": "done", "u1": "cancelled", "u2": "done"}
+    assert started == ["u0", "u2"]
+
+
+def test_submit_after_shutdown_is_cancelled():
+    manager = JobManager(1)
+    manager.shutdown()
+    manager.submit(manager.new_batch(), "download", "u", lambda job, report: [], lane="site")
+    assert [job.state for job in manager.jobs()] == ["cancelled"]
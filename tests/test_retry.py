@@ -0,0 +1,65 @@
+import socket
+import urllib.error
+
+import pytest
+
+from media_tool.downloaders.base import backoff_delay, is_transient
+
+
+class _HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class _DownloadError(Exception):
+    """yt-dlp の DownloadError と同じく元の例外を exc_info に持つ"""
+
+    def __init__(self, cause):
+        super().__init__(str(cause))
+        self.exc_info = (type(cause), cause, None)
+
+
+@pytest.mark.parametrize("error", [
+    ConnectionResetError(),
+    TimeoutError(),
+    socket.timeout(),
+    urllib.error.URLError("connection refused"),
+    _HTTPError(429),
+    _HTTPError(503),
+])
+def test_transient_errors(error):
+    assert is_transient(error)
+
+
+@pytest.mark.parametrize("error", [
+    _HTTPError(403),
+    _HTTPError(404),
+    ValueError("unsupported URL"),
+    urllib.error.HTTPError("https://example.com", 404, "Not Found", {}, None),
+])
+def test_permanent_errors(error):
+    assert not is_transient(error)
+
+
+def test_wrapped_errors_are_classified_by_their_cause():
+    assert is_transient(_DownloadError(ConnectionResetError()))
+    try:
+        try:
+            raise TimeoutError()
+        except TimeoutError as e:
+            raise RuntimeError("download failed") from e
+    except RuntimeError as e:
+        assert is_transient(e)
+
+
+def test_expected_errors_are_not_retried():
+    error = _DownloadError(ConnectionResetError())
+    error.expected = True
+    assert not is_transient(error)
+
+
+@pytest.mark.parametrize("attempt, base", [(0, 1.0), (1, 2.0), (3, 8.0), (10, 60.0)])
+def test_backoff_delay(attempt, base):
+    for _ in range(20):
+        assert base * 0.8 <= backoff_delay(attempt) <= base * 1.2
@@ -0,0 +1,34 @@
+from media_tool import scheduler
+from media_tool.config import Config
+from media_tool.scheduler import DownloadScheduler
+
+
+class _FakeDownloader:
+    def __init__(self, budget):
+        self.budget = budget
+
+    def download(self, url, **kwargs):
+        return [url + ".mp3"]
+
+
+def test_run_shares_one_budget_across_workers(monkeypatch):
+    budgets = []
+
+    def create_downloader(site, config, *, sessions=None, budget=None):
+        budgets.append(budget)
+        return _FakeDownloader(budget)
+
+    monkeypatch.setattr(scheduler, "create_downloader", create_downloader)
+    urls = [
+        "https://www.youtube.com/watch?v=aaaaaaaaaaa",
+        "https://www.youtube.com/watch?v=bbbbbbbbbbb",
+        "https://www.nicovideo.jp/watch/sm1",
+        "https://example.com/c.mp4",
+    ]
+    success, errors = DownloadScheduler(Config(), parallel=2).run(urls, "mp3")
+
+    assert errors == []
+    assert sorted(success) == sorted(url + ".mp3" for url in urls)
+    assert len(budgets) >= 3
+    assert budgets[0] is not None
+    assert all(budget is budgets[0] for budget in budgets)
@@ -0,0 +1,74 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from media_tool import service
+from media_tool.config import Config
+from media_tool.service import JobService, JobStore
+
+
+@pytest.fixture
+def job_service(tmp_path):
+    config = Config()
+    config.OUTPUT_DIR = str(tmp_path)
+    job_service = JobService(config, workers=1, store=JobStore(str(tmp_path / "jobs.db")))
+    yield job_service
+    job_service.sessions.close()
+
+
+@pytest.fixture
+def post(job_service):
+    """ジョブサービスの POST /jobs に body を送り (ステータス, 応答) を返す"""
+    handler = type("Handler", (service._Handler,), {"service": job_service, "token": "t"})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def post(body: bytes):
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{server.server_port}/jobs", data=body, method="POST",
+            headers={"Content-Type": "application/json", service.TOKEN_HEADER: "t"},
+        )
+        try:
+            with urllib.request.urlopen(request) as res:
+                return res.status, json.loads(res.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    yield post
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("body", [b"[]", b'"x"', b"1"])
+def test_post_rejects_non_object_body(post, body):
+    status, data = post(body)
+    assert status == 400
+    assert "JSON object" in data["error"]
+
+
+def test_post_queues_valid_job(post):
+    status, data = post(b'{"kind": "download", "url": "https://example.com/v", "profile": "fast"}')
+    assert status == 201
+    assert data["state"] == "queued"
+    assert data["payload"] == {"url": "https://example.com/v", "profile": "fast"}
+
+
+@pytest.mark.parametrize("kind, payload", [
+    ("download", {"url": "https://example.com/v", "profile": "nope"}),
+    ("convert", {"input": "a.wav", "profile": "nope"}),
+])
+def test_submit_rejects_unknown_profile(job_service, kind, payload):
+    with pytest.raises(ValueError, match="profile"):
+        job_service.submit(kind, payload)
+    assert job_service.store.list() == []
+
+
+def test_submit_rejects_non_boolean_flags(job_service):
+    with pytest.raises(ValueError, match="stream"):
+        job_service.submit("download", {"url": "https://example.com/v", "stream": "yes"})
+    job = job_service.submit("download", {"url": "https://example.com/v", "archive": False})
+    assert job["payload"]["archive"] is False